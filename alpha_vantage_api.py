@@ -2,6 +2,7 @@ import requests
 import pandas as pd
 import time
 from datetime import datetime, timedelta, date
+from profiler import phase
 
 class AlphaVantageAPI:
     """
@@ -19,6 +20,20 @@ class AlphaVantageAPI:
         self.api_key = api_key
         self.base_url = 'https://www.alphavantage.co/query'
         
+    def _request(self, params):
+        """
+        发送API请求并返回解析后的JSON
+        所有HTTP访问都经过这里，录制/回放等数据源通过重写此方法替换网络请求
+        
+        参数:
+        params: 查询参数字典
+        
+        返回:
+        响应的JSON字典
+        """
+        response = requests.get(self.base_url, params=params)
+        return response.json()
+        
     def get_daily_adjusted(self, symbol, outputsize='full'):
         """
         获取股票的每日价格数据
@@ -38,28 +53,29 @@ class AlphaVantageAPI:
         }
         
         try:
-            response = requests.get(self.base_url, params=params)
-            data = response.json()
+            with phase('api.request', symbol=symbol):
+                data = self._request(params)
             
             if 'Time Series (Daily)' in data:
-                # 转换JSON数据为DataFrame
-                df = pd.DataFrame(data['Time Series (Daily)']).T
-                
-                # 重命名列 - 调整列名以匹配响应格式
-                df.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
-                
-                # 转换类型
-                for col in df.columns:
-                    df[col] = pd.to_numeric(df[col])
-                
-                # 转换索引为日期类型并排序
-                df.index = pd.to_datetime(df.index)
-                df = df.sort_index()
-                
-                # 添加缺失的列以匹配yfinance格式
-                df['Adj Close'] = df['Close']  # 使用收盘价作为调整后收盘价
-                df['Dividends'] = 0.0  # 没有股息数据
-                df['Stock Splits'] = 0.0  # 没有拆分数据
+                with phase('api.parse', symbol=symbol):
+                    # 转换JSON数据为DataFrame
+                    df = pd.DataFrame(data['Time Series (Daily)']).T
+                    
+                    # 重命名列 - 调整列名以匹配响应格式
+                    df.columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+                    
+                    # 转换类型
+                    for col in df.columns:
+                        df[col] = pd.to_numeric(df[col])
+                    
+                    # 转换索引为日期类型并排序
+                    df.index = pd.to_datetime(df.index)
+                    df = df.sort_index()
+                    
+                    # 添加缺失的列以匹配yfinance格式
+                    df['Adj Close'] = df['Close']  # 使用收盘价作为调整后收盘价
+                    df['Dividends'] = 0.0  # 没有股息数据
+                    df['Stock Splits'] = 0.0  # 没有拆分数据
                 
                 return df
             else:
@@ -127,8 +143,7 @@ class AlphaVantageAPI:
         }
         
         try:
-            response = requests.get(self.base_url, params=params)
-            data = response.json()
+            data = self._request(params)
             
             return data
         except Exception as e:
@@ -1,17 +1,20 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-# 替换yfinance导入为alpha_vantage_api
-import alpha_vantage_api as av
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from io import BytesIO
 import base64
-import yfinance as yf
 import os
 import time
 from dotenv import load_dotenv
+from profiler import profiler, phase, profiled
+from memory_utils import memory_report
+from trade_events import (
+    EVENT_BUY, EVENT_SELL, EVENT_SELL_PUT, EVENT_SELL_CALL,
+    EVENT_PUT_EXERCISED, EVENT_CALL_EXERCISED
+)
 
 # 加载环境变量
 load_dotenv()
@@ -25,6 +28,60 @@ if not ALPHA_VANTAGE_API_KEY:
 # 导入策略类
 from swing_strategy import SwingTrader
 from option_strategy import OptionTrader
+from signal_engine import buy_and_hold
+from performance_metrics import performance_metrics, format_metrics
+from result_store import ResultStore
+from report_tables import (
+    swing_trade_table, option_trade_table, paginate, page_count, PAGE_SIZE, SWING_TABLE_FORMATS, OPTION_TABLE_FORMATS
+)
+from data_cache import StockDataCache
+from data_providers import provider_chain_from_env, quota_from_env
+from prefetcher import prefetcher_from_env, DEFAULT_RANGES
+from bar_resampler import BarStore, TIMEFRAME_LABELS, periods_per_year
+from stage_pipeline import backtest_pipeline
+from shared_prices import SharedPriceRegistry
+
+# 回测结果持久化存储（进程内共享同一个实例）
+@st.cache_resource
+def get_result_store():
+    max_mb = float(os.getenv('RESULT_STORE_MAX_MB', '200'))
+    store = ResultStore(os.path.join('cache', 'results'), max_bytes=int(max_mb * 1024 * 1024))
+    store.purge_stale([SwingTrader, OptionTrader])
+    return store
+
+# 股票数据文件缓存（进程内共享同一个实例，并发请求同一股票时只请求一次API）
+@st.cache_resource
+def get_stock_cache():
+    max_mb = float(os.getenv('STOCK_CACHE_MAX_MB', '500'))
+    policy = os.getenv('STOCK_CACHE_POLICY', 'lru')
+    return StockDataCache('cache', max_bytes=int(max_mb * 1024 * 1024), policy=policy)
+
+# Alpha Vantage 请求配额，交互请求与后台预取共用，交互请求优先
+@st.cache_resource
+def get_request_quota():
+    return quota_from_env()
+
+# 数据源回退链（顺序和对冲请求由 DATA_PROVIDERS / DATA_HEDGE_AFTER_MS 配置）
+@st.cache_resource
+def get_data_provider():
+    return provider_chain_from_env(ALPHA_VANTAGE_API_KEY, quota=get_request_quota())
+
+# 后台预取（设置 PREFETCH_WATCHLIST 后随应用启动，在空闲时段刷新监控列表的缓存）
+@st.cache_resource
+def get_prefetcher():
+    prefetcher = prefetcher_from_env(get_stock_cache(), get_data_provider(), get_request_quota())
+    return prefetcher.start() if prefetcher is not None else None
+
+# 多周期K线存储（周线、月线等派生K线持久化保存并增量更新）
+@st.cache_resource
+def get_bar_store():
+    return BarStore(os.path.join('cache', 'bars'))
+
+# 进程级共享的只读价格数据（所有会话引用同一份内存映射数组，不再逐会话复制）
+@st.cache_resource
+def get_price_registry():
+    max_mb = float(os.getenv('SHARED_PRICES_MAX_MB', '200'))
+    return SharedPriceRegistry(os.path.join('cache', 'shared'), max_bytes=int(max_mb * 1024 * 1024))
 
 # 设置页面配置
 st.set_page_config(
@@ -34,6 +91,31 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+result_store = get_result_store()
+# 每次运行脚本时获取，保证预取线程随应用启动（缓存管理面板只显示其状态）
+prefetcher = get_prefetcher()
+
+# 局部重新运行：片段内的控件变化只重新运行该片段（旧版本Streamlit没有 st.fragment 时退化为整页重新运行）
+fragment = getattr(st, 'fragment', None) or (lambda func: func)
+
+def lazy_tabs(labels, key):
+    """只运行当前选中标签页内容的标签页；不支持按需渲染的版本中所有标签页都会运行"""
+    try:
+        return st.tabs(labels, key=key, on_change='rerun')
+    except TypeError:
+        return st.tabs(labels)
+
+def lazy_expander(label, key):
+    """展开时才运行内容的折叠面板；不支持按需渲染的版本中内容总会运行"""
+    try:
+        return st.expander(label, key=key, on_change='rerun')
+    except TypeError:
+        return st.expander(label)
+
+def is_open(container):
+    """标签页或折叠面板当前是否打开（不跟踪状态时视为打开）"""
+    return getattr(container, 'open', None) is not False
+
 # 页面标题
 st.title("📊 交易策略分析工具")
 st.markdown("### 波段交易与期权策略回测比较")
@@ -41,28 +123,48 @@ st.markdown("### 波段交易与期权策略回测比较")
 # 侧边栏设置
 st.sidebar.header("策略参数设置")
 
-# 添加缓存管理
-with st.sidebar.expander("缓存管理"):
+# 添加缓存管理（展开时才统计，按钮只重新运行本面板）
+@fragment
+def cache_panel():
+    panel = lazy_expander("缓存管理", key='cache_panel')
+    with panel:
+        if is_open(panel):
+            render_cache_stats()
+
+def render_cache_stats():
     st.write("数据缓存可以加快加载速度，避免频繁调用API")
-    cache_dir = "cache"
-    if os.path.exists(cache_dir):
-        cache_files = [f for f in os.listdir(cache_dir) if f.endswith('.pkl')]
-        if cache_files:
-            st.write(f"当前缓存文件数：{len(cache_files)}个")
-            total_size = sum(os.path.getsize(os.path.join(cache_dir, f)) for f in cache_files)
-            st.write(f"缓存总大小：{total_size / 1024 / 1024:.2f} MB")
-            if st.button("清理过期缓存"):
-                clear_stock_cache()
-                st.success("已清理过期缓存！")
-            if st.button("清理所有缓存"):
-                for f in cache_files:
-                    try:
-                        os.remove(os.path.join(cache_dir, f))
-                    except Exception as e:
-                        st.error(f"删除缓存文件失败：{str(e)}")
-                st.success("已清理所有缓存！")
-        else:
-            st.write("当前没有缓存文件")
+    stock_cache = get_stock_cache()
+    cache_stats = stock_cache.stats()
+    if cache_stats['entries']:
+        st.write(f"当前缓存文件数：{cache_stats['entries']}个")
+        st.write(f"缓存总大小：{cache_stats['bytes'] / 1024 / 1024:.2f} MB"
+                 f"（上限 {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB，{stock_cache.policy.upper()}淘汰）")
+        if st.button("清理过期缓存"):
+            stock_cache.clear_expired()
+            st.success("已清理过期缓存！")
+        if st.button("清理所有缓存"):
+            stock_cache.clear()
+            st.success("已清理所有缓存！")
+    else:
+        st.write("当前没有缓存文件")
+    st.write(f"命中率：{cache_stats['hit_rate']:.0%}（命中{cache_stats['hits']}次，未命中{cache_stats['misses']}次），"
+             f"已淘汰{cache_stats['evictions']}个，从缓存读取 {cache_stats['bytes_served'] / 1024 / 1024:.2f} MB")
+    if prefetcher is not None:
+        prefetch_stats = prefetcher.status()
+        st.write(f"后台预取：{len(prefetcher.watchlist)}个股票，已刷新{prefetch_stats['refreshed']}项，"
+                 f"待刷新{prefetch_stats['pending']}项")
+    registry_stats = get_price_registry().stats()
+    st.write(f"共享价格数据：{registry_stats['entries']}份，{registry_stats['bytes'] / 1024 / 1024:.2f} MB，"
+             f"{registry_stats['refs']}个会话引用")
+    store_stats = result_store.stats()
+    st.write(f"回测结果缓存：{store_stats['count']}个，{store_stats['bytes'] / 1024 / 1024:.2f} MB，累计命中{store_stats['hits']}次")
+
+with st.sidebar:
+    cache_panel()
+
+# 性能剖析面板（内容在页面末尾填充，以便显示本次运行的结果）
+# 剖析是进程级的设置（PROFILE_PHASES=1），各会话只查看自己运行的记录
+profile_panel = st.sidebar.expander("性能剖析")
 
 # 股票代码输入
 symbol = st.sidebar.text_input("股票代码（例如：AAPL, MSFT, NVDA）", "AAPL")
@@ -72,28 +174,29 @@ col1, col2 = st.sidebar.columns(2)
 with col1:
     start_date = st.date_input(
         "开始日期",
-        datetime(2023, 1, 1)  # 修改为2023年1月1日
+        datetime.strptime(DEFAULT_RANGES[0][0], '%Y-%m-%d')  # 默认2023年1月1日，与后台预取的默认范围一致
     )
 with col2:
     end_date = st.date_input(
         "结束日期",
-        datetime(2024, 1, 1)  # 修改为2024年1月1日
+        datetime.strptime(DEFAULT_RANGES[0][1], '%Y-%m-%d')  # 默认2024年1月1日
     )
 
+# K线周期
+timeframe = st.sidebar.selectbox("K线周期", list(TIMEFRAME_LABELS), format_func=TIMEFRAME_LABELS.get)
+
 # 交易参数设置
 initial_shares = st.sidebar.number_input("初始持股数量", min_value=100, max_value=10000, value=1000, step=100)
 trade_shares = st.sidebar.number_input("每次交易股数", min_value=10, max_value=1000, value=100, step=10)
 swing_threshold = st.sidebar.slider("波动阈值 (%)", min_value=5, max_value=20, value=10, step=1) / 100
 premium_rate = st.sidebar.slider("期权权利金率 (%)", min_value=1, max_value=10, value=5, step=1) / 100
+lean_mode = st.sidebar.checkbox("内存精简模式", value=False,
+                                help="策略共享价格数据而不复制，信号、期权类型和价格使用紧凑的数据类型存储")
 
-# 策略选择
-strategy_type = st.sidebar.radio(
-    "选择要查看的策略",
-    ["两种策略对比", "仅波段策略", "仅期权策略"]
-)
-
-# 运行按钮
+# 运行按钮（运行一次后保持分析状态，之后调整参数即自动重新计算受影响的阶段）
 run_button = st.sidebar.button("运行策略分析")
+if run_button:
+    st.session_state['analysis_active'] = True
 
 # 下载Excel报告
 def get_excel_download_link(df, filename="交易策略回测报告.xlsx"):
@@ -106,56 +209,33 @@ def get_excel_download_link(df, filename="交易策略回测报告.xlsx"):
     return href
 
 # 函数：获取股票数据
-@st.cache_data
-def get_stock_data(symbol, start_date, end_date):
+def load_stock_data(symbol, start_date, end_date):
     """
     使用Alpha Vantage API获取股票的历史数据（包含复权价格）
     添加本地缓存功能，避免频繁调用API
     """
+    required_columns = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def fetch():
+        with phase('data.fetch', symbol=symbol):
+            return get_data_provider().get_stock_data(symbol, start_date, end_date)
+
+    def is_valid(data):
+        return not data.empty and all(col in data.columns for col in required_columns)
+
     try:
-        # 构建缓存文件名
-        cache_dir = "cache"
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-        
-        cache_file = f"{cache_dir}/{symbol}_{start_date}_{end_date}.pkl"
-        
-        # 检查缓存是否存在且未过期（7天）
-        if os.path.exists(cache_file):
-            file_modified_time = os.path.getmtime(cache_file)
-            if (time.time() - file_modified_time) < 7 * 24 * 3600:  # 7天内的缓存有效
-                try:
-                    data = pd.read_pickle(cache_file)
-                    print(f"从缓存加载 {symbol} 的数据")
-                    return data
-                except Exception as e:
-                    print(f"读取缓存文件失败：{str(e)}")
-                    # 如果读取缓存失败，继续获取新数据
-        
-        # 如果没有缓存或缓存已过期，从API获取数据
-        print(f"从API获取 {symbol} 的数据")
-        api = av.AlphaVantageAPI(api_key=ALPHA_VANTAGE_API_KEY)
-        data = api.get_stock_data(symbol, start_date, end_date)
+        # 读取本地缓存（7天内有效），缺失时从API获取并原子写入缓存
+        # 多个会话同时请求同一股票时只有一个请求访问API，其余等待并复用其结果
+        data = get_stock_cache().get_or_fetch(symbol, start_date, end_date, fetch, validate=is_valid)
         
         if data.empty:
             st.error(f"无法获取 {symbol} 的数据，请检查股票代码是否正确。")
             return None
             
         # 确保数据包含所需的列
-        required_columns = ['Open', 'High', 'Low', 'Close', 'Volume']
         if not all(col in data.columns for col in required_columns):
             st.error(f"获取的数据缺少必要的列：{required_columns}")
             return None
-            
-        # 添加YearMonth列用于月度统计
-        data['YearMonth'] = data.index.to_period('M')
-        
-        # 保存到缓存
-        try:
-            data.to_pickle(cache_file)
-            print(f"数据已缓存到 {cache_file}")
-        except Exception as e:
-            print(f"保存缓存文件失败：{str(e)}")
         
         return data
         
@@ -163,27 +243,55 @@ def get_stock_data(symbol, start_date, end_date):
         st.error(f"获取数据时发生错误：{str(e)}")
         return None
 
-# 添加缓存清理函数
-def clear_stock_cache():
-    """清理过期的股票数据缓存（超过7天）"""
-    cache_dir = "cache"
-    if not os.path.exists(cache_dir):
-        return
-        
-    current_time = time.time()
-    for cache_file in os.listdir(cache_dir):
-        if cache_file.endswith('.pkl'):
-            cache_path = os.path.join(cache_dir, cache_file)
-            file_modified_time = os.path.getmtime(cache_path)
-            if (current_time - file_modified_time) > 7 * 24 * 3600:  # 7天后过期
-                try:
-                    os.remove(cache_path)
-                    print(f"已删除过期缓存：{cache_file}")
-                except Exception as e:
-                    print(f"删除过期缓存失败：{str(e)}")
+def get_stock_data(symbol, start_date, end_date, timeframe='D'):
+    """
+    从进程级共享注册表获取只读价格数据（未注册时加载），返回的数据不能修改
+    本会话持有数据的引用，直到换用其他数据或会话结束，被引用的数据不会被淘汰
+    """
+    def load():
+        data = load_stock_data(symbol, start_date, end_date)
+        if data is not None and timeframe != 'D':
+            # 日线并入K线存储，读取已持久化的派生周期K线（只增量聚合新增部分）
+            bar_store = get_bar_store()
+            bar_store.append(symbol, data)
+            data = bar_store.bars(symbol, timeframe, start_date, end_date)
+        return data
+
+    registry = get_price_registry()
+    lease = registry.acquire(registry.key_for(symbol, start_date, end_date, timeframe), load)
+    previous = st.session_state.get('price_lease')
+    st.session_state['price_lease'] = lease
+    if previous is not None and previous is not lease:
+        previous.release()
+    return lease.data if lease is not None else None
+
+# 函数：带剖析的图表和表格渲染
+def render_chart(fig):
+    with phase('render.plotly'):
+        st.plotly_chart(fig, use_container_width=True)
+
+def render_table(table, formats, key, page_size=PAGE_SIZE):
+    """
+    分页显示数值表格：只把当前页发送到前端，数值格式化由前端完成
+    :param formats: 列名到printf风格格式的映射
+    :param key: 分页控件的键，同一页面中的多个表格需要不同的键
+    """
+    pages = page_count(len(table), page_size)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"页码（共{pages}页，{len(table)}条）", min_value=1, max_value=pages, value=1, step=1, key=key)
+    page_frame = paginate(table, page, page_size)
+    column_config = {column: st.column_config.NumberColumn(format=fmt) for column, fmt in formats.items()}
+    with phase('render.dataframe', rows=len(page_frame), total_rows=len(table)):
+        st.dataframe(page_frame, column_config=column_config)
 
 # 函数：创建价格图表
-def plot_price_chart(data, positions=None, title="股票价格走势"):
+@profiled('figure.price_chart')
+def plot_price_chart(data, events=None, title="股票价格走势"):
+    """
+    绘制价格走势图
+    :param events: 策略的交易事件日志，用于标注信号和行权点，无需逐日持仓数据
+    """
     fig = go.Figure()
     
     # 添加股票价格线
@@ -195,55 +303,29 @@ def plot_price_chart(data, positions=None, title="股票价格走势"):
         line=dict(color='royalblue', width=2)
     ))
     
-    # 如果有交易记录，添加买入卖出点
-    if positions is not None and 'Signal' in positions.columns:
-        # 买入点（波段策略中 Signal=1，期权策略中 Signal=1 表示卖出看跌期权）
-        buy_signals = positions[positions['Signal'] == 1]
-        if not buy_signals.empty:
-            fig.add_trace(go.Scatter(
-                x=buy_signals.index,
-                y=buy_signals['Close'],
-                mode='markers',
-                name='买入信号/卖出看跌期权',
-                marker=dict(symbol='triangle-up', size=12, color='green', line=dict(width=1, color='darkgreen'))
-            ))
-        
-        # 卖出点（波段策略中 Signal=-1，期权策略中 Signal=-1 表示卖出看涨期权）
-        sell_signals = positions[positions['Signal'] == -1]
-        if not sell_signals.empty:
-            fig.add_trace(go.Scatter(
-                x=sell_signals.index,
-                y=sell_signals['Close'],
-                mode='markers',
-                name='卖出信号/卖出看涨期权',
-                marker=dict(symbol='triangle-down', size=12, color='red', line=dict(width=1, color='darkred'))
-            ))
-    
-    # 添加期权行权点标注
-    if positions is not None and 'IsExercised' in positions.columns:
-        # 找出所有被行权的点
-        exercised_points = positions[positions['IsExercised'] == True]
-        if not exercised_points.empty:
-            # 找出看涨期权行权点（Signal=-1 的行权点）
-            call_exercised = exercised_points[exercised_points['Signal'] == -1]
-            if not call_exercised.empty:
-                fig.add_trace(go.Scatter(
-                    x=call_exercised.index,
-                    y=call_exercised['Close'],
-                    mode='markers',
-                    name='看涨期权行权',
-                    marker=dict(symbol='star', size=14, color='orange', line=dict(width=1, color='darkorange'))
-                ))
-            
-            # 找出看跌期权行权点（Signal=1 的行权点）
-            put_exercised = exercised_points[exercised_points['Signal'] == 1]
-            if not put_exercised.empty:
+    # 如果有交易记录，添加买入卖出点和期权行权点
+    if events is not None and len(events) > 0:
+        event_types = events['type']
+        markers = [
+            # 买入点（波段策略买入，期权策略卖出看跌期权）
+            ((event_types == EVENT_BUY) | (event_types == EVENT_SELL_PUT), '买入信号/卖出看跌期权',
+             dict(symbol='triangle-up', size=12, color='green', line=dict(width=1, color='darkgreen'))),
+            # 卖出点（波段策略卖出，期权策略卖出看涨期权）
+            ((event_types == EVENT_SELL) | (event_types == EVENT_SELL_CALL), '卖出信号/卖出看涨期权',
+             dict(symbol='triangle-down', size=12, color='red', line=dict(width=1, color='darkred'))),
+            (event_types == EVENT_CALL_EXERCISED, '看涨期权行权',
+             dict(symbol='star', size=14, color='orange', line=dict(width=1, color='darkorange'))),
+            (event_types == EVENT_PUT_EXERCISED, '看跌期权行权',
+             dict(symbol='star', size=14, color='purple', line=dict(width=1, color='indigo'))),
+        ]
+        for mask, name, marker in markers:
+            if mask.any():
                 fig.add_trace(go.Scatter(
-                    x=put_exercised.index,
-                    y=put_exercised['Close'],
+                    x=data.index[events['bar'][mask]],
+                    y=events['price'][mask],
                     mode='markers',
-                    name='看跌期权行权',
-                    marker=dict(symbol='star', size=14, color='purple', line=dict(width=1, color='darkpurple'))
+                    name=name,
+                    marker=marker
                 ))
     
     # 设置图表布局
@@ -273,6 +355,7 @@ def plot_price_chart(data, positions=None, title="股票价格走势"):
     return fig
 
 # 函数：创建资产价值对比图表
+@profiled('figure.asset_comparison')
 def plot_asset_comparison(results):
     """
     绘制资产对比图（使用复权数据）
@@ -311,300 +394,351 @@ def plot_asset_comparison(results):
     
     return fig
 
-# 主应用逻辑
-if run_button:
-    with st.spinner('正在获取股票数据...'):
-        # 获取股票数据
-        stock_data = get_stock_data(symbol, start_date, end_date)
+# 报告数据（逐日价格、两种策略的信号和资产），作为流水线的下游阶段缓存
+def build_report_data(data, swing, option):
+    report_data = pd.DataFrame()
+    report_data['Date'] = data.index
+    report_data['Close'] = data['Close']
+    report_data['Reference_Price'] = data['Close'].rolling(window=20).mean()
+    report_data['Swing_Signal'] = swing.positions['Signal']
+    report_data['Swing_Total_Asset'] = swing.positions['Total_Asset']
+    report_data['Option_Signal'] = option.positions['Signal']
+    report_data['Option_Type'] = option.data['OptionType']
+    report_data['Option_Total_Asset'] = option.positions['Total_Asset']
+    report_data['Option_Premium_Income'] = option.positions['Premium_Income']
+    return report_data
+
+# 回测流水线：在信号、账本和指标阶段之后添加图表和报告阶段
+# （进程内共享同一个实例，参数变化时只重新计算受影响的阶段）
+@st.cache_resource
+def get_backtest_pipeline():
+    pipeline = backtest_pipeline(store=get_result_store())
+    pipeline.add('price_figure', lambda data, symbol: plot_price_chart(data, title=f"{symbol} 价格走势"),
+                 params=('data', 'symbol'))
+    pipeline.add('swing_figure',
+                 lambda swing, symbol: plot_price_chart(swing.data, swing.events, title=f"{symbol} 波段交易策略信号"),
+                 params=('symbol',), upstream=('swing',))
+    pipeline.add('option_figure',
+                 lambda option, data, symbol: plot_price_chart(data, option.events, title=f"{symbol} 期权交易策略信号"),
+                 params=('data', 'symbol'), upstream=('option',))
+    pipeline.add('asset_figure',
+                 lambda option, benchmark: plot_asset_comparison(
+                     {'results': option.positions, 'buy_hold_value': benchmark['final_value']}),
+                 upstream=('option', 'benchmark'))
+    pipeline.add('report', build_report_data, params=('data',), upstream=('swing', 'option'))
+    return pipeline
+
+def run_stages(analysis, targets):
+    """运行流水线中面板需要的阶段，未变化的阶段直接复用；出错时显示错误并返回None"""
+    # 片段单独重新运行时不经过主逻辑，继续记录到本会话的运行
+    profiler.use_run(st.session_state.get('profile_run'))
+    computed = []
+    try:
+        stages = get_backtest_pipeline().run(targets, computed=computed, **analysis)
+    except Exception as e:
+        st.error(f"运行策略分析时发生错误：{str(e)}")
+        return None
+    st.caption("本次重新计算的阶段：" + ("、".join(computed) or "无（全部复用）"))
+    return stages
+
+def total_return(trader):
+    """策略的总收益率（%）"""
+    initial_value = trader.initial_asset
+    return (trader.final_asset - initial_value) / initial_value * 100 if initial_value != 0 else 0
+
+def executed_trades(swing_trader):
+    """波段策略实际执行的买入和卖出次数（资金或持股不足时成交股数为0）"""
+    executed = swing_trader.events[swing_trader.events['qty'] > 0]
+    return int(np.count_nonzero(executed['type'] == EVENT_BUY)), int(np.count_nonzero(executed['type'] == EVENT_SELL))
+
+def option_counts(option_trader):
+    """期权策略卖出看跌、卖出看涨和被行权的次数"""
+    option_types = option_trader.events['type']
+    return (int(np.count_nonzero(option_types == EVENT_SELL_PUT)),
+            int(np.count_nonzero(option_types == EVENT_SELL_CALL)),
+            int(np.count_nonzero((option_types == EVENT_PUT_EXERCISED) | (option_types == EVENT_CALL_EXERCISED))))
+
+# 各分析面板是独立的片段：面板内的控件（如表格分页）变化时只重新运行该面板，
+# 计算结果来自流水线缓存，只渲染当前打开的标签页
+@fragment
+def data_panel(analysis, timeframe):
+    stock_data = analysis['data']
+    symbol = analysis['symbol']
+    st.subheader(f"{symbol} 股票信息")
+    st.write(f"获取了 {len(stock_data)} 根{TIMEFRAME_LABELS[timeframe]}K线的数据")
+    st.write(f"首日价格: ${stock_data['Close'].iloc[0]:.2f}")
+    st.write(f"末日价格: ${stock_data['Close'].iloc[-1]:.2f}")
+    price_change = ((stock_data['Close'].iloc[-1] - stock_data['Close'].iloc[0]) / stock_data['Close'].iloc[0] * 100)
+    st.write(f"期间价格变化: {price_change:.2f}%")
+    
+    stages = run_stages(analysis, ['price_figure'])
+    if stages:
+        render_chart(stages['price_figure'])
+    
+    # 本次运行的内存占用（只包含已经计算过的策略，展开时才统计）
+    memory_panel = lazy_expander("内存占用报告", key='memory_report')
+    with memory_panel:
+        if is_open(memory_panel):
+            stages = get_backtest_pipeline().run(['swing', 'option'], **analysis)
+            st.dataframe(memory_report(
+                {'价格数据': stock_data, '波段策略': stages['swing'], '期权策略': stages['option']},
+                source=stock_data
+            ))
+
+@fragment
+def swing_panel(analysis):
+    st.subheader("波段交易策略")
+    print("正在运行波段交易策略...")
+    with st.spinner('运行波段交易策略...'):
+        stages = run_stages(analysis, ['swing', 'swing_figure', 'benchmark'])
+    if not stages:
+        return
+    swing_trader = stages['swing']
+    buy_and_hold_value = stages['benchmark']['final_value']
+    buy_and_hold_return = stages['benchmark']['return_pct']
+    trade_shares = analysis['trade_shares']
+    try:
+        # 显示波段策略结果
+        swing_initial_value = swing_trader.initial_asset
+        swing_final_value = swing_trader.final_asset
+        swing_returns = total_return(swing_trader)
         
-        if stock_data is not None:
-            # 显示股票信息
-            st.subheader(f"{symbol} 股票信息")
-            st.write(f"获取了 {len(stock_data)} 个交易日的数据")
-            st.write(f"首日价格: ${stock_data['Close'].iloc[0]:.2f}")
-            st.write(f"末日价格: ${stock_data['Close'].iloc[-1]:.2f}")
-            price_change = ((stock_data['Close'].iloc[-1] - stock_data['Close'].iloc[0]) / stock_data['Close'].iloc[0] * 100)
-            st.write(f"期间价格变化: {price_change:.2f}%")
-            
-            # 显示价格图表
-            st.plotly_chart(plot_price_chart(stock_data, title=f"{symbol} 价格走势"), use_container_width=True)
-            
-            # 初始化策略
-            swing_trader = None
-            option_trader = None
-            
-            # 根据选择运行策略
-            if strategy_type in ["两种策略对比", "仅波段策略"]:
-                with st.spinner('运行波段交易策略...'):
-                    st.subheader("波段交易策略")
-                    # 运行波段交易策略
-                    print("正在运行波段交易策略...")
-                    try:
-                        swing_trader = SwingTrader(
-                            data=stock_data,
-                            initial_shares=initial_shares,
-                            trade_shares=trade_shares,
-                            threshold=swing_threshold
-                        )
-                        
-                        # 显示波段策略结果
-                        swing_initial_value = swing_trader.positions['Total_Asset'].iloc[0]
-                        swing_final_value = swing_trader.positions['Total_Asset'].iloc[-1]
-                        swing_returns = (swing_final_value - swing_initial_value) / swing_initial_value * 100
-                        
-                        buy_signals = sum(swing_trader.positions['Signal'] == 1)
-                        sell_signals = sum(swing_trader.positions['Signal'] == -1)
-                        
-                        print(f"波段策略结果:")
-                        print(f"- 初始资产: ${swing_initial_value:,.2f}")
-                        print(f"- 最终资产: ${swing_final_value:,.2f}")
-                        print(f"- 总收益率: {swing_returns:.2f}%")
-                        print(f"- 买入交易: {buy_signals}次")
-                        print(f"- 卖出交易: {sell_signals}次")
-                        
-                        # 显示波段策略交易信号图表
-                        st.plotly_chart(plot_price_chart(
-                            swing_trader.data, 
-                            swing_trader.positions, 
-                            title=f"{symbol} 波段交易策略信号"
-                        ), use_container_width=True)
-                        
-                        # 与买入持有策略比较
-                        buy_and_hold_value = initial_shares * stock_data['Close'].iloc[-1] + 100000  # 假设初始现金10万
-                        buy_and_hold_return = (stock_data['Close'].iloc[-1] / stock_data['Close'].iloc[0] - 1) * 100
-                        
-                        col1, col2, col3 = st.columns(3)
-                        col1.metric("初始资产", f"${swing_initial_value:,.2f}")
-                        col2.metric("最终资产", f"${swing_final_value:,.2f}")
-                        col3.metric("总收益率", f"{swing_returns:.2f}%", f"{swing_returns - buy_and_hold_return:.2f}%")
-                        
-                        # 交易统计
-                        # 使用positions数据计算实际执行的交易
-                        shares_changes = swing_trader.positions['Shares'].diff()
-                        actual_buys = sum(shares_changes > 0)
-                        actual_sells = sum(shares_changes < 0)
-                        
-                        st.write("### 交易统计")
-                        col1, col2, col3 = st.columns(3)
-                        col1.metric("实际买入交易", f"{actual_buys} 次")
-                        col2.metric("实际卖出交易", f"{actual_sells} 次") 
-                        col3.metric("每次交易", f"{trade_shares} 股")
-                        
-                        # 与买入持有策略比较
-                        st.write(f"买入持有策略收益率: {buy_and_hold_return:.2f}% (最终价值: ${buy_and_hold_value:,.2f})")
-                        st.write(f"波段策略 vs 买入持有: {swing_returns - buy_and_hold_return:.2f}%")
-                        
-                        # 添加：显示波段策略交易数据表格
-                        st.write("### 波段交易详细记录")
-                        # 创建一个新的DataFrame，只包含实际发生交易的日期
-                        trade_records = pd.DataFrame(index=swing_trader.positions.index)
-                        trade_records['Shares_Change'] = swing_trader.positions['Shares'].diff()
-                        trade_records = trade_records[trade_records['Shares_Change'] != 0].copy()
-                        
-                        if not trade_records.empty:
-                            # 添加易读的信号描述
-                            trade_records['交易类型'] = trade_records['Shares_Change'].apply(lambda x: '买入' if x > 0 else '卖出')
-                            trade_records['价格'] = swing_trader.data.loc[trade_records.index, 'Close'].map('${:.2f}'.format)
-                            trade_records['交易股数'] = trade_records['Shares_Change'].abs()
-                            trade_records['交易金额'] = trade_records['Shares_Change'].abs() * swing_trader.data.loc[trade_records.index, 'Close']
-                            trade_records['交易金额'] = trade_records['交易金额'].map('${:.2f}'.format)
-                            
-                            # 选择要显示的列并按日期排序
-                            display_records = trade_records[['交易类型', '价格', '交易股数', '交易金额']].sort_index()
-                            st.dataframe(display_records)
-                            
-                            # 显示交易统计
-                            st.write(f"总计交易次数：{len(display_records)}次")
-                            buy_count = len(display_records[display_records['交易类型'] == '买入'])
-                            sell_count = len(display_records[display_records['交易类型'] == '卖出'])
-                            st.write(f"买入：{buy_count}次，卖出：{sell_count}次")
-                        else:
-                            st.info("没有产生交易信号")
-                    except Exception as e:
-                        st.error(f"运行波段策略时发生错误：{str(e)}")
-            
-            if strategy_type in ["两种策略对比", "仅期权策略"]:
-                with st.spinner('运行期权交易策略...'):
-                    st.subheader("期权交易策略")
-                    # 运行期权策略
-                    print("正在运行期权交易策略...")
-                    try:
-                        option_trader = OptionTrader(
-                            data=stock_data,
-                            initial_shares=initial_shares,
-                            trade_shares=trade_shares,
-                            threshold=swing_threshold,
-                            premium_rate=premium_rate
-                        )
-                        
-                        # 获取每月最后一个交易日
-                        last_days = option_trader.data.groupby(pd.Grouper(freq='M')).apply(lambda x: x.index[-1] if not x.empty else None)
-                        last_days = last_days[last_days.notna()]  # 移除空值
-                        option_trader.data['IsLastDayOfMonth'] = option_trader.data.index.isin(last_days)
-                        
-                        # 显示期权策略结果
-                        option_initial_value = option_trader.positions['Total_Asset'].iloc[0]
-                        option_final_value = option_trader.positions['Total_Asset'].iloc[-1]
-                        option_returns = ((option_final_value - option_initial_value) / option_initial_value * 100) if option_initial_value != 0 else 0
-                        total_premium = option_trader.positions['Premium_Income'].iloc[-1]
-                        
-                        put_signals = sum(option_trader.positions['Signal'] == 1)
-                        call_signals = sum(option_trader.positions['Signal'] == -1)
-                        exercised = sum(option_trader.positions['IsExercised'])
-                        
-                        # 保存信号计数供后续使用
-                        option_put_signals = put_signals
-                        option_call_signals = call_signals
-                        option_exercised = exercised
-                        
-                        print(f"期权策略结果:")
-                        print(f"- 初始资产: ${option_initial_value:,.2f}")
-                        print(f"- 最终资产: ${option_final_value:,.2f}")
-                        print(f"- 总收益率: {option_returns:.2f}%")
-                        print(f"- 累计权利金: ${total_premium:,.2f}")
-                        print(f"- 卖出看跌期权: {put_signals}次")
-                        print(f"- 卖出看涨期权: {call_signals}次")
-                        print(f"- 期权被行权: {exercised}次")
-                        
-                        # 显示期权策略图表
-                        st.plotly_chart(plot_price_chart(
-                            option_trader.data, 
-                            option_trader.positions, 
-                            title=f"{symbol} 期权交易策略信号"
-                        ), use_container_width=True)
-                        
-                        # 显示期权策略结果
-                        initial_value = option_trader.positions['Total_Asset'].iloc[0]
-                        final_value = option_trader.positions['Total_Asset'].iloc[-1]
-                        returns = (final_value - initial_value) / initial_value * 100
-                        
-                        col1, col2, col3, col4 = st.columns(4)
-                        col1.metric("初始资产", f"${initial_value:,.2f}")
-                        col2.metric("最终资产", f"${final_value:,.2f}")
-                        col3.metric("总收益率", f"{returns:.2f}%", f"{returns - buy_and_hold_return:.2f}%")
-                        col4.metric("累计权利金", f"${total_premium:,.2f}", f"{total_premium/initial_value*100:.2f}%")
-                        
-                        # 交易统计
-                        # 使用positions数据计算实际执行的期权交易
-                        option_records = option_trader.data[(option_trader.data['Signal'] != 0) | (option_trader.data['IsExercised'] == True)].copy()
-                        actual_put_signals = len(option_records[option_records['Signal'] == 1])
-                        actual_call_signals = len(option_records[option_records['Signal'] == -1])
-                        actual_exercised = sum(option_records['IsExercised'])
-                        
-                        st.write("### 交易统计")
-                        col1, col2, col3, col4 = st.columns(4)
-                        col1.metric("卖出看跌期权", f"{actual_put_signals} 次")
-                        col2.metric("卖出看涨期权", f"{actual_call_signals} 次") 
-                        col3.metric("期权被行权", f"{actual_exercised} 次", 
-                                  f"{(actual_exercised/(actual_put_signals+actual_call_signals)*100) if (actual_put_signals+actual_call_signals) > 0 else 0:.2f}%")
-                        col4.metric("每次期权交易", f"{trade_shares} 股")
-                        
-                        # 与买入持有策略比较
-                        buy_and_hold_value = initial_shares * stock_data['Close'].iloc[-1] + 100000  # 假设初始现金10万
-                        buy_and_hold_return = (stock_data['Close'].iloc[-1] / stock_data['Close'].iloc[0] - 1) * 100
-                        st.write(f"买入持有策略收益率: {buy_and_hold_return:.2f}% (最终价值: ${buy_and_hold_value:,.2f})")
-                        st.write(f"期权策略 vs 买入持有: {returns - buy_and_hold_return:.2f}%")
-                        
-                        # 添加：显示期权策略交易数据表格
-                        st.write("### 期权交易详细记录")
-                        # 创建一个新的DataFrame，只包含期权交易记录
-                        option_records = option_trader.data[(option_trader.data['Signal'] != 0) | (option_trader.data['IsExercised'] == True)].copy()
-                        if not option_records.empty:
-                            # 添加交易描述和格式化数据
-                            def get_option_action(row):
-                                if row['Signal'] == 1:
-                                    return '卖出看跌期权'
-                                elif row['Signal'] == -1:
-                                    return '卖出看涨期权'
-                                elif row['IsExercised'] == True:
-                                    return f"期权被行权 ({row['OptionType']})"
-                                return '无操作'
-                            
-                            option_records['操作'] = option_records.apply(get_option_action, axis=1)
-                            option_records['价格'] = option_records['Close'].map('${:.2f}'.format)
-                            option_records['行权价'] = option_records['StrikePrice'].apply(lambda x: f"${x:.2f}" if x > 0 else "-")
-                            option_records['权利金'] = option_records['Premium'].apply(lambda x: f"${x:.2f}" if x > 0 else "-")
-                            option_records['期权股数'] = option_records['OptionShares'].apply(lambda x: f"{x}" if x > 0 else "-")
-                            
-                            # 选择要显示的列
-                            display_columns = ['操作', '价格', '行权价', '权利金', '期权股数']
-                            st.dataframe(option_records[display_columns])
-                    except Exception as e:
-                        st.error(f"运行期权策略时发生错误：{str(e)}")
+        swing_events = swing_trader.events
+        buy_signals = int(np.count_nonzero(swing_events['type'] == EVENT_BUY))
+        sell_signals = int(np.count_nonzero(swing_events['type'] == EVENT_SELL))
+        
+        print(f"波段策略结果:")
+        print(f"- 初始资产: ${swing_initial_value:,.2f}")
+        print(f"- 最终资产: ${swing_final_value:,.2f}")
+        print(f"- 总收益率: {swing_returns:.2f}%")
+        print(f"- 买入交易: {buy_signals}次")
+        print(f"- 卖出交易: {sell_signals}次")
+        
+        # 显示波段策略交易信号图表
+        render_chart(stages['swing_figure'])
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("初始资产", f"${swing_initial_value:,.2f}")
+        col2.metric("最终资产", f"${swing_final_value:,.2f}")
+        col3.metric("总收益率", f"{swing_returns:.2f}%", f"{swing_returns - buy_and_hold_return:.2f}%")
+        
+        # 交易统计（使用事件日志计算实际执行的交易）
+        actual_buys, actual_sells = executed_trades(swing_trader)
+        
+        st.write("### 交易统计")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("实际买入交易", f"{actual_buys} 次")
+        col2.metric("实际卖出交易", f"{actual_sells} 次") 
+        col3.metric("每次交易", f"{trade_shares} 股")
+        
+        # 与买入持有策略比较
+        st.write(f"买入持有策略收益率: {buy_and_hold_return:.2f}% (最终价值: ${buy_and_hold_value:,.2f})")
+        st.write(f"波段策略 vs 买入持有: {swing_returns - buy_and_hold_return:.2f}%")
+        
+        # 显示波段策略交易数据表格
+        st.write("### 波段交易详细记录")
+        # 只包含实际发生交易的日期（向量化构建，数值格式化由前端完成）
+        trade_records = swing_trade_table(swing_events, swing_trader.data.index)
+        
+        if not trade_records.empty:
+            render_table(trade_records, SWING_TABLE_FORMATS, key='swing_trades_page')
             
-            # 如果两种策略都运行了，进行对比分析
-            if strategy_type == "两种策略对比" and swing_trader and option_trader:
-                st.subheader("策略对比分析")
-                
-                # 两种策略资产对比图
-                st.plotly_chart(plot_asset_comparison(
-                    {
-                        'results': option_trader.positions,
-                        'buy_hold_value': buy_and_hold_value  # 使用买入持有策略的最终价值
-                    }
-                ), use_container_width=True)
-                
-                # 对比表格
-                comparison_data = {
-                    "指标": ["总收益率", "相对买入持有", "交易次数", "最终资产值"],
-                    "波段策略": [
-                        f"{swing_returns:.2f}%", 
-                        f"{swing_returns - buy_and_hold_return:.2f}%", 
-                        f"{actual_buys + actual_sells}次", 
-                        f"${swing_trader.positions['Total_Asset'].iloc[-1]:,.2f}"
-                    ],
-                    "期权策略": [
-                        f"{option_returns:.2f}%", 
-                        f"{option_returns - buy_and_hold_return:.2f}%", 
-                        f"{option_put_signals + option_call_signals}次", 
-                        f"${option_trader.positions['Total_Asset'].iloc[-1]:,.2f}"
-                    ],
-                    "买入持有": [
-                        f"{buy_and_hold_return:.2f}%", 
-                        "0.00%", 
-                        "0次", 
-                        f"${buy_and_hold_value:,.2f}"
-                    ]
-                }
-                
-                comparison_df = pd.DataFrame(comparison_data)
-                st.table(comparison_df)
-                
-                # 策略分析结论
-                st.write("### 策略分析结论")
-                
-                # 自动生成结论
-                better_strategy = "波段策略" if swing_returns > option_returns else "期权策略"
-                diff = abs(swing_returns - option_returns)
-                
-                st.write(f"1. 在回测期间（{start_date} 至 {end_date}），{better_strategy}表现更好，高出{diff:.2f}个百分点")
-                
-                if swing_returns > buy_and_hold_return and option_returns > buy_and_hold_return:
-                    st.write("2. 两种策略均优于买入持有策略")
-                elif swing_returns > buy_and_hold_return:
-                    st.write("2. 波段策略优于买入持有策略，但期权策略表现不及买入持有")
-                elif option_returns > buy_and_hold_return:
-                    st.write("2. 期权策略优于买入持有策略，但波段策略表现不及买入持有")
-                else:
-                    st.write("2. 两种策略均不如买入持有策略")
-                
-                st.write(f"3. 累计权利金收入占初始资产的{total_premium/initial_value*100:.2f}%，是期权策略的主要收益来源")
-                
-                # 下载报告
-                if swing_trader and option_trader:
-                    # 生成报告数据
-                    report_data = pd.DataFrame()
-                    report_data['Date'] = stock_data.index
-                    report_data['Close'] = stock_data['Close']
-                    report_data['Reference_Price'] = stock_data['Close'].rolling(window=20).mean()
-                    report_data['Swing_Signal'] = swing_trader.positions['Signal']
-                    report_data['Swing_Total_Asset'] = swing_trader.positions['Total_Asset']
-                    report_data['Option_Signal'] = option_trader.positions['Signal']
-                    report_data['Option_Type'] = option_trader.data['OptionType']
-                    report_data['Option_Total_Asset'] = option_trader.positions['Total_Asset']
-                    report_data['Option_Premium_Income'] = option_trader.positions['Premium_Income']
-                    
-                    st.markdown(get_excel_download_link(report_data), unsafe_allow_html=True)
+            # 显示交易统计
+            st.write(f"总计交易次数：{len(trade_records)}次")
+            st.write(f"买入：{actual_buys}次，卖出：{actual_sells}次")
+        else:
+            st.info("没有产生交易信号")
+    except Exception as e:
+        st.error(f"运行波段策略时发生错误：{str(e)}")
+
+@fragment
+def option_panel(analysis):
+    st.subheader("期权交易策略")
+    print("正在运行期权交易策略...")
+    with st.spinner('运行期权交易策略...'):
+        stages = run_stages(analysis, ['option', 'option_figure', 'benchmark'])
+    if not stages:
+        return
+    option_trader = stages['option']
+    buy_and_hold_value = stages['benchmark']['final_value']
+    buy_and_hold_return = stages['benchmark']['return_pct']
+    trade_shares = analysis['trade_shares']
+    try:
+        # 显示期权策略结果
+        initial_value = option_trader.initial_asset
+        final_value = option_trader.final_asset
+        returns = total_return(option_trader)
+        total_premium = option_trader.total_premium
+        put_signals, call_signals, exercised = option_counts(option_trader)
+        
+        print(f"期权策略结果:")
+        print(f"- 初始资产: ${initial_value:,.2f}")
+        print(f"- 最终资产: ${final_value:,.2f}")
+        print(f"- 总收益率: {returns:.2f}%")
+        print(f"- 累计权利金: ${total_premium:,.2f}")
+        print(f"- 卖出看跌期权: {put_signals}次")
+        print(f"- 卖出看涨期权: {call_signals}次")
+        print(f"- 期权被行权: {exercised}次")
+        
+        # 显示期权策略图表
+        render_chart(stages['option_figure'])
+        
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("初始资产", f"${initial_value:,.2f}")
+        col2.metric("最终资产", f"${final_value:,.2f}")
+        col3.metric("总收益率", f"{returns:.2f}%", f"{returns - buy_and_hold_return:.2f}%")
+        col4.metric("累计权利金", f"${total_premium:,.2f}", f"{total_premium/initial_value*100:.2f}%")
+        
+        # 交易统计（使用事件日志计算实际执行的期权交易）
+        st.write("### 交易统计")
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("卖出看跌期权", f"{put_signals} 次")
+        col2.metric("卖出看涨期权", f"{call_signals} 次") 
+        col3.metric("期权被行权", f"{exercised} 次", 
+                  f"{(exercised/(put_signals+call_signals)*100) if (put_signals+call_signals) > 0 else 0:.2f}%")
+        col4.metric("每次期权交易", f"{trade_shares} 股")
+        
+        # 与买入持有策略比较
+        st.write(f"买入持有策略收益率: {buy_and_hold_return:.2f}% (最终价值: ${buy_and_hold_value:,.2f})")
+        st.write(f"期权策略 vs 买入持有: {returns - buy_and_hold_return:.2f}%")
+        
+        # 显示期权策略交易数据表格
+        st.write("### 期权交易详细记录")
+        # 期权交易记录（向量化构建，数值格式化由前端完成）
+        option_records = option_trade_table(option_trader.events, analysis['data'].index)
+        if not option_records.empty:
+            render_table(option_records, OPTION_TABLE_FORMATS, key='option_trades_page')
+    except Exception as e:
+        st.error(f"运行期权策略时发生错误：{str(e)}")
+
+@fragment
+def comparison_panel(analysis, start_date, end_date):
+    st.subheader("策略对比分析")
+    with st.spinner('计算交易信号...'):
+        stages = run_stages(analysis, ['swing', 'option', 'benchmark', 'metrics', 'asset_figure'])
+    if not stages:
+        return
+    swing_trader = stages['swing']
+    option_trader = stages['option']
+    buy_and_hold_value = stages['benchmark']['final_value']
+    buy_and_hold_return = stages['benchmark']['return_pct']
+    swing_returns = total_return(swing_trader)
+    option_returns = total_return(option_trader)
+    actual_buys, actual_sells = executed_trades(swing_trader)
+    option_put_signals, option_call_signals, _ = option_counts(option_trader)
+    
+    # 两种策略资产对比图
+    render_chart(stages['asset_figure'])
+    
+    # 对比表格
+    comparison_data = {
+        "指标": ["总收益率", "相对买入持有", "交易次数", "最终资产值"],
+        "波段策略": [
+            f"{swing_returns:.2f}%", 
+            f"{swing_returns - buy_and_hold_return:.2f}%", 
+            f"{actual_buys + actual_sells}次", 
+            f"${swing_trader.final_asset:,.2f}"
+        ],
+        "期权策略": [
+            f"{option_returns:.2f}%", 
+            f"{option_returns - buy_and_hold_return:.2f}%", 
+            f"{option_put_signals + option_call_signals}次", 
+            f"${option_trader.final_asset:,.2f}"
+        ],
+        "买入持有": [
+            f"{buy_and_hold_return:.2f}%", 
+            "0.00%", 
+            "0次", 
+            f"${buy_and_hold_value:,.2f}"
+        ]
+    }
+    
+    comparison_df = pd.DataFrame(comparison_data)
+    st.table(comparison_df)
+    
+    # 风险与绩效指标（两种策略的指标来自流水线缓存，买入持有单独计算）
+    st.write("### 风险与绩效指标")
+    with phase('metrics.compute'):
+        close_values = analysis['data']['Close'].to_numpy(dtype=np.float64)
+        strategy_metrics = stages['metrics']
+        hold_shares = np.full(len(close_values), float(analysis['initial_shares']))
+        hold_cash = np.full(len(close_values), swing_trader.initial_cash)
+        hold_metrics = performance_metrics(hold_shares * close_values + hold_cash, hold_shares, hold_cash,
+                                           close_values, periods_per_year=analysis['periods_per_year'],
+                                           names=["买入持有"])
+    st.table(format_metrics(pd.concat([strategy_metrics, hold_metrics])))
+    
+    # 策略分析结论
+    st.write("### 策略分析结论")
+    
+    # 自动生成结论
+    better_strategy = "波段策略" if swing_returns > option_returns else "期权策略"
+    diff = abs(swing_returns - option_returns)
+    
+    st.write(f"1. 在回测期间（{start_date} 至 {end_date}），{better_strategy}表现更好，高出{diff:.2f}个百分点")
+    
+    if swing_returns > buy_and_hold_return and option_returns > buy_and_hold_return:
+        st.write("2. 两种策略均优于买入持有策略")
+    elif swing_returns > buy_and_hold_return:
+        st.write("2. 波段策略优于买入持有策略，但期权策略表现不及买入持有")
+    elif option_returns > buy_and_hold_return:
+        st.write("2. 期权策略优于买入持有策略，但波段策略表现不及买入持有")
+    else:
+        st.write("2. 两种策略均不如买入持有策略")
+    
+    total_premium = option_trader.total_premium
+    initial_value = option_trader.initial_asset
+    st.write(f"3. 累计权利金收入占初始资产的{total_premium/initial_value*100:.2f}%，是期权策略的主要收益来源")
+
+@fragment
+def export_panel(analysis):
+    st.subheader("导出报告")
+    stages = run_stages(analysis, ['report'])
+    if not stages:
+        return
+    report_data = stages['report']
+    st.write(f"报告包含 {len(report_data)} 个交易日的价格、两种策略的信号和资产")
+    st.markdown(get_excel_download_link(report_data), unsafe_allow_html=True)
+
+# 分析结果：各面板放在按需渲染的标签页中，切换标签页只重新运行本片段和打开的面板
+ANALYSIS_TABS = ["价格数据", "波段策略", "期权策略", "策略对比", "导出报告"]
+
+@fragment
+def analysis_panels(analysis, timeframe, start_date, end_date):
+    tabs = lazy_tabs(ANALYSIS_TABS, key='analysis_tab')
+    panels = [
+        lambda: data_panel(analysis, timeframe),
+        lambda: swing_panel(analysis),
+        lambda: option_panel(analysis),
+        lambda: comparison_panel(analysis, start_date, end_date),
+        lambda: export_panel(analysis),
+    ]
+    for tab, panel in zip(tabs, panels):
+        with tab:
+            if is_open(tab):
+                panel()
+
+# 主应用逻辑
+if st.session_state.get('analysis_active'):
+    st.session_state['profile_run'] = profiler.start_run()
+    with st.spinner('正在获取股票数据...'):
+        # 获取股票数据（进程内共享的只读数据，参数变化时不会重新获取）
+        stock_data = get_stock_data(symbol, start_date, end_date, timeframe)
+    
+    if stock_data is not None:
+        analysis_panels(
+            dict(
+                data=stock_data,
+                symbol=symbol,
+                initial_shares=initial_shares,
+                trade_shares=trade_shares,
+                threshold=swing_threshold,
+                premium_rate=premium_rate,
+                lean=lean_mode,
+                periods_per_year=periods_per_year(timeframe)
+            ),
+            timeframe, start_date, end_date
+        )
 else:
     # 介绍和使用说明
     st.markdown("""
@@ -639,4 +773,20 @@ else:
     """)
     
     # 显示示例图片
-    st.image("https://www.investopedia.com/thmb/4KSHYJhZuIfaW-_8M9Bk-CuqUMc=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/dotdash_Final_Swing_Trading_Sep_2020-01-71f8a6715c0b47ffbb9ce640c52b8577.jpg", caption="波段交易示意图") 
\ No newline at end of file
+    st.image("https://www.investopedia.com/thmb/4KSHYJhZuIfaW-_8M9Bk-CuqUMc=/1500x0/filters:no_upscale():max_bytes(150000):strip_icc()/dotdash_Final_Swing_Trading_Sep_2020-01-71f8a6715c0b47ffbb9ce640c52b8577.jpg", caption="波段交易示意图")
+
+# 填充性能剖析面板
+with profile_panel:
+    if profiler.enabled:
+        profile_run = st.session_state.get('profile_run')
+        profile_summary = profiler.summary(run_id=profile_run) if profile_run else []
+        if profile_summary:
+            summary_df = pd.DataFrame(profile_summary).set_index('phase')
+            summary_df.columns = ['调用次数', '墙钟时间(ms)', 'CPU时间(ms)', '内存峰值(KB)']
+            st.dataframe(summary_df.round(1))
+        else:
+            st.write("运行一次策略分析后显示各阶段耗时")
+        if profiler.jsonl_path:
+            st.caption(f"剖析记录同时写入 {profiler.jsonl_path}")
+    else:
+        st.write("设置环境变量 PROFILE_PHASES=1 后启动应用，记录API、缓存、信号生成、回测、图表构建和表格渲染各阶段的耗时与内存峰值")
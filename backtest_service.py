@@ -0,0 +1,671 @@
+import json
+import time
+import argparse
+import threading
+import http.client
+from itertools import chain
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+from profiler import phase
+from memory_utils import readonly_array
+from signal_engine import multi_threshold_crossings, buy_and_hold
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from threshold_sweep import threshold_sweep
+from performance_metrics import trader_metrics
+from shared_prices import SharedPriceRegistry
+from trade_events import EVENT_NAMES, EVENT_SELL_PUT, EVENT_SELL_CALL, EVENT_PUT_EXERCISED, EVENT_CALL_EXERCISED
+
+# 回测请求的参数和默认值（与应用侧边栏的默认值一致）
+RUN_DEFAULTS = {
+    'initial_shares': 1000,
+    'trade_shares': 100,
+    'threshold': 0.1,
+    'premium_rate': 0.05,
+}
+STRATEGIES = ('swing', 'option')
+# 流式响应每个分块包含的行数
+STREAM_CHUNK_LINES = 500
+
+
+def _plain(value):
+    """numpy 标量转为 Python 数值，NaN 和无穷大转为 None（JSON 不支持）"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def _record(row):
+    return {str(key): _plain(value) for key, value in row.items()}
+
+
+def _date(value, name):
+    try:
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的日期 {name}：{value!r}")
+
+
+def _number(payload, name, cast, positive=False, non_negative=False):
+    value = payload.get(name, RUN_DEFAULTS.get(name))
+    try:
+        value = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"参数 {name} 无效：{value!r}")
+    if positive and not value > 0:
+        raise ValueError(f"参数 {name} 必须为正数")
+    if non_negative and not value >= 0:
+        raise ValueError(f"参数 {name} 不能为负数")
+    return value
+
+
+def parse_thresholds(value):
+    """阈值列表，或 '0.02:0.3:15'（等间距的15个阈值）、'0.05,0.1,0.2' 形式的字符串"""
+    if isinstance(value, str):
+        if ':' in value:
+            start, stop, count = value.split(':')
+            value = np.linspace(float(start), float(stop), int(count)).tolist()
+        else:
+            value = value.split(',')
+    try:
+        thresholds = [float(threshold) for threshold in value]
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的阈值列表：{value!r}")
+    if not thresholds or min(thresholds) <= 0:
+        raise ValueError("阈值列表不能为空，且阈值必须为正数")
+    return thresholds
+
+
+def parse_request(payload, sweep=False):
+    """
+    校验并规范化请求参数
+    :param payload: 请求体解析出的字典
+    :param sweep: 是否为阈值扫描请求（需要 thresholds，而不是 threshold）
+    :return: 规范化后的参数字典，相同含义的请求得到相同的字典
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("请求体必须是JSON对象")
+    symbol = str(payload.get('symbol') or '').strip().upper()
+    if not symbol:
+        raise ValueError("缺少参数 symbol")
+    if 'start' not in payload or 'end' not in payload:
+        raise ValueError("缺少参数 start 或 end")
+    request = {
+        'symbol': symbol,
+        'start': _date(payload['start'], 'start'),
+        'end': _date(payload['end'], 'end'),
+        'initial_shares': _number(payload, 'initial_shares', int, non_negative=True),
+        'trade_shares': _number(payload, 'trade_shares', int, positive=True),
+        'premium_rate': _number(payload, 'premium_rate', float, positive=True),
+        'metrics': bool(payload.get('metrics', True)),
+    }
+    if sweep:
+        request['thresholds'] = parse_thresholds(payload.get('thresholds'))
+        return request
+    request['threshold'] = _number(payload, 'threshold', float, positive=True)
+    strategy = payload.get('strategy', 'both')
+    if strategy not in STRATEGIES + ('both',):
+        raise ValueError(f"不支持的策略：{strategy}")
+    request['strategies'] = list(STRATEGIES) if strategy == 'both' else [strategy]
+    request['events'] = bool(payload.get('events', False))
+    return request
+
+
+class RequestCoalescer:
+    """
+    合并并发的相同请求：同一键正在计算时，后到的请求等待并共享同一个结果，而不是重复计算
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def run(self, key, compute):
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def inflight(self):
+        with self._lock:
+            return len(self._inflight)
+
+
+class _Batch:
+    __slots__ = ('items', 'full')
+
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+
+
+class RequestBatcher:
+    """
+    把批次键相同的请求在短时间窗口内合并成一次批量计算
+    第一个到达的请求等待 window 秒（或批次已满）后，用自己的线程为整批请求计算，
+    其余请求等待各自的结果。
+    """
+
+    def __init__(self, run_batch, window=0.005, max_batch=256):
+        """
+        :param run_batch: run_batch(批次键, 请求项列表) -> 与请求项一一对应的结果列表
+        :param window: 收集同一批请求的等待时间（秒）
+        :param max_batch: 每批最多的请求数，达到时立即计算
+        """
+        self.run_batch = run_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.counters = {'batches': 0, 'batched': 0}
+
+    def submit(self, batch_key, item):
+        future = Future()
+        with self._lock:
+            batch = self._pending.get(batch_key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[batch_key] = _Batch()
+            batch.items.append((item, future))
+            if len(batch.items) >= self.max_batch:
+                # 已满的批次不再接收新请求
+                del self._pending[batch_key]
+                batch.full.set()
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending.get(batch_key) is batch:
+                    del self._pending[batch_key]
+                self.counters['batches'] += 1
+                self.counters['batched'] += len(batch.items)
+            self._run(batch_key, batch.items)
+        return future.result()
+
+    def _run(self, batch_key, items):
+        try:
+            results = self.run_batch(batch_key, [item for item, _ in items])
+        except BaseException as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+
+
+class ServiceStats:
+    """各接口的请求数、错误数、延迟分位数和最近一段时间的吞吐量"""
+
+    def __init__(self, window=60.0, samples=4096):
+        """
+        :param window: 吞吐量的统计窗口（秒）
+        :param samples: 每个接口保留的最近延迟样本数
+        """
+        self.window = window
+        self.samples = samples
+        self.started = time.time()
+        self._latencies = {}
+        self._counts = {}
+        self._errors = {}
+        self._completed = deque(maxlen=100000)
+        self._lock = threading.Lock()
+        self.counters = {'streamed': 0, 'bytes_sent': 0}
+
+    def record(self, endpoint, seconds, error=False, sent=0, streamed=False):
+        now = time.time()
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self.samples)).append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+            if error:
+                self._errors[endpoint] = self._errors.get(endpoint, 0) + 1
+            self._completed.append(now)
+            self.counters['bytes_sent'] += sent
+            if streamed:
+                self.counters['streamed'] += 1
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            latencies = {endpoint: np.array(values) for endpoint, values in self._latencies.items()}
+            counts = dict(self._counts)
+            errors = dict(self._errors)
+            recent = sum(1 for stamp in self._completed if stamp > now - self.window)
+            counters = dict(self.counters)
+        endpoints = {}
+        for endpoint, values in latencies.items():
+            p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+            endpoints[endpoint] = {
+                'requests': counts[endpoint],
+                'errors': errors.get(endpoint, 0),
+                'mean_ms': round(float(values.mean()) * 1000, 3),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+            }
+        uptime = now - self.started
+        counters.update({
+            'uptime_seconds': round(uptime, 1),
+            'requests': sum(counts.values()),
+            'errors': sum(errors.values()),
+            'throughput_rps': round(recent / max(min(self.window, uptime), 1e-9), 1),
+            'endpoints': endpoints,
+        })
+        return counters
+
+
+class BacktestService:
+    """
+    回测服务的计算部分（与HTTP无关）
+    - 价格数据通过 SharedPriceRegistry 加载，所有请求共享同一份只读数据；
+    - 结果按规范化的请求参数缓存 result_ttl 秒，缓存中没有时并发的相同请求只计算一次；
+    - 只有阈值不同的回测请求合并成一批，由 multi_threshold_crossings 一次扫描得到所有阈值的信号，
+      绩效指标也对整批策略一起计算。
+    """
+
+    def __init__(self, load, registry=None, batch_window=0.005, max_batch=256, max_results=1024, result_ttl=300.0):
+        """
+        :param load: load(股票代码, 开始日期, 结束日期) -> 价格DataFrame，没有数据时返回None或空数据
+        :param registry: SharedPriceRegistry，默认使用 cache/shared
+        :param batch_window: 回测请求的批量合并窗口（秒），0 表示只合并同时到达的请求
+        :param max_batch: 每批最多的回测请求数
+        :param max_results: 结果缓存的最大条数
+        :param result_ttl: 结果缓存的有效期（秒），不超过价格数据的重新加载周期
+        """
+        self.load = load
+        self.registry = registry if registry is not None else SharedPriceRegistry()
+        self.max_results = max_results
+        self.result_ttl = result_ttl
+        self.coalescer = RequestCoalescer()
+        self.batcher = RequestBatcher(self._run_batch, window=batch_window, max_batch=max_batch)
+        self.stats = ServiceStats()
+        self._results = OrderedDict()
+        self._results_lock = threading.Lock()
+        self.counters = {'result_hits': 0, 'computed': 0}
+
+    def _prices(self, symbol, start, end):
+        key = self.registry.key_for(symbol, start, end)
+        lease = self.registry.acquire(key, lambda: self.load(symbol, start, end))
+        if lease is None:
+            raise LookupError(f"没有 {symbol} 在 {start} 至 {end} 的价格数据")
+        return lease
+
+    def _count(self, name, amount=1):
+        with self._results_lock:
+            self.counters[name] += amount
+
+    def _cached(self, key, compute):
+        with self._results_lock:
+            cached = self._results.get(key)
+            if cached is not None and time.time() - cached[0] < self.result_ttl:
+                self._results.move_to_end(key)
+                self.counters['result_hits'] += 1
+                return cached[1]
+        result = self.coalescer.run(key, compute)
+        with self._results_lock:
+            self._results[key] = (time.time(), result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result
+
+    def backtest(self, request):
+        """
+        单个阈值的回测
+        :param request: parse_request 的结果
+        :return: (摘要字典, {策略: (事件日志, 日期索引)})，事件日志只在请求 events 时用于流式输出
+        """
+        batch_key = tuple(request[name] for name in ('symbol', 'start', 'end', 'initial_shares', 'trade_shares',
+                                                     'premium_rate'))
+        key = ('backtest',) + batch_key + (request['threshold'],)
+        result = self._cached(key, lambda: self.batcher.submit(batch_key, request['threshold']))
+        summary = {name: value for name, value in result['summary'].items() if name not in STRATEGIES}
+        for strategy in request['strategies']:
+            strategy_summary = dict(result['summary'][strategy])
+            if not request['metrics']:
+                strategy_summary.pop('metrics')
+            summary[strategy] = strategy_summary
+        events = {strategy: result['events'][strategy] for strategy in request['strategies']}
+        return summary, (events, result['index'])
+
+    def _run_batch(self, batch_key, thresholds):
+        """同一价格数据和交易参数、不同阈值的一批回测"""
+        symbol, start, end, initial_shares, trade_shares, premium_rate = batch_key
+        unique = sorted(set(thresholds))
+        with self._prices(symbol, start, end) as data:
+            close = readonly_array(data['Close'])
+            with phase('service.batch', symbol=symbol, thresholds=len(unique)):
+                signals = multi_threshold_crossings(close, unique)
+                swings, options = [], []
+                for k, threshold in enumerate(unique):
+                    params = dict(initial_shares=initial_shares, trade_shares=trade_shares, threshold=threshold,
+                                  lean=True, signals=signals[k])
+                    swings.append(SwingTrader(data, **params))
+                    options.append(OptionTrader(data, premium_rate=premium_rate, **params))
+                metrics = trader_metrics(swings + options, close)
+            benchmark = buy_and_hold(close, initial_shares)
+            index = data.index.strftime('%Y-%m-%d')
+        self._count('computed', len(unique))
+        by_threshold = {}
+        for k, threshold in enumerate(unique):
+            swing, option = swings[k], options[k]
+            option_types = option.events['type']
+            by_threshold[threshold] = {
+                'summary': {
+                    'symbol': symbol,
+                    'start': start,
+                    'end': end,
+                    'bars': len(close),
+                    'threshold': threshold,
+                    'signals': int(signals.counts()[k]),
+                    'buy_and_hold': {name: _plain(value) for name, value in benchmark.items()},
+                    'swing': {
+                        'final_asset': swing.final_asset,
+                        'return_pct': (swing.final_asset / swing.initial_asset - 1) * 100,
+                        'trades': int(np.count_nonzero(swing.events['qty'] > 0)),
+                        'metrics': _record(metrics.iloc[k]),
+                    },
+                    'option': {
+                        'final_asset': option.final_asset,
+                        'return_pct': (option.final_asset / option.initial_asset - 1) * 100,
+                        'premium': option.total_premium,
+                        'options_sold': int(np.count_nonzero(
+                            (option_types == EVENT_SELL_PUT) | (option_types == EVENT_SELL_CALL))),
+                        'exercised': int(np.count_nonzero(
+                            (option_types == EVENT_PUT_EXERCISED) | (option_types == EVENT_CALL_EXERCISED))),
+                        'metrics': _record(metrics.iloc[len(unique) + k]),
+                    },
+                },
+                'events': {'swing': swing.events, 'option': option.events},
+                'index': index,
+            }
+        return [by_threshold[threshold] for threshold in thresholds]
+
+    def sweep(self, request):
+        """阈值扫描，返回 threshold_sweep 的结果表（每个阈值一行）"""
+        key = ('sweep',) + tuple(request[name] for name in ('symbol', 'start', 'end', 'initial_shares',
+                                                            'trade_shares', 'premium_rate', 'metrics'))
+        key += (tuple(request['thresholds']),)
+
+        def compute():
+            with self._prices(request['symbol'], request['start'], request['end']) as data:
+                table = threshold_sweep(data, request['thresholds'], initial_shares=request['initial_shares'],
+                                        trade_shares=request['trade_shares'], premium_rate=request['premium_rate'],
+                                        metrics=request['metrics'])
+            self._count('computed', len(table))
+            return table
+
+        return self._cached(key, compute)
+
+    def status(self):
+        """服务计数器：请求延迟和吞吐量、合并和批量计算的次数、结果缓存和共享价格数据"""
+        snapshot = self.stats.snapshot()
+        snapshot.update(self.batcher.counters)
+        snapshot['coalesced'] = self.coalescer.coalesced
+        snapshot['inflight'] = self.coalescer.inflight()
+        with self._results_lock:
+            snapshot.update(self.counters)
+            snapshot['cached_results'] = len(self._results)
+        snapshot['prices'] = self.registry.stats()
+        return snapshot
+
+
+def event_lines(events, index):
+    """事件日志逐行转为JSON对象（流式输出）"""
+    for strategy, log in events.items():
+        for bar, kind, qty, price, strike, premium in log.tolist():
+            yield {'strategy': strategy, 'date': index[bar], 'type': EVENT_NAMES[kind], 'qty': qty, 'price': price,
+                   'strike': _plain(strike), 'premium': _plain(premium)}
+
+
+def sweep_lines(table):
+    for threshold, row in zip(table.index, table.to_dict('records')):
+        record = _record(row)
+        record['threshold'] = float(threshold)
+        yield record
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'BacktestService/1.0'
+    # 响应头和响应体分两次写入，不关闭Nagle算法时长连接上的每个请求都会多等一个延迟确认（约40毫秒）
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def _send_stream(self, lines):
+        """分块传输的 NDJSON 响应，每块 STREAM_CHUNK_LINES 行，不需要先生成完整的响应体"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        sent = 0
+        buffer = []
+        for line in lines:
+            buffer.append(json.dumps(line, ensure_ascii=False))
+            if len(buffer) >= STREAM_CHUNK_LINES:
+                sent += self._write_chunk(buffer)
+                buffer = []
+        if buffer:
+            sent += self._write_chunk(buffer)
+        self.wfile.write(b'0\r\n\r\n')
+        return sent
+
+    def _write_chunk(self, lines):
+        data = ('\n'.join(lines) + '\n').encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        return len(data)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            return json.loads(body or b'{}')
+        except ValueError:
+            raise ValueError("请求体不是有效的JSON")
+
+    def _handle(self, endpoint, respond):
+        service = self.server.service
+        start = time.perf_counter()
+        error = False
+        streamed = False
+        sent = 0
+        try:
+            streamed, sent = respond(service)
+        except ValueError as e:
+            error = True
+            sent = self._send_json(400, {'error': str(e)})
+        except LookupError as e:
+            error = True
+            sent = self._send_json(404, {'error': str(e)})
+        except Exception as e:
+            error = True
+            print(f"处理请求 {endpoint} 时发生错误：{str(e)}")
+            sent = self._send_json(500, {'error': str(e)})
+        service.stats.record(endpoint, time.perf_counter() - start, error=error, sent=sent, streamed=streamed)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/health':
+            self._handle(path, lambda service: (False, self._send_json(200, {'status': 'ok'})))
+        elif path == '/stats':
+            # 计数器请求不计入统计，避免监控轮询影响吞吐量数据
+            self._send_json(200, self.server.service.status())
+        else:
+            self._send_json(404, {'error': f"未知的接口：{path}"})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/backtest':
+            self._handle(path, self._backtest)
+        elif path == '/sweep':
+            self._handle(path, self._sweep)
+        else:
+            # 未读取的请求体会破坏长连接中的下一个请求
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self._send_json(404, {'error': f"未知的接口：{path}"})
+
+    def _backtest(self, service):
+        request = parse_request(self._read_json())
+        summary, (events, index) = service.backtest(request)
+        if not request['events']:
+            return False, self._send_json(200, summary)
+        # 摘要作为第一行，之后逐行输出交易事件
+        return True, self._send_stream(chain([summary], event_lines(events, index)))
+
+    def _sweep(self, service):
+        request = parse_request(self._read_json(), sweep=True)
+        table = service.sweep(request)
+        return True, self._send_stream(sweep_lines(table))
+
+
+class BacktestServer(ThreadingHTTPServer):
+    """每个连接一个线程的HTTP服务（支持长连接）"""
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, service, host='127.0.0.1', port=8765, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__((host, port), _Handler)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_server(service, host='127.0.0.1', port=0, verbose=False):
+    """
+    在后台线程中启动服务，port 为 0 时使用随机空闲端口
+    :return: BacktestServer，调用 shutdown() 和 server_close() 停止
+    """
+    server = BacktestServer(service, host, port, verbose=verbose)
+    threading.Thread(target=server.serve_forever, name='backtest-service', daemon=True).start()
+    return server
+
+
+def request_json(connection, method, path, payload=None):
+    """通过 http.client 长连接发送请求，返回 (状态码, 响应)；NDJSON 响应解析为对象列表"""
+    body = json.dumps(payload).encode('utf-8') if payload is not None else None
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    connection.request(method, path, body=body, headers=headers)
+    response = connection.getresponse()
+    data = response.read().decode('utf-8')
+    if response.getheader('Content-Type', '').startswith('application/x-ndjson'):
+        return response.status, [json.loads(line) for line in data.splitlines() if line]
+    return response.status, json.loads(data)
+
+
+def _synthetic_prices(symbol, start, end):
+    """基准测试用的模拟价格数据（每个股票代码固定的随机游走）"""
+    index = pd.bdate_range(start, end)
+    rng = np.random.default_rng(sum(map(ord, symbol)))
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(index))))
+    return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1e6}, index=index)
+
+
+def _benchmark(args):
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        service = BacktestService(_synthetic_prices, registry=SharedPriceRegistry(directory),
+                                  batch_window=args.batch_window / 1000)
+        server = start_server(service)
+        host, port = server.server_address[:2]
+        symbols = [f"S{j:03d}" for j in range(args.symbols)]
+        thresholds = np.round(np.linspace(0.03, 0.3, args.thresholds), 4).tolist()
+        rng = np.random.default_rng(0)
+        payloads = [{'symbol': symbols[rng.integers(len(symbols))], 'start': '2015-01-01', 'end': '2024-01-01',
+                     'threshold': thresholds[rng.integers(len(thresholds))]} for _ in range(args.benchmark)]
+        failures = []
+
+        def client(worker):
+            connection = http.client.HTTPConnection(host, port, timeout=60)
+            for payload in payloads[worker::args.concurrency]:
+                status, _ = request_json(connection, 'POST', '/backtest', payload)
+                if status != 200:
+                    failures.append(status)
+            connection.close()
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=client, args=(worker,)) for worker in range(args.concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        status = service.status()
+        server.shutdown()
+        server.server_close()
+
+    endpoint = status['endpoints'].get('/backtest', {})
+    print(f"{args.benchmark} 个回测请求（{args.symbols} 个股票 × {args.thresholds} 个阈值，{args.concurrency} 个并发连接）："
+          f"{elapsed:.2f} 秒，{args.benchmark / elapsed:.0f} 请求/秒，失败 {len(failures)} 个")
+    print(f"延迟 p50 {endpoint.get('p50_ms')} ms，p95 {endpoint.get('p95_ms')} ms，p99 {endpoint.get('p99_ms')} ms")
+    print(f"实际计算 {status['computed']} 次回测，{status['batches']} 个批次合并了 {status['batched']} 个请求，"
+          f"合并相同请求 {status['coalesced']} 次，结果缓存命中 {status['result_hits']} 次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回测HTTP服务：POST /backtest、POST /sweep、GET /stats、GET /health')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--batch-window', type=float, default=5.0, help='回测请求的批量合并窗口（毫秒）')
+    parser.add_argument('--result-ttl', type=float, default=300.0, help='结果缓存的有效期（秒）')
+    parser.add_argument('--verbose', action='store_true', help='输出每个请求的访问日志')
+    parser.add_argument('--benchmark', type=int, default=0, help='在本机用模拟数据发送指定数量的请求并报告吞吐量，不启动服务')
+    parser.add_argument('--concurrency', type=int, default=16, help='基准测试的并发连接数')
+    parser.add_argument('--symbols', type=int, default=5, help='基准测试的股票数')
+    parser.add_argument('--thresholds', type=int, default=20, help='基准测试的阈值个数')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        _benchmark(args)
+        return
+
+    from data_providers import cached_loader_from_env, quota_from_env
+    service = BacktestService(cached_loader_from_env(quota=quota_from_env()), batch_window=args.batch_window / 1000,
+                              result_ttl=args.result_ttl)
+    server = BacktestServer(service, args.host, args.port, verbose=args.verbose)
+    print(f"回测服务已启动：{server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import numpy as np
+import pandas as pd
+from profiler import phase
+from data_cache import FileLock, atomic_write_pickle
+from performance_metrics import PERIODS_PER_YEAR
+
+# 可选的K线周期：'D' 为基础K线本身，'W' 为周线（周五结束），'M' 为月线，'<N>D' 为每N个交易日
+TIMEFRAME_LABELS = {'D': '日线', 'W': '周线', 'M': '月线'}
+
+# 各列的聚合方式，未列出的列取每个周期的最后一个值
+AGGREGATIONS = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Adj Close': 'last',
+    'Volume': 'sum',
+    'Dividends': 'sum',
+    'Stock Splits': 'max',
+}
+
+_N_DAY_PATTERN = re.compile(r'^(\d+)D$')
+
+
+def validate_timeframe(timeframe):
+    """检查周期格式，返回N日周期的N（其他周期返回None）"""
+    match = _N_DAY_PATTERN.match(timeframe)
+    if match:
+        days = int(match.group(1))
+        if days < 1:
+            raise ValueError(f"无效的K线周期：{timeframe}")
+        return days
+    if timeframe not in ('W', 'M'):
+        raise ValueError(f"不支持的K线周期：{timeframe}，可选 W、M 或 <N>D")
+    return None
+
+
+def periods_per_year(timeframe):
+    """每年的K线数，用于按周期年化绩效指标"""
+    if timeframe == 'D':
+        return PERIODS_PER_YEAR
+    if timeframe == 'W':
+        return 52
+    if timeframe == 'M':
+        return 12
+    return PERIODS_PER_YEAR / validate_timeframe(timeframe)
+
+
+def _day_ordinals(index, day_offset=0):
+    """每根基础K线所在交易日的序号（日内数据同一天的K线序号相同）"""
+    days = index.normalize()
+    new_day = np.ones(len(index), dtype=bool)
+    new_day[1:] = days[1:] != days[:-1]
+    return np.cumsum(new_day) - 1 + day_offset
+
+
+def bucket_keys(index, timeframe, day_offset=0):
+    """
+    每根基础K线所属周期的编号，编号相同的连续K线聚合为一根
+    :param day_offset: N日周期时，index 第一根K线之前已有的交易日数（增量更新时使用）
+    """
+    days = validate_timeframe(timeframe)
+    if days is not None:
+        return _day_ordinals(index, day_offset) // days
+    period = 'W-FRI' if timeframe == 'W' else 'M'
+    return index.to_period(period).asi8
+
+
+def aggregate_bars(frame, keys):
+    """
+    按周期编号聚合K线，编号需按时间非递减
+    使用 reduceat 一次完成所有周期的聚合；结果的日期为每个周期最后一根基础K线的日期
+    """
+    n = len(frame)
+    if n == 0:
+        return frame.iloc[:0].copy()
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:] - 1, n - 1]
+    columns = {}
+    for column in frame.columns:
+        how = AGGREGATIONS.get(column, 'last')
+        values = frame[column].to_numpy()
+        if how == 'first':
+            columns[column] = values[starts]
+        elif how == 'last':
+            columns[column] = values[ends]
+        elif how == 'max':
+            columns[column] = np.maximum.reduceat(values, starts)
+        elif how == 'min':
+            columns[column] = np.minimum.reduceat(values, starts)
+        else:
+            columns[column] = np.add.reduceat(values, starts)
+    return pd.DataFrame(columns, index=frame.index[ends])
+
+
+def resample_bars(frame, timeframe):
+    """不使用持久化存储，直接把基础K线聚合为指定周期"""
+    if timeframe == 'D':
+        return frame
+    return aggregate_bars(frame, bucket_keys(frame.index, timeframe))
+
+
+class BarStore:
+    """
+    多周期K线存储
+    每个股票保存一份基础K线（日线或日内），由基础K线派生的周线、月线和N日K线也持久化保存。
+    新的基础K线到达时只重新聚合最后一个（可能尚未结束的）周期及之后的部分，
+    策略可以直接读取任意周期的K线，无需每次重新聚合。
+    """
+
+    def __init__(self, root='cache/bars'):
+        """
+        :param root: 存储目录
+        """
+        self.root = root
+
+    def _dir(self, symbol):
+        return os.path.join(self.root, symbol)
+
+    def _base_path(self, symbol):
+        return os.path.join(self._dir(symbol), 'base.pkl')
+
+    def _derived_path(self, symbol, timeframe):
+        return os.path.join(self._dir(symbol), f"{timeframe}.pkl")
+
+    def _meta_path(self, symbol, timeframe):
+        return os.path.join(self._dir(symbol), f"{timeframe}.json")
+
+    def _write_json(self, payload, path):
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(path + '.tmp', path)
+
+    def _read_json(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _lock(self, symbol):
+        return FileLock(os.path.join(self._dir(symbol), '.lock'))
+
+    def base(self, symbol):
+        """读取基础K线，不存在时返回None"""
+        try:
+            return pd.read_pickle(self._base_path(symbol))
+        except FileNotFoundError:
+            return None
+
+    def timeframes(self, symbol):
+        """已持久化的派生周期"""
+        directory = self._dir(symbol)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-5] for name in os.listdir(directory) if name.endswith('.json') and name != 'base.json')
+
+    def append(self, symbol, bars):
+        """
+        合并新的基础K线并增量更新所有已持久化的派生周期
+        按日期并集合并，与已有日期重叠的K线保留已有数据；
+        新K线落在已有数据的最后一根之前（更早的历史或中间的缺口）时，派生周期完全重建
+        :return: 新增的基础K线数
+        """
+        bars = bars.sort_index()
+        os.makedirs(self._dir(symbol), exist_ok=True)
+        with self._lock(symbol):
+            base = self.base(symbol)
+            if base is None:
+                added = bars
+                base = bars
+                rebuild = True
+            else:
+                added = bars.loc[~bars.index.isin(base.index)]
+                if added.empty:
+                    return 0
+                rebuild = bool((added.index < base.index[-1]).any())
+                base = pd.concat([base, added]).sort_index()
+            with phase('bars.write_base', symbol=symbol, rows=len(added)):
+                atomic_write_pickle(base, self._base_path(symbol))
+            self._write_json({'base_end': base.index[-1].isoformat(), 'rows': len(base)},
+                             os.path.join(self._dir(symbol), 'base.json'))
+            for timeframe in self.timeframes(symbol):
+                self._update(symbol, timeframe, base, rebuild)
+        return len(added)
+
+    def bars(self, symbol, timeframe, start_date=None, end_date=None):
+        """
+        读取指定周期的K线（两端都包含的日期范围），派生周期不存在或落后于基础K线时先更新
+        :return: DataFrame，基础K线不存在时返回None
+        """
+        if timeframe == 'D':
+            frame = self.base(symbol)
+        else:
+            validate_timeframe(timeframe)
+            frame = self._load_derived(symbol, timeframe)
+            if frame is None:
+                with self._lock(symbol):
+                    base = self.base(symbol)
+                    if base is None:
+                        return None
+                    frame = self._update(symbol, timeframe, base, rebuild=False)
+        if frame is None:
+            return None
+        if start_date is not None:
+            frame = frame.loc[frame.index >= pd.Timestamp(start_date)]
+        if end_date is not None:
+            frame = frame.loc[frame.index <= pd.Timestamp(end_date) + pd.Timedelta(days=1) - pd.Timedelta(1)]
+        return frame
+
+    def _load_derived(self, symbol, timeframe):
+        """读取与基础K线同步的派生周期，不存在或落后时返回None"""
+        meta = self._read_json(self._meta_path(symbol, timeframe))
+        base_meta = self._read_json(os.path.join(self._dir(symbol), 'base.json'))
+        if meta is None or base_meta is None or meta.get('base_end') != base_meta.get('base_end') \
+                or meta.get('rows') != base_meta.get('rows'):
+            return None
+        try:
+            return pd.read_pickle(self._derived_path(symbol, timeframe))
+        except FileNotFoundError:
+            return None
+
+    def _update(self, symbol, timeframe, base, rebuild):
+        """
+        增量更新一个派生周期：保留已结束的周期，从最后一个周期的起点开始重新聚合
+        :return: 更新后的派生K线
+        """
+        meta = None if rebuild else self._read_json(self._meta_path(symbol, timeframe))
+        if meta is not None:
+            try:
+                derived = pd.read_pickle(self._derived_path(symbol, timeframe))
+            except FileNotFoundError:
+                meta = None
+
+        with phase('bars.resample', symbol=symbol, timeframe=timeframe, incremental=meta is not None):
+            if meta is None:
+                tail_start, day_offset, kept = 0, 0, None
+            else:
+                tail_start = int(base.index.searchsorted(pd.Timestamp(meta['last_bucket_start'])))
+                day_offset = meta['last_bucket_day']
+                kept = derived.iloc[:-1]
+            tail = base.iloc[tail_start:]
+            keys = bucket_keys(tail.index, timeframe, day_offset=day_offset)
+            derived = aggregate_bars(tail, keys)
+            if kept is not None:
+                derived = pd.concat([kept, derived])
+
+        # 记录最后一个周期在基础K线中的起点和交易日序号，下次从这里开始重新聚合
+        last_start = int(np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])[-1])
+        last_bucket_day = int(_day_ordinals(tail.index, day_offset)[last_start])
+        atomic_write_pickle(derived, self._derived_path(symbol, timeframe))
+        self._write_json({
+            'base_end': base.index[-1].isoformat(),
+            'rows': len(base),
+            'last_bucket_start': tail.index[last_start].isoformat(),
+            'last_bucket_day': last_bucket_day,
+        }, self._meta_path(symbol, timeframe))
+        return derived
@@ -0,0 +1,75 @@
+import os
+import time
+import tempfile
+import statistics
+from replay_provider import ReplayAlphaVantageAPI, write_synthetic_fixture, fixture_name
+from data_cache import StockDataCache
+from strategy_comparison import StrategyComparison
+
+# 离线基准测试：获取数据路径和端到端回测，使用回放夹具，不访问网络
+# 设置 ALPHA_VANTAGE_FIXTURES 使用录制的真实响应（ALPHA_VANTAGE_MODE=record 运行一次 app 或脚本即可录制），
+# 夹具不存在时自动生成同样规模的模拟数据
+FIXTURE_DIR = os.getenv('ALPHA_VANTAGE_FIXTURES', 'fixtures')
+SYMBOLS = ['AAPL', 'MSFT', 'NVDA']
+START_DATE = '2020-01-01'
+END_DATE = '2023-12-31'
+REPEAT = 5
+LATENCY = 0.2      # 模拟的网络延迟（秒）
+NOTE_EVERY = 4     # 每第N次请求注入一次限流提示
+
+
+def timed(func, repeat=REPEAT):
+    """运行多次，返回耗时中位数（毫秒）和最后一次的结果"""
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations), result
+
+
+print("========== 数据路径基准测试（离线回放） ==========")
+for symbol in SYMBOLS:
+    params = {'function': 'TIME_SERIES_DAILY', 'symbol': symbol, 'outputsize': 'full'}
+    if not os.path.exists(os.path.join(FIXTURE_DIR, fixture_name(params))):
+        path = write_synthetic_fixture(FIXTURE_DIR, symbol, seed=sum(map(ord, symbol)))
+        print(f"未找到录制的夹具，已生成模拟数据：{path}")
+
+# 获取数据路径：读取夹具 + JSON解析 + 转换为DataFrame（不含网络延迟）
+print("\n获取数据路径（无延迟）:")
+api = ReplayAlphaVantageAPI(fixture_dir=FIXTURE_DIR)
+for symbol in SYMBOLS:
+    ms, data = timed(lambda: api.get_stock_data(symbol, START_DATE, END_DATE))
+    print(f"- {symbol}: {len(data)}行，中位数 {ms:.1f} ms")
+
+# 带延迟和限流提示注入：结果由种子决定，可重复
+print(f"\n获取数据路径（延迟 {LATENCY * 1000:.0f} ms，每{NOTE_EVERY}次请求注入限流提示）:")
+api = ReplayAlphaVantageAPI(fixture_dir=FIXTURE_DIR, latency=LATENCY, note_every=NOTE_EVERY)
+empty = 0
+start = time.perf_counter()
+for _ in range(REPEAT):
+    for symbol in SYMBOLS:
+        if api.get_stock_data(symbol, START_DATE, END_DATE).empty:
+            empty += 1
+elapsed = time.perf_counter() - start
+print(f"- 请求{api.calls}次，限流{api.notes}次，空结果{empty}次，总耗时 {elapsed:.2f} s")
+
+# 端到端：缓存未命中（回放请求 + 写缓存）与命中两种情况下，获取数据并运行两种策略对比
+print("\n端到端（获取数据 + 策略对比）:")
+api = ReplayAlphaVantageAPI(fixture_dir=FIXTURE_DIR, latency=LATENCY)
+for symbol in SYMBOLS:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = StockDataCache(cache_dir, background=False)
+
+        def run(cache=cache, symbol=symbol):
+            data = cache.get_or_fetch(symbol, START_DATE, END_DATE,
+                                      lambda: api.get_stock_data(symbol, START_DATE, END_DATE))
+            return StrategyComparison(data, threshold=0.1)
+
+        cold_ms, _ = timed(run, repeat=1)
+        warm_ms, comparison = timed(run)
+        print(f"- {symbol}: 未命中 {cold_ms:.1f} ms，命中 {warm_ms:.1f} ms，"
+              f"波段期末资产 ${comparison.swing.final_asset:,.2f}，期权期末资产 ${comparison.option.final_asset:,.2f}")
+
+print("\n基准测试完成")
@@ -0,0 +1,379 @@
+import os
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+import pandas as pd
+from profiler import phase
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class FileLock:
+    """
+    跨进程的文件锁（阻塞式）
+    同一缓存文件的读写和上游请求在持有锁时进行，多个进程/工作者之间互斥
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a+')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+        return False
+
+
+def atomic_write_pickle(data, path):
+    """先写入同目录下的临时文件再原子替换，读者永远不会看到写了一半的文件"""
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            data.to_pickle(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class _Flight:
+    """进行中的一次上游请求，同一键的其他请求等待它完成并共享结果"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _CacheEntry:
+    """缓存索引中的一项"""
+    __slots__ = ('size', 'mtime', 'last_access', 'hits')
+
+    def __init__(self, size, mtime, last_access, hits=0):
+        self.size = size
+        self.mtime = mtime
+        self.last_access = last_access
+        self.hits = hits
+
+
+class StockDataCache:
+    """
+    股票数据的本地文件缓存
+    - 原子写入：临时文件 + os.replace，避免并发写入产生损坏的缓存文件
+    - 跨进程文件锁：多个进程同时缺失同一缓存时，只有一个进程请求上游
+    - 单飞合并：同一进程内对同一股票的并发请求只触发一次上游请求，其余请求等待其结果
+    - 内存索引：启动时扫描一次缓存目录，之后由读写和淘汰操作增量维护，
+      统计信息直接读取索引和计数器，不再遍历文件系统
+    - 容量上限：总大小超过上限时由后台线程按LRU或LFU淘汰
+    """
+
+    def __init__(self, cache_dir='cache', max_age=7 * 24 * 3600, max_bytes=500 * 1024 * 1024, policy='lru',
+                 background=True):
+        """
+        :param cache_dir: 缓存目录
+        :param max_age: 缓存有效期（秒），默认7天
+        :param max_bytes: 缓存总大小上限（字节）
+        :param policy: 淘汰策略，'lru'（最近最少使用）或 'lfu'（最不经常使用）
+        :param background: 是否在后台线程中淘汰，False时在写入后同步淘汰
+        """
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"不支持的淘汰策略：{policy}")
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.background = background
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+
+        # 索引按最近访问顺序排列（最旧的在前），_bytes 为索引中文件的总大小
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._index_lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'bytes_served': 0}
+        self._evict_requested = threading.Event()
+        self._evictor = None
+        self._scan()
+
+    def key_for(self, symbol, start_date, end_date):
+        return f"{symbol}_{start_date}_{end_date}"
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _lock_path(self, key):
+        return os.path.join(self.cache_dir, '.locks', f"{key}.lock")
+
+    def _scan(self):
+        """启动时扫描一次缓存目录建立索引"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for item in it:
+                if item.name.endswith('.pkl') and item.is_file():
+                    stat = item.stat()
+                    entries.append((stat.st_mtime, item.name[:-4], stat.st_size))
+        with self._index_lock:
+            for mtime, key, size in sorted(entries):
+                self._index[key] = _CacheEntry(size, mtime, mtime)
+                self._bytes += size
+        self._request_eviction()
+
+    def _record(self, key, size, mtime, hit):
+        """更新索引中的一项（其他进程写入的文件在首次读取时加入索引）"""
+        with self._index_lock:
+            entry = self._index.get(key)
+            if entry is None:
+                entry = self._index[key] = _CacheEntry(size, mtime, time.time())
+            else:
+                self._bytes -= entry.size
+                entry.size = size
+                entry.mtime = mtime
+                entry.last_access = time.time()
+                self._index.move_to_end(key)
+            self._bytes += size
+            if hit:
+                entry.hits += 1
+                self._counters['hits'] += 1
+                self._counters['bytes_served'] += size
+
+    def _forget(self, key):
+        """从索引中删除一项，返回其大小"""
+        with self._index_lock:
+            entry = self._index.pop(key, None)
+            if entry is None:
+                return 0
+            self._bytes -= entry.size
+            return entry.size
+
+    def _remove_file(self, key):
+        try:
+            os.remove(self.path_for(key))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"删除缓存文件失败：{str(e)}")
+
+    def load(self, key, count_hit=True):
+        """
+        读取未过期的缓存，不存在、已过期或读取失败时返回None
+        :param count_hit: 是否计入命中统计（未命中后加锁再检查时不重复计数）
+        """
+        cache_file = self.path_for(key)
+        try:
+            stat = os.stat(cache_file)
+        except OSError:
+            self._forget(key)
+            return None
+        if (time.time() - stat.st_mtime) >= self.max_age:
+            return None
+        try:
+            with phase('cache.read', key=key):
+                data = pd.read_pickle(cache_file)
+        except Exception as e:
+            print(f"读取缓存文件失败：{str(e)}")
+            return None
+        self._record(key, stat.st_size, stat.st_mtime, hit=count_hit)
+        return data
+
+    def save(self, key, data):
+        """原子写入缓存文件，超过容量上限时触发淘汰"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_file = self.path_for(key)
+        try:
+            with phase('cache.write', key=key):
+                atomic_write_pickle(data, cache_file)
+            stat = os.stat(cache_file)
+            self._record(key, stat.st_size, stat.st_mtime, hit=False)
+            print(f"数据已缓存到 {cache_file}")
+        except Exception as e:
+            print(f"保存缓存文件失败：{str(e)}")
+            return
+        self._request_eviction()
+
+    def _request_eviction(self):
+        """总大小超过上限时淘汰，后台模式下唤醒淘汰线程"""
+        if self._bytes <= self.max_bytes:
+            return
+        if not self.background:
+            self.evict()
+            return
+        with self._index_lock:
+            if self._evictor is None:
+                self._evictor = threading.Thread(target=self._eviction_loop, name='stock-cache-evictor', daemon=True)
+                self._evictor.start()
+        self._evict_requested.set()
+
+    def _eviction_loop(self):
+        while True:
+            self._evict_requested.wait()
+            self._evict_requested.clear()
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"缓存淘汰失败：{str(e)}")
+
+    def evict(self):
+        """
+        按淘汰策略删除缓存，直到总大小不超过上限
+        :return: 删除的文件数
+        """
+        with self._index_lock:
+            excess = self._bytes - self.max_bytes
+            if excess <= 0:
+                return 0
+            if self.policy == 'lru':
+                candidates = iter(self._index)
+            else:
+                candidates = iter(sorted(self._index, key=lambda k: (self._index[k].hits, self._index[k].last_access)))
+            victims = []
+            for key in candidates:
+                if excess <= 0:
+                    break
+                victims.append(key)
+                excess -= self._index[key].size
+            for key in victims:
+                self._bytes -= self._index.pop(key).size
+            self._counters['evictions'] += len(victims)
+        for key in victims:
+            self._remove_file(key)
+        return len(victims)
+
+    def clear_expired(self):
+        """
+        删除过期的缓存（超过有效期）
+        :return: 删除的文件数
+        """
+        cutoff = time.time() - self.max_age
+        with self._index_lock:
+            expired = [key for key, entry in self._index.items() if entry.mtime < cutoff]
+            for key in expired:
+                self._bytes -= self._index.pop(key).size
+            self._counters['expired'] += len(expired)
+        for key in expired:
+            self._remove_file(key)
+            print(f"已删除过期缓存：{key}.pkl")
+        return len(expired)
+
+    def clear(self):
+        """
+        删除所有缓存
+        :return: 删除的文件数
+        """
+        with self._index_lock:
+            keys = list(self._index)
+            self._index.clear()
+            self._bytes = 0
+        for key in keys:
+            self._remove_file(key)
+        return len(keys)
+
+    def stats(self):
+        """缓存统计：文件数、总大小、命中/未命中/淘汰次数、命中率和从缓存读取的字节数"""
+        with self._index_lock:
+            result = dict(self._counters, entries=len(self._index), bytes=self._bytes, max_bytes=self.max_bytes)
+        lookups = result['hits'] + result['misses']
+        result['hit_rate'] = result['hits'] / lookups if lookups else 0.0
+        return result
+
+    def age(self, key):
+        """缓存文件写入至今的秒数，不存在时返回None"""
+        try:
+            return time.time() - os.stat(self.path_for(key)).st_mtime
+        except OSError:
+            return None
+
+    def refresh(self, symbol, start_date, end_date, fetch, validate=None):
+        """
+        重新获取数据并覆盖缓存（用于后台预取），持有与 get_or_fetch 相同的跨进程锁
+        :return: 获取的数据，无效时不写入缓存
+        """
+        key = self.key_for(symbol, start_date, end_date)
+        with FileLock(self._lock_path(key)):
+            data = fetch()
+            is_valid = validate(data) if validate is not None else (data is not None and not data.empty)
+            if is_valid:
+                self.save(key, data)
+        return data
+
+    def get_or_fetch(self, symbol, start_date, end_date, fetch, validate=None):
+        """
+        读取缓存，缺失时调用 fetch() 获取数据并写入缓存
+        同一键的并发请求（同一进程内的线程或其他进程）只会调用一次 fetch
+        :param fetch: 无参函数，返回DataFrame
+        :param validate: 判断数据是否可以缓存的函数，默认要求非空
+        :return: DataFrame，fetch 失败时为其返回值
+        """
+        key = self.key_for(symbol, start_date, end_date)
+        data = self.load(key)
+        if data is not None:
+            print(f"从缓存加载 {symbol} 的数据")
+            return data
+
+        with self._index_lock:
+            self._counters['misses'] += 1
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            # 同一进程内已有请求在获取该数据，等待其结果
+            with phase('cache.wait', key=key):
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._fetch_locked(key, symbol, fetch, validate)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _fetch_locked(self, key, symbol, fetch, validate):
+        """持有跨进程锁时再检查一次缓存，仍然缺失才请求上游"""
+        with FileLock(self._lock_path(key)):
+            data = self.load(key, count_hit=False)
+            if data is not None:
+                print(f"从缓存加载 {symbol} 的数据（由其他进程获取）")
+                return data
+
+            print(f"从API获取 {symbol} 的数据")
+            data = fetch()
+            is_valid = validate(data) if validate is not None else (data is not None and not data.empty)
+            if is_valid:
+                self.save(key, data)
+            return data
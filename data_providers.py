@@ -0,0 +1,448 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from profiler import phase
+from replay_provider import api_from_env
+from data_cache import StockDataCache
+
+REQUIRED_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class ProviderError(Exception):
+    """数据源无法提供所请求的数据"""
+
+
+def _date_str(value):
+    if isinstance(value, (datetime, date)):
+        return value.strftime('%Y-%m-%d')
+    return value
+
+
+def _filter_dates(df, start_date, end_date):
+    """按日期范围过滤（两端都包含）"""
+    start_date, end_date = _date_str(start_date), _date_str(end_date)
+    if start_date:
+        df = df.loc[df.index >= start_date]
+    if end_date:
+        df = df.loc[df.index <= end_date]
+    return df
+
+
+def is_valid_price_data(data):
+    """数据非空且包含OHLCV列"""
+    return isinstance(data, pd.DataFrame) and not data.empty and all(col in data.columns for col in REQUIRED_COLUMNS)
+
+
+class DataProvider:
+    """
+    数据源接口
+    get_stock_data 返回以日期为索引、包含OHLCV列的DataFrame，日期范围两端都包含；
+    无法提供数据时抛出 ProviderError（或返回空DataFrame），由 FallbackChain 转到下一个数据源。
+    remote 为 True 的数据源需要访问网络，对冲请求只作用于这类数据源。
+    """
+    name = 'base'
+    remote = False
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        raise NotImplementedError
+
+
+class AlphaVantageProvider(DataProvider):
+    """Alpha Vantage 数据源（通过 api_from_env 创建，支持录制/回放模式）"""
+    name = 'alphavantage'
+    remote = True
+
+    def __init__(self, api_key='demo', api=None):
+        """
+        :param api_key: Alpha Vantage API密钥
+        :param api: 可选的 AlphaVantageAPI 实例（例如回放数据源），默认按环境变量创建
+        """
+        self.api = api if api is not None else api_from_env(api_key)
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        return self.api.get_stock_data(symbol, start_date, end_date)
+
+
+class YFinanceProvider(DataProvider):
+    """yfinance 数据源（yfinance 为可选依赖，使用时才导入）"""
+    name = 'yfinance'
+    remote = True
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        try:
+            import yfinance as yf
+        except ImportError:
+            raise ProviderError("未安装yfinance")
+        end_date = _date_str(end_date)
+        # yfinance 的结束日期不包含在结果中，向后顺延一天与其他数据源保持一致
+        end = (pd.Timestamp(end_date) + timedelta(days=1)).strftime('%Y-%m-%d') if end_date else None
+        df = yf.Ticker(symbol).history(start=_date_str(start_date), end=end)
+        if df.empty:
+            return df
+        if df.index.tz is not None:
+            df.index = df.index.tz_localize(None)
+        return _filter_dates(df, start_date, end_date)
+
+
+class LocalFileProvider(DataProvider):
+    """
+    本地文件数据源：目录中的 {symbol}.parquet 或 {symbol}.csv
+    CSV 第一列为日期；读取 Parquet 需要 pyarrow，未安装时只使用 CSV
+    """
+    name = 'local'
+
+    def __init__(self, directory='data'):
+        """
+        :param directory: 数据文件目录
+        """
+        self.directory = directory
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        parquet_path = os.path.join(self.directory, f"{symbol}.parquet")
+        csv_path = os.path.join(self.directory, f"{symbol}.csv")
+        if os.path.exists(parquet_path):
+            try:
+                df = pd.read_parquet(parquet_path)
+            except ImportError:
+                df = None
+            if df is not None:
+                return _filter_dates(df.sort_index(), start_date, end_date)
+        if os.path.exists(csv_path):
+            df = pd.read_csv(csv_path, index_col=0, parse_dates=True)
+            return _filter_dates(df.sort_index(), start_date, end_date)
+        raise ProviderError(f"本地没有 {symbol} 的数据文件")
+
+
+class CacheProvider(DataProvider):
+    """
+    本地缓存数据源（StockDataCache）
+    放在回退链前面时，后面的数据源获取的数据会写回缓存
+    """
+    name = 'cache'
+
+    def __init__(self, cache):
+        """
+        :param cache: StockDataCache 实例
+        """
+        self.cache = cache
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        data = self.cache.load(self.cache.key_for(symbol, start_date, end_date))
+        if data is None:
+            raise ProviderError(f"缓存中没有 {symbol} 的数据")
+        return data
+
+    def store(self, symbol, start_date, end_date, data):
+        self.cache.save(self.cache.key_for(symbol, start_date, end_date), data)
+
+
+class FallbackChain(DataProvider):
+    """
+    数据源回退链：按顺序（开销从小到大）尝试各数据源，失败或数据无效时转到下一个
+    设置 hedge_after 后启用对冲请求：远程数据源超过该时间仍未返回时，
+    同时向下一个数据源发出请求，采用最先返回的有效结果（落后的请求在后台完成后丢弃）。
+    """
+    name = 'chain'
+
+    def __init__(self, providers, hedge_after=None):
+        """
+        :param providers: 数据源列表，按尝试顺序排列
+        :param hedge_after: 对冲等待时间（秒），None 表示不对冲
+        """
+        if not providers:
+            raise ValueError("数据源列表不能为空")
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.remote = any(provider.remote for provider in self.providers)
+        self.last_source = None
+        self.counters = {provider.name: {'served': 0, 'failed': 0} for provider in self.providers}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _try(self, provider, symbol, start_date, end_date):
+        """调用一个数据源，返回有效数据或None"""
+        try:
+            with phase('provider.fetch', provider=provider.name, symbol=symbol):
+                data = provider.get_stock_data(symbol, start_date, end_date)
+        except Exception as e:
+            print(f"数据源 {provider.name} 获取 {symbol} 失败：{str(e)}")
+            data = None
+        valid = is_valid_price_data(data)
+        with self._lock:
+            self.counters[provider.name]['served' if valid else 'failed'] += 1
+        return data if valid else None
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        # 本地数据源开销很小，先依次尝试；从第一个远程数据源开始才可能对冲
+        first_remote = next((i for i, p in enumerate(self.providers) if p.remote), len(self.providers))
+        for i, provider in enumerate(self.providers):
+            if self.hedge_after is not None and i == first_remote:
+                source, data = self._hedged(self.providers[i:], symbol, start_date, end_date)
+                if data is not None:
+                    return self._served(source, symbol, start_date, end_date, data)
+                break
+            data = self._try(provider, symbol, start_date, end_date)
+            if data is not None:
+                return self._served(provider, symbol, start_date, end_date, data)
+        print(f"所有数据源都无法提供 {symbol} 的数据")
+        self.last_source = None
+        return pd.DataFrame()
+
+    def _served(self, provider, symbol, start_date, end_date, data):
+        """记录数据来源，并写回排在它前面的可写数据源（例如缓存）"""
+        self.last_source = provider.name
+        for earlier in self.providers[:self.providers.index(provider)]:
+            if hasattr(earlier, 'store'):
+                try:
+                    earlier.store(symbol, start_date, end_date, data)
+                except Exception as e:
+                    print(f"数据写回 {earlier.name} 失败：{str(e)}")
+        return data
+
+    def _hedged(self, providers, symbol, start_date, end_date):
+        """对冲请求：当前数据源超时或失败时启动下一个，返回 (数据源, 数据)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=len(self.providers),
+                                                    thread_name_prefix='provider-hedge')
+        remaining = iter(providers)
+        pending = {}
+
+        def launch():
+            provider = next(remaining, None)
+            if provider is None:
+                return False
+            # 在当前上下文中执行，使配额等上下文设置对对冲请求同样有效
+            context = contextvars.copy_context()
+            pending[self._executor.submit(context.run, self._try, provider, symbol, start_date, end_date)] = provider
+            return True
+
+        launch()
+        while pending:
+            done, _ = wait(pending, timeout=self.hedge_after, return_when=FIRST_COMPLETED)
+            if not done:
+                # 当前请求太慢，同时请求下一个数据源
+                launch()
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                data = future.result()
+                if data is not None:
+                    return provider, data
+                launch()
+        return None, None
+
+
+class RequestQuota:
+    """
+    远程数据源的请求配额（令牌桶），交互请求优先
+    令牌按 rate_per_minute 匀速补充，最多积累 burst 个。
+    交互请求在没有令牌时等待；后台请求只能使用超出 reserve 的令牌，
+    有交互请求在等待、或最近 quiet_period 秒内有交互请求时也不会取得令牌，
+    因此后台预取不会让交互用户排队。
+    """
+
+    def __init__(self, rate_per_minute=5.0, burst=None, reserve=1, quiet_period=60.0, daily_limit=None,
+                 background_share=0.5, clock=time.monotonic):
+        """
+        :param rate_per_minute: 每分钟补充的令牌数
+        :param burst: 最多积累的令牌数，默认等于 rate_per_minute
+        :param reserve: 为交互请求保留的令牌数
+        :param quiet_period: 最近一次交互请求之后，后台请求需要等待的秒数
+        :param daily_limit: 每日请求上限，None 表示不限
+        :param background_share: 后台请求最多使用的每日上限比例
+        :param clock: 时钟函数（测试时可替换）
+        """
+        if rate_per_minute <= 0:
+            raise ValueError(f"每分钟请求数必须大于0：{rate_per_minute}")
+        self.rate = rate_per_minute / 60.0
+        self.burst = float(burst if burst is not None else max(rate_per_minute, 1))
+        self.reserve = reserve
+        self.quiet_period = quiet_period
+        self.daily_limit = daily_limit
+        self.background_share = background_share
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._last_interactive = None
+        self._waiting = 0
+        self._day = date.today()
+        self._used = {'interactive': 0, 'background': 0}
+        self._condition = threading.Condition()
+        self._background = contextvars.ContextVar(f'quota_background_{id(self)}', default=False)
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self._used = {'interactive': 0, 'background': 0}
+
+    @contextmanager
+    def background(self):
+        """在此上下文中发出的请求按后台请求计算配额（对冲请求的线程继承该上下文）"""
+        token = self._background.set(True)
+        try:
+            yield
+        finally:
+            self._background.reset(token)
+
+    @property
+    def in_background(self):
+        return self._background.get()
+
+    def _background_allowed(self):
+        if self._waiting:
+            return False
+        if self._last_interactive is not None and self._clock() - self._last_interactive < self.quiet_period:
+            return False
+        if self.daily_limit is not None and \
+                self._used['background'] >= self.daily_limit * self.background_share:
+            return False
+        return self._tokens >= 1 + self.reserve
+
+    def acquire(self, background=None, timeout=None):
+        """
+        取得一个令牌
+        :param background: 是否为后台请求，默认由 background() 上下文决定
+        :param timeout: 最长等待秒数，None 表示一直等待（后台请求默认不等待）
+        :return: 是否取得令牌
+        """
+        background = self.in_background if background is None else background
+        if background and timeout is None:
+            timeout = 0.0
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._condition:
+            if not background:
+                self._waiting += 1
+                self._last_interactive = self._clock()
+            try:
+                while True:
+                    self._refill()
+                    if background:
+                        if self._background_allowed():
+                            break
+                    elif self.daily_limit is not None and sum(self._used.values()) >= self.daily_limit:
+                        return False
+                    elif self._tokens >= 1:
+                        break
+                    wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 1.0
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._condition.wait(max(wait, 0.01))
+                self._tokens -= 1
+                self._used['background' if background else 'interactive'] += 1
+                return True
+            finally:
+                if not background:
+                    self._waiting -= 1
+                    self._last_interactive = self._clock()
+                    self._condition.notify_all()
+
+    def background_ready(self):
+        """后台请求现在能否取得令牌（不消耗令牌）"""
+        with self._condition:
+            self._refill()
+            return self._background_allowed()
+
+    def stats(self):
+        """当前令牌数和今日已用请求数"""
+        with self._condition:
+            self._refill()
+            return dict(tokens=self._tokens, waiting=self._waiting, **self._used)
+
+
+class QuotaProvider(DataProvider):
+    """为远程数据源加上请求配额：每次请求前取得一个令牌，后台请求取不到令牌时直接失败"""
+    remote = True
+
+    def __init__(self, provider, quota):
+        """
+        :param provider: 被包装的远程数据源
+        :param quota: RequestQuota
+        """
+        self.provider = provider
+        self.quota = quota
+        self.name = provider.name
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        if not self.quota.acquire():
+            raise ProviderError(f"{self.name} 的请求配额已用完（或保留给交互请求）")
+        return self.provider.get_stock_data(symbol, start_date, end_date)
+
+
+def quota_from_env():
+    """
+    根据环境变量创建请求配额
+    ALPHA_VANTAGE_RATE_PER_MIN: 每分钟请求数，默认5，必须大于0
+    ALPHA_VANTAGE_DAILY_LIMIT: 每日请求上限，不设置则不限
+    PREFETCH_RESERVE: 为交互请求保留的令牌数，默认1
+    """
+    daily_limit = os.getenv('ALPHA_VANTAGE_DAILY_LIMIT')
+    return RequestQuota(
+        rate_per_minute=float(os.getenv('ALPHA_VANTAGE_RATE_PER_MIN', '5')),
+        reserve=int(os.getenv('PREFETCH_RESERVE', '1')),
+        daily_limit=int(daily_limit) if daily_limit else None,
+    )
+
+
+# 回退链中可用的数据源名称
+PROVIDER_NAMES = ('cache', 'local', 'alphavantage', 'yfinance')
+
+
+def provider_chain_from_env(api_key='demo', cache=None, quota=None):
+    """
+    根据环境变量创建数据源回退链
+    DATA_PROVIDERS: 逗号分隔的数据源顺序，默认 local,alphavantage（可选 cache、local、alphavantage、yfinance）
+    DATA_LOCAL_DIR: 本地数据文件目录，默认 data
+    DATA_HEDGE_AFTER_MS: 对冲等待时间（毫秒），不设置则不对冲
+    :param cache: cache 数据源使用的 StockDataCache，未提供时跳过 cache
+    :param quota: 可选的 RequestQuota，提供时 Alpha Vantage 的请求受配额限制
+    """
+    names = [name.strip().lower() for name in os.getenv('DATA_PROVIDERS', 'local,alphavantage').split(',') if name.strip()]
+    providers = []
+    for name in names:
+        if name == 'cache':
+            if cache is not None:
+                providers.append(CacheProvider(cache))
+        elif name == 'local':
+            providers.append(LocalFileProvider(os.getenv('DATA_LOCAL_DIR', 'data')))
+        elif name == 'alphavantage':
+            provider = AlphaVantageProvider(api_key)
+            providers.append(QuotaProvider(provider, quota) if quota is not None else provider)
+        elif name == 'yfinance':
+            providers.append(YFinanceProvider())
+        else:
+            raise ValueError(f"未知的数据源：{name}，可选 {', '.join(PROVIDER_NAMES)}")
+    hedge_ms = os.getenv('DATA_HEDGE_AFTER_MS')
+    return FallbackChain(providers, hedge_after=float(hedge_ms) / 1000 if hedge_ms else None)
+
+
+def cached_loader_from_env(cache_dir='cache', quota=None):
+    """
+    创建读取价格数据的函数：优先使用本地缓存，缺失时通过环境变量配置的数据源回退链获取并写入缓存
+    缓存和回退链只创建一次，长期运行的服务和命令行脚本都可以使用
+    :param quota: 可选的 RequestQuota
+    :return: load(股票代码, 开始日期, 结束日期) -> 价格DataFrame
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    cache = StockDataCache(cache_dir, background=False)
+    provider = provider_chain_from_env(os.getenv('ALPHA_VANTAGE_API_KEY', 'demo'), quota=quota)
+
+    def load(symbol, start_date, end_date):
+        return cache.get_or_fetch(symbol, start_date, end_date,
+                                  lambda: provider.get_stock_data(symbol, start_date, end_date))
+
+    return load
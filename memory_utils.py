@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+# 精简模式下各类列的存储类型
+# 现金、持股和总资产需要逐笔累加，始终保留float64以免产生精度误差
+SIGNAL_DTYPE = np.int8
+PRICE_DTYPE = np.float32
+SHARES_DTYPE = np.int32
+OPTION_TYPE_DTYPE = pd.CategoricalDtype(['', 'call', 'put'])
+
+
+def shared_price_frame(data):
+    """
+    返回与原始价格数据共享内存的DataFrame
+    只做浅拷贝：在结果上添加新列不会影响原数据，已有的价格列不会被复制。
+    策略类只读取这些列，不会原地修改。
+    """
+    return data.copy(deep=False)
+
+
+def is_readonly_frame(data):
+    """
+    价格数据的列是否全部只读（例如 SharedPriceRegistry 中内存映射的数据）
+    只读数据不会被修改，策略类可以直接共享而不复制
+    """
+    return len(data.columns) > 0 and \
+        all(not data[col].to_numpy(copy=False).flags.writeable for col in data.columns)
+
+
+def readonly_array(series, dtype=np.float64):
+    """
+    以只读numpy数组的形式取出一列
+    类型一致时不复制数据，只在返回的视图上关闭写权限，原数据不受影响
+    """
+    values = series.to_numpy(dtype=dtype, copy=False)
+    view = values.view()
+    view.flags.writeable = False
+    return view
+
+
+def frame_nbytes(frame, source=None):
+    """
+    DataFrame的实际内存占用（包含索引和object列的内容）
+    :param source: 可选的原始价格数据，与其共享内存的列单独统计
+    :return: (独占字节数, 共享字节数)
+    """
+    if frame is None:
+        return 0, 0
+    usage = frame.memory_usage(index=True, deep=True)
+    shared = 0
+    if source is not None and frame is not source:
+        for col in frame.columns:
+            if col in source.columns and np.may_share_memory(frame[col].to_numpy(), source[col].to_numpy()):
+                shared += int(usage[col])
+    return int(usage.sum()) - shared, shared
+
+
+def memory_report(components, source=None):
+    """
+    生成各组件的内存占用报告
+    :param components: 字典，键为组件名称，值为DataFrame、事件数组或策略对象
+    :param source: 可选的原始价格数据，与其共享内存的列计入"共享(KB)"而不是"内存(KB)"
+    :return: DataFrame，列为 组件/行数/列数/内存(KB)/共享(KB)/每行字节
+    """
+    columns = ['组件', '行数', '列数', '内存(KB)', '共享(KB)', '每行字节']
+    rows = []
+    for name, obj in components.items():
+        if obj is None:
+            continue
+        if isinstance(obj, (pd.DataFrame, np.ndarray)):
+            frames = {name: obj}
+        elif hasattr(obj, 'memory_components'):
+            # 策略对象只统计已经生成的部分，不触发逐日数据的延迟生成
+            frames = {f"{name}.{key}": value for key, value in obj.memory_components().items()}
+        else:
+            frames = {f"{name}.data": getattr(obj, 'data', None),
+                      f"{name}.positions": getattr(obj, 'positions', None)}
+        for frame_name, frame in frames.items():
+            if frame is None:
+                continue
+            if isinstance(frame, np.ndarray):
+                own, shared = int(frame.nbytes), 0
+                n_columns = len(frame.dtype.names or (frame.dtype,))
+            else:
+                own, shared = frame_nbytes(frame, source)
+                n_columns = frame.shape[1]
+            rows.append({
+                '组件': frame_name,
+                '行数': len(frame),
+                '列数': n_columns,
+                '内存(KB)': round(own / 1024, 1),
+                '共享(KB)': round(shared / 1024, 1),
+                '每行字节': round(own / len(frame), 1) if len(frame) else 0.0,
+            })
+    report = pd.DataFrame(rows, columns=columns)
+    if not report.empty:
+        total = {col: report[col].sum() for col in columns[1:]}
+        total['组件'] = '合计'
+        report = pd.concat([report, pd.DataFrame([total])[columns]], ignore_index=True).round(1)
+    return report
@@ -0,0 +1,302 @@
+import numpy as np
+import pandas as pd
+from profiler import profiled, phase
+from memory_utils import readonly_array, SIGNAL_DTYPE, PRICE_DTYPE, SHARES_DTYPE
+from signal_engine import threshold_crossings
+
+# 期权腿的结构化数组类型
+# kind: 1=看涨，-1=看跌；side: 1=买入，-1=卖出；moneyness: 行权价/开仓日收盘价；
+# premium_rate: 每股权利金占开仓日收盘价的比例；ratio: 每份合约的股数相对 trade_shares 的倍数；
+# tenor: 到期前的K线数
+LEG_DTYPE = np.dtype([
+    ('kind', np.int8),
+    ('side', np.int8),
+    ('moneyness', np.float64),
+    ('premium_rate', np.float64),
+    ('ratio', np.float64),
+    ('tenor', np.int32),
+])
+
+CALL = 1
+PUT = -1
+LONG = 1
+SHORT = -1
+
+# 开仓条件，与 threshold_crossings 的信号方向一致：-1 为上涨触发（卖出信号），1 为下跌触发（买入信号）
+OPEN_ON_DIRECTIONS = {
+    'sell': (-1,),
+    'buy': (1,),
+    'both': (-1, 1),
+}
+
+
+def leg(kind, side, moneyness, premium_rate=0.05, ratio=1.0, tenor=21):
+    """创建一条期权腿，参见 LEG_DTYPE"""
+    return (kind, side, moneyness, premium_rate, ratio, tenor)
+
+
+class OptionStructure:
+    """
+    多腿期权组合：每个满足开仓条件的信号日按相同的腿开一份合约
+    """
+
+    def __init__(self, name, legs, open_on='both'):
+        """
+        :param name: 组合名称
+        :param legs: leg() 创建的腿列表
+        :param open_on: 开仓条件，'sell'（上涨触发）、'buy'（下跌触发）或 'both'
+        """
+        if open_on not in OPEN_ON_DIRECTIONS:
+            raise ValueError(f"不支持的开仓条件：{open_on}")
+        self.name = name
+        self.legs = np.array(legs, dtype=LEG_DTYPE)
+        self.open_on = open_on
+
+    def __repr__(self):
+        return f"OptionStructure({self.name!r}, legs={len(self.legs)}, open_on={self.open_on!r})"
+
+
+def covered_call(moneyness=1.05, premium_rate=0.05, tenor=21):
+    """备兑看涨：上涨触发时卖出虚值看涨期权（以已有持股备兑）"""
+    return OptionStructure('备兑看涨', [leg(CALL, SHORT, moneyness, premium_rate, tenor=tenor)], open_on='sell')
+
+
+def cash_secured_put(moneyness=0.95, premium_rate=0.05, tenor=21):
+    """现金担保看跌：下跌触发时卖出虚值看跌期权"""
+    return OptionStructure('现金担保看跌', [leg(PUT, SHORT, moneyness, premium_rate, tenor=tenor)], open_on='buy')
+
+
+def short_strangle(call_moneyness=1.05, put_moneyness=0.95, premium_rate=0.05, tenor=21):
+    """卖出宽跨式：任一信号同时卖出虚值看涨和看跌期权"""
+    return OptionStructure('卖出宽跨式', [
+        leg(CALL, SHORT, call_moneyness, premium_rate, tenor=tenor),
+        leg(PUT, SHORT, put_moneyness, premium_rate, tenor=tenor),
+    ])
+
+
+def collar(put_moneyness=0.95, call_moneyness=1.05, put_premium_rate=0.04, call_premium_rate=0.04, tenor=21):
+    """领口：任一信号买入虚值看跌保护，同时卖出虚值看涨期权抵消成本"""
+    return OptionStructure('领口', [
+        leg(PUT, LONG, put_moneyness, put_premium_rate, tenor=tenor),
+        leg(CALL, SHORT, call_moneyness, call_premium_rate, tenor=tenor),
+    ])
+
+
+def put_ladder(steps=3, spacing=0.03, premium_rate=0.05, tenor=21):
+    """滚动看跌阶梯：下跌触发时卖出行权价逐级降低、到期日逐级延后的一组看跌期权"""
+    return OptionStructure('看跌阶梯', [
+        leg(PUT, SHORT, 1 - spacing * (k + 1), premium_rate, ratio=1.0 / steps, tenor=tenor * (k + 1))
+        for k in range(steps)
+    ], open_on='buy')
+
+
+STRUCTURE_PRESETS = {
+    'covered_call': covered_call,
+    'cash_secured_put': cash_secured_put,
+    'short_strangle': short_strangle,
+    'collar': collar,
+    'put_ladder': put_ladder,
+}
+
+
+def _settle(close, open_bars, legs, trade_shares, settlement):
+    """到期结算的核心运算，open_bars 与 legs 的各字段按numpy规则广播"""
+    n = len(close)
+    spot = close[open_bars]
+    strike = spot * legs['moneyness']
+    premium = spot * legs['premium_rate']
+    expiry = np.minimum(open_bars + legs['tenor'], n - 1)
+    qty = np.broadcast_to(trade_shares * legs['ratio'], strike.shape)
+    kind = legs['kind'].astype(np.float64)
+    side = legs['side'].astype(np.float64)
+
+    intrinsic = np.maximum(kind * (close[expiry] - strike), 0.0)
+    exercised = intrinsic > 0
+    # 卖方收取、买方支付权利金
+    open_cash = -side * premium * qty
+    if settlement == 'physical':
+        # 看涨行权：持有人按行权价买入；看跌行权：持有人按行权价卖出
+        share_delta = np.where(exercised, side * kind * qty, 0.0)
+        expiry_cash = -share_delta * strike
+    elif settlement == 'cash':
+        share_delta = np.zeros_like(strike)
+        expiry_cash = side * intrinsic * qty
+    else:
+        raise ValueError(f"不支持的结算方式：{settlement}")
+    return {
+        'strike': strike, 'premium': premium, 'expiry': expiry, 'qty': qty, 'exercised': exercised,
+        'share_delta': share_delta, 'open_cash': open_cash, 'expiry_cash': expiry_cash,
+    }
+
+
+def settle_contracts(close, open_bars, legs, trade_shares, settlement='physical'):
+    """
+    计算合约在到期日的结算结果，所有量都是 (合约数 × 腿数) 的数组
+    到期日超出数据范围的合约在最后一根K线结算。
+    :param close: 收盘价数组
+    :param open_bars: 各合约的开仓K线序号
+    :param legs: LEG_DTYPE 数组
+    :param trade_shares: 每份合约的基准股数
+    :param settlement: 'physical' 实物交割（行权时按行权价买卖股票）或 'cash' 现金结算
+    :return: dict，包含 strike、premium、expiry、qty、exercised、share_delta、open_cash、expiry_cash
+    """
+    return _settle(close, np.asarray(open_bars, dtype=np.int64)[:, None], legs, trade_shares, settlement)
+
+
+def _select_signals(bars, directions, open_on):
+    mask = np.isin(directions, OPEN_ON_DIRECTIONS[open_on])
+    return bars[mask].astype(np.int64), directions[mask]
+
+
+class MultiLegOptionTrader:
+    """
+    多腿期权策略回测
+    信号与 OptionTrader 相同（threshold_crossings），每个满足开仓条件的信号日开一份多腿合约，
+    所有合约和腿的到期结算由 settle_contracts 以数组运算一次完成，没有逐合约的Python分支。
+    positions 与 OptionTrader 的列一致（Strike/Premium 为各腿之和的每股数值）。
+    与 OptionTrader 一样不检查持股和现金是否足够，也不对未到期的合约按市值计价。
+    """
+
+    def __init__(self, data, structure, initial_shares=1000, trade_shares=100, threshold=0.1, settlement='physical',
+                 lean=False, signals=None):
+        """
+        :param data: DataFrame，包含股票价格数据
+        :param structure: OptionStructure
+        :param initial_shares: 初始持股数量
+        :param trade_shares: 每份合约的基准股数
+        :param threshold: 触发信号的价格变化阈值
+        :param settlement: 'physical' 或 'cash'，参见 settle_contracts
+        :param lean: 内存精简模式，positions 使用紧凑的数据类型
+        :param signals: 可选的预先计算好的 (信号K线序号, 信号方向)
+        """
+        self.data = data
+        self.structure = structure
+        self.initial_shares = initial_shares
+        self.initial_cash = 100000.0  # 初始现金10万
+        self.trade_shares = trade_shares
+        self.threshold = threshold
+        self.settlement = settlement
+        self.lean = lean
+        self._close = readonly_array(data['Close'])
+        self._positions = None
+
+        if signals is None:
+            signals = threshold_crossings(self._close, threshold)
+        self.open_bars, self.directions = _select_signals(signals[0], signals[1], structure.open_on)
+        self._backtest()
+
+    @profiled('multi_leg.backtest')
+    def _backtest(self):
+        """结算所有合约"""
+        self.contracts = settle_contracts(self._close, self.open_bars, self.structure.legs, self.trade_shares,
+                                          self.settlement)
+        self.final_shares = float(self.initial_shares + self.contracts['share_delta'].sum())
+        self.final_cash = float(self.initial_cash + self.contracts['open_cash'].sum()
+                                + self.contracts['expiry_cash'].sum())
+        self.total_premium = float(self.contracts['open_cash'].sum())
+        self.exercised_count = int(np.count_nonzero(self.contracts['exercised']))
+
+    @property
+    def initial_asset(self):
+        """初始总资产"""
+        return float(self.initial_shares * self._close[0] + self.initial_cash)
+
+    @property
+    def final_asset(self):
+        """最终总资产（所有合约都已在到期日或最后一根K线结算）"""
+        return float(self.final_shares * self._close[-1] + self.final_cash)
+
+    @property
+    def positions(self):
+        """逐日持仓DataFrame，首次访问时生成"""
+        if self._positions is None:
+            with phase('multi_leg.positions'):
+                self._positions = self._build_positions()
+        return self._positions
+
+    def _build_positions(self):
+        """把开仓和到期的现金流、持股变化按K线汇总后累加"""
+        n = len(self._close)
+        contracts = self.contracts
+        legs = contracts['strike'].shape[1]
+        open_index = np.repeat(self.open_bars, legs)
+        expiry_index = contracts['expiry'].ravel()
+
+        signals = np.zeros(n, dtype=SIGNAL_DTYPE)
+        signals[self.open_bars] = self.directions
+        strikes = np.bincount(self.open_bars, contracts['strike'].sum(axis=1), minlength=n)
+        premiums = np.bincount(self.open_bars, contracts['premium'].sum(axis=1), minlength=n)
+        open_cash = np.bincount(open_index, contracts['open_cash'].ravel(), minlength=n)
+        expiry_cash = np.bincount(expiry_index, contracts['expiry_cash'].ravel(), minlength=n)
+        share_delta = np.bincount(expiry_index, contracts['share_delta'].ravel(), minlength=n)
+        exercised = np.bincount(expiry_index, contracts['exercised'].ravel(), minlength=n) > 0
+
+        shares = self.initial_shares + np.cumsum(share_delta)
+        cash = self.initial_cash + np.cumsum(open_cash + expiry_cash)
+
+        positions = pd.DataFrame(index=self.data.index)
+        if self.lean:
+            positions['Close'] = self._close.astype(PRICE_DTYPE)
+            positions['Signal'] = signals
+            positions['Strike'] = strikes.astype(PRICE_DTYPE)
+            positions['Premium'] = premiums.astype(PRICE_DTYPE)
+            positions['Shares'] = shares.astype(SHARES_DTYPE)
+        else:
+            positions['Close'] = self.data['Close']
+            positions['Signal'] = signals.astype(np.int64)
+            positions['Strike'] = strikes
+            positions['Premium'] = premiums
+            positions['Shares'] = shares
+        positions['Cash'] = cash
+        positions['IsExercised'] = exercised
+        positions['Premium_Income'] = np.cumsum(open_cash)
+        positions['Total_Asset'] = shares * self._close + cash
+        return positions
+
+
+def compare_structures(data, structures, initial_shares=1000, trade_shares=100, threshold=0.1, settlement='physical',
+                       signals=None):
+    """
+    一次比较多个期权组合
+    所有组合的 (合约 × 腿) 展开后拼接成一批，结算和按组合的汇总都是整批数组运算。
+    :param structures: OptionStructure 列表
+    :return: DataFrame，以组合名称为索引，包含合约数、行权次数、权利金净收入、期末资产和收益率
+    """
+    close = readonly_array(data['Close'])
+    if signals is None:
+        signals = threshold_crossings(close, threshold)
+    bars, directions = signals
+
+    with phase('multi_leg.compare', structures=len(structures)):
+        open_bars, legs, owner, contract_counts = [], [], [], []
+        for k, structure in enumerate(structures):
+            selected, _ = _select_signals(bars, directions, structure.open_on)
+            # 每个合约的每条腿展开为一行，合约数 × 腿数
+            open_bars.append(np.repeat(selected, len(structure.legs)))
+            legs.append(np.tile(structure.legs, len(selected)))
+            owner.append(np.full(len(selected) * len(structure.legs), k, dtype=np.int64))
+            contract_counts.append(len(selected))
+        open_bars = np.concatenate(open_bars)
+        legs = np.concatenate(legs)
+        owner = np.concatenate(owner)
+
+        # 展开后每行是一份单腿合约，开仓日和腿参数逐行对应
+        flat = _settle(close, open_bars, legs, trade_shares, settlement)
+
+        m = len(structures)
+        share_delta = np.bincount(owner, flat['share_delta'], minlength=m)
+        open_cash = np.bincount(owner, flat['open_cash'], minlength=m)
+        expiry_cash = np.bincount(owner, flat['expiry_cash'], minlength=m)
+        exercised = np.bincount(owner, flat['exercised'], minlength=m)
+
+    initial_cash = 100000.0
+    initial_asset = initial_shares * close[0] + initial_cash
+    final_asset = (initial_shares + share_delta) * close[-1] + initial_cash + open_cash + expiry_cash
+    return pd.DataFrame({
+        'contracts': contract_counts,
+        'exercised': exercised.astype(np.int64),
+        'premium_income': open_cash,
+        'final_asset': final_asset,
+        'return_pct': (final_asset / initial_asset - 1) * 100,
+    }, index=pd.Index([structure.name for structure in structures], name='structure'))
+
@@ -0,0 +1,443 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from profiler import phase
+from data_cache import FileLock
+
+# 期权类型编码，与 memory_utils.OPTION_TYPE_DTYPE 的分类编码一致
+CALL = 1
+PUT = 2
+
+# 各标准列可接受的原始列名（不区分大小写），覆盖常见的历史期权链导出格式
+COLUMN_ALIASES = {
+    'quote_date': ('quote_date', 'date', 'quotedate', 'trade_date', 'data_date', 'timestamp'),
+    'expiry': ('expiry', 'expiration', 'expiration_date', 'exdate', 'expire_date', 'expirdate'),
+    'strike': ('strike', 'strike_price'),
+    'type': ('type', 'option_type', 'call_put', 'cp_flag', 'right', 'put_call'),
+    'bid': ('bid', 'best_bid', 'bid_price'),
+    'ask': ('ask', 'best_offer', 'ask_price', 'offer'),
+    'last': ('last', 'mark', 'last_price', 'close', 'price'),
+}
+
+# 存储的列及其类型；日期为自1970-01-01起的天数
+CHAIN_COLUMNS = {
+    'quote_date': np.int64,
+    'expiry': np.int64,
+    'strike': np.float64,
+    'type': np.int8,
+    'bid': np.float64,
+    'ask': np.float64,
+    'mid': np.float64,
+}
+
+_META_FILE = 'meta.json'
+
+# 组合键中每个日期占用的位数（天数最大约5700年）
+_DAY_BITS = 21
+
+
+def _days(values):
+    """日期列转换为自1970-01-01起的天数"""
+    return pd.to_datetime(values).values.astype('datetime64[D]').astype(np.int64)
+
+
+def _type_codes(values):
+    """期权类型列（call/put、C/P 等）转换为编码"""
+    text = pd.Series(values).astype(str).str.strip().str.upper().str[0]
+    codes = np.where(text == 'C', CALL, np.where(text == 'P', PUT, 0)).astype(np.int8)
+    if (codes == 0).any():
+        bad = pd.Series(values)[codes == 0].iloc[0]
+        raise ValueError(f"无法识别的期权类型：{bad}")
+    return codes
+
+
+def _group_keys(types, quote_dates, expiries):
+    """(类型, 报价日, 到期日) 的组合键，排序顺序与逐列字典序相同"""
+    return (types.astype(np.int64) << (2 * _DAY_BITS)) | (quote_dates << _DAY_BITS) | expiries
+
+
+def normalize_chain(frame):
+    """
+    把原始期权链数据整理为标准列（见 CHAIN_COLUMNS）
+    中间价优先取买卖价的平均值，没有有效报价时使用最新价
+    """
+    lower = {column.lower().strip(): column for column in frame.columns}
+    columns = {}
+    for name, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lower:
+                columns[name] = frame[lower[alias]]
+                break
+    missing = [name for name in ('quote_date', 'expiry', 'strike', 'type') if name not in columns]
+    if missing:
+        raise ValueError(f"期权链数据缺少必要的列：{missing}")
+    if not any(name in columns for name in ('bid', 'ask', 'last')):
+        raise ValueError("期权链数据缺少报价列（bid/ask/last）")
+
+    n = len(frame)
+    result = {
+        'quote_date': _days(columns['quote_date']),
+        'expiry': _days(columns['expiry']),
+        'strike': pd.to_numeric(columns['strike']).to_numpy(dtype=np.float64),
+        'type': _type_codes(columns['type']),
+    }
+    for name in ('bid', 'ask', 'last'):
+        result[name] = pd.to_numeric(columns[name], errors='coerce').to_numpy(dtype=np.float64) \
+            if name in columns else np.full(n, np.nan)
+    quoted = (result['bid'] > 0) & (result['ask'] >= result['bid'])
+    result['mid'] = np.where(quoted, (result['bid'] + result['ask']) / 2, result.pop('last'))
+    return result
+
+
+def read_chain_file(path, chunksize=1_000_000):
+    """
+    读取一个期权链文件（.csv / .csv.gz / .parquet），返回标准列
+    CSV 按块读取并逐块整理，不在内存中保留完整的原始文本列
+    """
+    if path.endswith('.parquet'):
+        try:
+            return normalize_chain(pd.read_parquet(path))
+        except ImportError:
+            raise ImportError("读取Parquet格式的期权链需要安装 pyarrow")
+    parts = [normalize_chain(chunk) for chunk in pd.read_csv(path, chunksize=chunksize)]
+    if not parts:
+        return {name: np.empty(0, dtype=dtype) for name, dtype in CHAIN_COLUMNS.items()}
+    return {name: np.concatenate([part[name] for part in parts]) for name in CHAIN_COLUMNS}
+
+
+class OptionChain:
+    """
+    一个标的的历史期权链（列式存储）
+    所有行按 (类型, 报价日, 到期日, 行权价) 排序；加载时建立 (类型, 报价日, 到期日) 分组的起止位置，
+    报价日、到期日和行权价的查找都是有序数组上的二分查找，每次查找为 O(log n)。
+    """
+
+    def __init__(self, underlying, columns, fingerprint=None):
+        """
+        :param underlying: 标的代码
+        :param columns: {列名: 数组}，见 CHAIN_COLUMNS，必须已按上述顺序排序
+        :param fingerprint: 内容哈希，参与回测结果缓存键的计算
+        """
+        self.underlying = underlying
+        self.columns = columns
+        self.fingerprint = fingerprint
+        for name in CHAIN_COLUMNS:
+            setattr(self, name, columns[name])
+        keys = _group_keys(self.type, self.quote_date, self.expiry)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+        # 每个分组的组合键和在行数组中的起止位置
+        self.group_keys = keys[starts]
+        self.group_starts = starts
+        self.group_ends = np.r_[starts[1:], len(keys)].astype(np.int64)
+        # 每个 (类型, 报价日) 的组合键（到期日部分为0），用于查找最近的报价日
+        self.date_keys = self.group_keys >> _DAY_BITS
+
+    def __len__(self):
+        return len(self.strike)
+
+    @property
+    def nbytes(self):
+        return sum(int(values.nbytes) for values in self.columns.values())
+
+    def _quote_groups(self, dates, types, max_stale_days):
+        """
+        每个查询日期对应的报价日：不晚于查询日期的最近报价日，超过 max_stale_days 天时视为没有报价
+        :return: (报价日, 是否有报价)
+        """
+        query = (types.astype(np.int64) << _DAY_BITS) | dates
+        pos = np.searchsorted(self.date_keys, query, side='right') - 1
+        found = pos >= 0
+        quote_keys = self.date_keys[np.maximum(pos, 0)]
+        quote_dates = quote_keys & ((1 << _DAY_BITS) - 1)
+        found &= ((quote_keys >> _DAY_BITS) == types) & (dates - quote_dates <= max_stale_days)
+        return quote_dates, found
+
+    def _nearest_expiry_groups(self, types, quote_dates, target_expiries, found):
+        """同一报价日的到期日中离目标到期日最近的分组（距离相同时取较晚的到期日）"""
+        lower = self.group_keys_for(types, quote_dates, 0)
+        upper = self.group_keys_for(types, quote_dates + 1, 0)
+        block_start = np.searchsorted(self.group_keys, lower)
+        block_end = np.searchsorted(self.group_keys, upper)
+        pos = np.searchsorted(self.group_keys, self.group_keys_for(types, quote_dates, target_expiries))
+        after = np.minimum(pos, np.maximum(block_end - 1, 0))
+        before = np.maximum(pos - 1, block_start)
+        expiry_mask = (1 << _DAY_BITS) - 1
+        after_gap = np.abs((self.group_keys[after] & expiry_mask) - target_expiries)
+        before_gap = np.abs((self.group_keys[before] & expiry_mask) - target_expiries)
+        groups = np.where(before_gap < after_gap, before, after)
+        return np.where(found & (block_end > block_start), groups, -1)
+
+    @staticmethod
+    def group_keys_for(types, quote_dates, expiries):
+        return _group_keys(np.asarray(types), np.asarray(quote_dates, dtype=np.int64),
+                           np.asarray(expiries, dtype=np.int64))
+
+    def _nearest_strike(self, group, strike):
+        """分组内离目标行权价最近的行（距离相同时取较低的行权价）"""
+        start, end = self.group_starts[group], self.group_ends[group]
+        pos = start + int(np.searchsorted(self.strike[start:end], strike))
+        if pos >= end:
+            return end - 1
+        if pos > start and strike - self.strike[pos - 1] <= self.strike[pos] - strike:
+            return pos - 1
+        return pos
+
+    def select(self, dates, types, strikes, days_to_expiry=30, max_stale_days=5):
+        """
+        为每个信号选择合约：最近的报价日、离目标期限最近的到期日、离目标行权价最近的行权价
+        :param dates: 信号日期（datetime64 或可被 pandas 解析的日期）
+        :param types: 期权类型编码（CALL / PUT）
+        :param strikes: 目标行权价
+        :param days_to_expiry: 目标剩余期限（天）
+        :param max_stale_days: 报价日最多比信号日期早多少天
+        :return: 行号数组，没有可用报价的信号为 -1
+        """
+        dates = _days(dates)
+        types = np.asarray(types, dtype=np.int64)
+        strikes = np.asarray(strikes, dtype=np.float64)
+        rows = np.full(len(dates), -1, dtype=np.int64)
+        if len(self) == 0 or len(dates) == 0:
+            return rows
+        with phase('chain.select', signals=len(dates)):
+            quote_dates, found = self._quote_groups(dates, types, max_stale_days)
+            groups = self._nearest_expiry_groups(types, quote_dates, quote_dates + days_to_expiry, found)
+            for i in np.flatnonzero(groups >= 0):
+                rows[i] = self._nearest_strike(groups[i], strikes[i])
+        return rows
+
+    def mark(self, rows, dates):
+        """
+        按报价日期对已选择的合约逐日估值（同一类型、到期日和行权价的中间价）
+        :param rows: select() 返回的行号
+        :param dates: 估值日期
+        :return: 二维数组 (日期数 × 合约数)，当日没有该合约报价或已过到期日时为NaN
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        dates = _days(dates)
+        marks = np.full((len(dates), len(rows)), np.nan)
+        for j, row in enumerate(rows.tolist()):
+            if row < 0:
+                continue
+            live = dates <= self.expiry[row]
+            keys = self.group_keys_for(np.full(len(dates), self.type[row]), dates, self.expiry[row])
+            groups = np.searchsorted(self.group_keys, keys)
+            groups = np.minimum(groups, len(self.group_keys) - 1)
+            live &= self.group_keys[groups] == keys
+            for i in np.flatnonzero(live):
+                start, end = self.group_starts[groups[i]], self.group_ends[groups[i]]
+                pos = start + int(np.searchsorted(self.strike[start:end], self.strike[row]))
+                if pos < end and self.strike[pos] == self.strike[row]:
+                    marks[i, j] = self.mid[pos]
+        return marks
+
+    def contracts(self, rows):
+        """已选择合约的明细（行号为 -1 的信号各列为空）"""
+        rows = np.asarray(rows, dtype=np.int64)
+        valid = rows >= 0
+        safe = np.where(valid, rows, 0)
+        table = pd.DataFrame({
+            'QuoteDate': self.quote_date[safe].astype('datetime64[D]'),
+            'Expiry': self.expiry[safe].astype('datetime64[D]'),
+            'Type': np.where(self.type[safe] == CALL, 'call', 'put'),
+            'Strike': self.strike[safe],
+            'Bid': self.bid[safe],
+            'Ask': self.ask[safe],
+            'Mid': self.mid[safe],
+        })
+        return table.where(pd.Series(valid, index=table.index), axis=0)
+
+
+class OptionChainStore:
+    """
+    按标的保存的本地期权链存储
+    导入的CSV/Parquet文件整理为列式的 .npy 文件（每列一个文件，排序后保存），
+    打开时以只读内存映射方式加载，数百万行的期权链不需要整体读入内存。
+    """
+
+    def __init__(self, root='cache/chains'):
+        self.root = root
+        self._chains = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, underlying):
+        return os.path.join(self.root, underlying.upper())
+
+    def underlyings(self):
+        """已导入的标的列表"""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, _META_FILE)))
+
+    def ingest(self, underlying, paths, replace=False):
+        """
+        导入期权链文件，与已导入的数据合并（相同合约、相同报价日的行以新数据为准）
+        :param paths: 文件路径或路径列表
+        :param replace: 为True时丢弃已导入的数据
+        :return: 导入后的 OptionChain
+        """
+        if isinstance(paths, str):
+            paths = [paths]
+        directory = self._dir(underlying)
+        with FileLock(os.path.join(self.root, '.locks', f"{underlying.upper()}.lock")):
+            parts = []
+            if not replace and os.path.exists(os.path.join(directory, _META_FILE)):
+                existing = self._open(underlying)
+                parts.append({name: np.asarray(values) for name, values in existing.columns.items()})
+            for path in paths:
+                with phase('chain.read', path=path):
+                    parts.append(read_chain_file(path))
+            columns = {name: np.concatenate([part[name] for part in parts]).astype(dtype, copy=False)
+                       for name, dtype in CHAIN_COLUMNS.items()}
+            with phase('chain.sort', rows=len(columns['strike'])):
+                columns = self._sorted_unique(columns)
+            self._write(directory, columns)
+        with self._lock:
+            self._chains.pop(underlying.upper(), None)
+        return self.open(underlying)
+
+    @staticmethod
+    def _sorted_unique(columns):
+        """按 (类型, 报价日, 到期日, 行权价) 排序，重复的合约保留最后导入的一行"""
+        n = len(columns['strike'])
+        order = np.lexsort((np.arange(n), columns['strike'], columns['expiry'], columns['quote_date'],
+                            columns['type']))
+        columns = {name: values[order] for name, values in columns.items()}
+        keys = _group_keys(columns['type'], columns['quote_date'], columns['expiry'])
+        last = np.r_[(keys[1:] != keys[:-1]) | (columns['strike'][1:] != columns['strike'][:-1]), True] \
+            if n else np.empty(0, dtype=bool)
+        return {name: values[last] for name, values in columns.items()}
+
+    def _write(self, directory, columns):
+        """写入临时目录后替换旧目录，已打开的内存映射不受影响"""
+        tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        digest = hashlib.sha256()
+        for name, values in columns.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), values, allow_pickle=False)
+            digest.update(np.ascontiguousarray(values).tobytes())
+        with open(os.path.join(tmp_dir, _META_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'rows': len(columns['strike']), 'fingerprint': digest.hexdigest(), 'written': time.time()}, f)
+        old_dir = f"{directory}.{os.getpid()}.old"
+        if os.path.exists(directory):
+            os.replace(directory, old_dir)
+        os.replace(tmp_dir, directory)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def _open(self, underlying):
+        directory = self._dir(underlying)
+        with open(os.path.join(directory, _META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        columns = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in CHAIN_COLUMNS}
+        return OptionChain(underlying.upper(), columns, meta['fingerprint'])
+
+    def open(self, underlying):
+        """打开标的的期权链（进程内缓存），未导入时返回None"""
+        key = underlying.upper()
+        with self._lock:
+            chain = self._chains.get(key)
+        if chain is not None:
+            return chain
+        if not os.path.exists(os.path.join(self._dir(underlying), _META_FILE)):
+            return None
+        with phase('chain.open', underlying=key):
+            chain = self._open(underlying)
+        with self._lock:
+            self._chains[key] = chain
+        return chain
+
+
+def synthetic_chain(close, strikes_per_expiry=40, expiries=6, strike_step=None, seed=0):
+    """
+    由收盘价序列生成模拟的历史期权链（每个交易日、若干个月度到期日、围绕现价的一组行权价），用于测试和基准
+    权利金按到期时间和虚实程度的简化公式计算，只用于检验存储和查找，不代表真实定价
+    """
+    rng = np.random.default_rng(seed)
+    dates = _days(close.index)
+    price = close.to_numpy(dtype=np.float64)
+    step = strike_step or max(1.0, round(float(np.median(price)) * 0.01))
+    frames = []
+    offsets = (np.arange(strikes_per_expiry) - strikes_per_expiry // 2) * step
+    for k in range(expiries):
+        expiry = dates + 30 * (k + 1) - (dates % 30)
+        tenor = (expiry - dates) / 365.0
+        for option_type in (CALL, PUT):
+            centre = np.round(price / step) * step
+            strike = centre[:, None] + offsets[None, :]
+            moneyness = (price[:, None] - strike) * (1 if option_type == CALL else -1)
+            value = np.maximum(moneyness, 0) + price[:, None] * 0.2 * np.sqrt(tenor[:, None]) * \
+                np.exp(-np.abs(moneyness) / (price[:, None] * 0.1))
+            spread = np.maximum(value * 0.02, 0.01) * rng.uniform(0.5, 1.5, value.shape)
+            frames.append(pd.DataFrame({
+                'quote_date': np.repeat(dates, strikes_per_expiry).astype('datetime64[D]'),
+                'expiration': np.repeat(expiry, strikes_per_expiry).astype('datetime64[D]'),
+                'strike': strike.ravel(),
+                'type': 'C' if option_type == CALL else 'P',
+                'bid': np.round(value - spread / 2, 2).clip(0.01).ravel(),
+                'ask': np.round(value + spread / 2, 2).ravel(),
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    import tempfile
+    from option_strategy import OptionTrader
+
+    parser = argparse.ArgumentParser(description='导入历史期权链文件；不提供文件时运行导入和查找基准（使用模拟数据）')
+    parser.add_argument('files', nargs='*', help='期权链文件（CSV/Parquet）')
+    parser.add_argument('--underlying', help='导入文件的标的代码')
+    parser.add_argument('--root', default='cache/chains', help='期权链存储目录')
+    parser.add_argument('--dates', type=int, default=2520, help='交易日数')
+    parser.add_argument('--strikes', type=int, default=40, help='每个到期日的行权价数')
+    parser.add_argument('--expiries', type=int, default=6, help='每个交易日的到期日数')
+    args = parser.parse_args()
+
+    if args.files:
+        if not args.underlying:
+            parser.error("导入文件时需要指定 --underlying")
+        chain = OptionChainStore(args.root).ingest(args.underlying, args.files)
+        print(f"{chain.underlying}：共 {len(chain):,} 行，{len(chain.group_keys):,} 个 (类型, 报价日, 到期日) 分组")
+        return
+
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range('2014-01-02', periods=args.dates)
+    close = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, args.dates))), index=index)
+    data = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1}, index=index)
+
+    with tempfile.TemporaryDirectory() as directory:
+        raw = synthetic_chain(close, args.strikes, args.expiries)
+        path = os.path.join(directory, 'chain.csv')
+        raw.to_csv(path, index=False)
+        store = OptionChainStore(os.path.join(directory, 'chains'))
+        start = time.perf_counter()
+        chain = store.ingest('SYN', path)
+        ingest_seconds = time.perf_counter() - start
+        print(f"导入 {len(chain):,} 行，耗时 {ingest_seconds:.2f} 秒，列式存储 {chain.nbytes / 1024 / 1024:.1f} MB")
+
+        start = time.perf_counter()
+        trader = OptionTrader(data, threshold=0.05, chain=chain)
+        indexed = time.perf_counter() - start
+        print(f"期权策略（期权链定价）：{len(trader.chain_rows)} 个信号，耗时 {indexed * 1000:.1f} ms，"
+              f"未找到报价 {trader.chain_misses} 个")
+
+        # 对比：每个信号在原始DataFrame上筛选
+        quote_dates = pd.to_datetime(raw['quote_date'])
+        sample = np.unique(trader.events['bar'])[:20]
+        start = time.perf_counter()
+        for bar in sample.tolist():
+            day = raw[quote_dates == index[bar]]
+            day.iloc[(day['strike'] - close.iloc[bar]).abs().argsort()[:1]]
+        scan = (time.perf_counter() - start) / max(len(sample), 1)
+        print(f"逐信号扫描DataFrame：每个信号 {scan * 1000:.1f} ms，"
+              f"{len(trader.chain_rows)} 个信号约 {scan * len(trader.chain_rows):.2f} 秒")
+
+
+if __name__ == "__main__":
+    main()
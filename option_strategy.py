@@ -1,149 +1,269 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from profiler import profiled, phase
+from memory_utils import (
+    shared_price_frame, readonly_array, is_readonly_frame,
+    SIGNAL_DTYPE, PRICE_DTYPE, SHARES_DTYPE, OPTION_TYPE_DTYPE
+)
+from signal_engine import threshold_crossings
+from trade_events import (
+    make_events, event_signals, share_deltas, cash_deltas, running_total, premium_deltas,
+    dense_running, dense_per_bar,
+    EVENT_SELL_PUT, EVENT_SELL_CALL, EVENT_PUT_EXERCISED, EVENT_CALL_EXERCISED
+)
 
 class OptionTrader:
-    def __init__(self, data, initial_shares=1000, trade_shares=100, threshold=0.1, premium_rate=0.05):
+    # 回测引擎版本，引擎逻辑变化时递增，使持久化的回测结果失效
+    # 3: 行权日改为按自然月最后一天判断，之前带 freq='B' 的索引会在月末前最后一个工作日行权
+    ENGINE_VERSION = '3'
+    
+    def __init__(self, data, initial_shares=1000, trade_shares=100, threshold=0.1, premium_rate=0.05, lean=False, signals=None, events=None,
+                 chain=None, days_to_expiry=30):
         """
         初始化期权交易策略
+        回测结果以稀疏的事件日志 events 保存，逐日的 positions 和 data 中的期权列在首次访问时才生成
         :param data: DataFrame，包含股票价格数据
         :param initial_shares: 初始持股数量
         :param trade_shares: 每次交易的股数
         :param threshold: 触发信号的价格变化阈值
         :param premium_rate: 期权费率
+        :param lean: 内存精简模式，共享价格数据而不复制，信号存为int8、期权类型存为分类编码、价格存为float32
+        :param signals: 可选的预先计算好的 (信号K线序号, 信号方向)，多个策略对比时共用同一组信号
+        :param events: 可选的已保存的事件日志，提供时直接恢复回测结果，不再重新计算
+        :param chain: 可选的历史期权链（option_chain_store.OptionChain），提供时按真实报价选择行权价并收取买价作为权利金，
+                      没有报价的信号仍按 premium_rate 估算
+        :param days_to_expiry: 使用期权链时的目标剩余期限（天）
         """
-        self.data = data.copy()
-        # 添加必要的列到 data DataFrame
-        self.data['Signal'] = 0
-        self.data['OptionType'] = ''
-        self.data['IsExercised'] = False
-        self.data['StrikePrice'] = 0.0
-        self.data['Premium'] = 0.0
-        self.data['OptionShares'] = 0
-        
+        self.lean = lean
+        # 只读的共享价格数据（SharedPriceRegistry）不会被修改，直接共享而不复制
+        self._data = shared_price_frame(data) if lean or is_readonly_frame(data) else data.copy()
+        self._option_columns_added = False
+        self.initial_shares = initial_shares
+        self.initial_cash = 100000.0  # 初始现金10万
         self.trade_shares = trade_shares
         self.threshold = threshold
         self.premium_rate = premium_rate
+        self.chain = chain
+        self.days_to_expiry = days_to_expiry
+        self.chain_rows = None
+        self.chain_misses = 0
         
-        # 初始化持仓DataFrame
-        self.positions = pd.DataFrame(index=data.index)
-        self.positions['Close'] = data['Close']
-        self.positions['Signal'] = 0
-        self.positions['Strike'] = 0.0
-        self.positions['Premium'] = 0.0
-        self.positions['Shares'] = float(initial_shares)
-        self.positions['Cash'] = 100000.0  # 初始现金10万
-        self.positions['IsExercised'] = False
-        self.positions['Premium_Income'] = 0.0
-        
-        # 计算初始总资产
-        initial_total_asset = float(initial_shares * data['Close'].iloc[0] + 100000.0)
-        self.positions['Total_Asset'] = initial_total_asset
+        # 计算过程统一使用float64的只读价格视图
+        self._close = readonly_array(self._data['Close'])
+        self._positions = None
         
         # 生成交易信号和执行回测
-        self._generate_signals()
-        self._backtest()
+        if events is not None:
+            self._restore_events(events)
+        else:
+            self._generate_signals(signals)
+            self._backtest()
     
-    def _generate_signals(self):
-        """生成期权交易信号，基于复权价格的波动"""
-        reference_price = self.data['Close'].iloc[0]  # 初始参考价格（复权）
-        
-        for i in range(1, len(self.data)):
-            current_price = self.data['Close'].iloc[i]
-            price_change = (current_price - reference_price) / reference_price
-            
-            # 根据价格变化生成信号
-            if price_change >= self.threshold:  # 上涨超过阈值，卖出看涨期权
-                strike_price = current_price * 0.99  # 轻度虚值期权
-                premium = current_price * self.premium_rate  # 使用设定的权利金费率
-                
-                # 更新 positions DataFrame
-                self.positions.iloc[i, self.positions.columns.get_loc('Signal')] = -1
-                self.positions.iloc[i, self.positions.columns.get_loc('Strike')] = strike_price
-                self.positions.iloc[i, self.positions.columns.get_loc('Premium')] = premium
-                
-                # 更新 data DataFrame
-                self.data.iloc[i, self.data.columns.get_loc('Signal')] = -1
-                self.data.iloc[i, self.data.columns.get_loc('OptionType')] = 'call'
-                self.data.iloc[i, self.data.columns.get_loc('StrikePrice')] = strike_price
-                self.data.iloc[i, self.data.columns.get_loc('Premium')] = premium
-                self.data.iloc[i, self.data.columns.get_loc('OptionShares')] = self.trade_shares
-                
-                reference_price = current_price
-                
-            elif price_change <= -self.threshold:  # 下跌超过阈值，卖出看跌期权
-                strike_price = current_price * 1.01  # 轻度虚值期权
-                premium = current_price * self.premium_rate  # 使用设定的权利金费率
-                
-                # 更新 positions DataFrame
-                self.positions.iloc[i, self.positions.columns.get_loc('Signal')] = 1
-                self.positions.iloc[i, self.positions.columns.get_loc('Strike')] = strike_price
-                self.positions.iloc[i, self.positions.columns.get_loc('Premium')] = premium
-                
-                # 更新 data DataFrame
-                self.data.iloc[i, self.data.columns.get_loc('Signal')] = 1
-                self.data.iloc[i, self.data.columns.get_loc('OptionType')] = 'put'
-                self.data.iloc[i, self.data.columns.get_loc('StrikePrice')] = strike_price
-                self.data.iloc[i, self.data.columns.get_loc('Premium')] = premium
-                self.data.iloc[i, self.data.columns.get_loc('OptionShares')] = self.trade_shares
-                
-                reference_price = current_price
+    @profiled('option.generate_signals')
+    def _generate_signals(self, signals=None):
+        """生成期权交易信号，基于复权价格的波动，可直接使用预先计算好的共享信号"""
+        if signals is None:
+            signals = threshold_crossings(self._close, self.threshold)
+        self._signal_bars, self._signal_directions = signals
     
+    def _select_contracts(self):
+        """为每个信号在期权链中选择合约（目标行权价与估算模型相同），返回行号，没有报价的为 -1"""
+        prices = self._close[self._signal_bars]
+        is_call = self._signal_directions == -1
+        return self.chain.select(
+            self._data.index[self._signal_bars],
+            np.where(is_call, 1, 2),
+            np.where(is_call, prices * 0.99, prices * 1.01),
+            days_to_expiry=self.days_to_expiry
+        )
+    
+    def _chain_quotes(self):
+        """
+        为每个信号在期权链中选择合约和卖出价（买价，没有买价时用中间价）
+        没有合约或合约没有可用报价的信号计入 chain_misses，回测和由事件日志恢复时使用同一口径
+        :return: (行权价数组, 权利金数组)，未命中的信号为NaN
+        """
+        self.chain_rows = self._select_contracts()
+        found = self.chain_rows >= 0
+        safe_rows = np.where(found, self.chain_rows, 0)
+        bids = np.where(self.chain.bid[safe_rows] > 0, self.chain.bid[safe_rows], self.chain.mid[safe_rows])
+        strikes = np.where(found, self.chain.strike[safe_rows], np.nan)
+        premiums = np.where(found & np.isfinite(bids), bids, np.nan)
+        self.chain_misses = int(np.count_nonzero(~np.isfinite(premiums)))
+        return strikes, premiums
+    
+    @profiled('option.backtest')
     def _backtest(self):
-        """执行回测，使用复权价格计算资产价值"""
+        """执行回测，逐个处理信号日并记录期权交易和行权事件"""
+        # 按自然月判断月底，is_month_end 在带 freq='B' 的索引上会按工作日月末判断
+        index = self._data.index
+        month_end = np.asarray(index.day == index.days_in_month)
+        shares = float(self.initial_shares)
+        cash = self.initial_cash
         premium_income = 0.0  # 跟踪累计权利金收入
+        rows = []
         
-        for i in range(1, len(self.positions)):
-            # 复制前一天的持仓和现金
-            self.positions.iloc[i, self.positions.columns.get_loc('Shares')] = self.positions.iloc[i-1]['Shares']
-            self.positions.iloc[i, self.positions.columns.get_loc('Cash')] = self.positions.iloc[i-1]['Cash']
-            self.positions.iloc[i, self.positions.columns.get_loc('Premium_Income')] = premium_income
-            self.positions.iloc[i, self.positions.columns.get_loc('IsExercised')] = False  # 默认设置为 False
+        # 使用期权链时预先为所有信号查找合约（每个信号一次二分查找），卖出按买价成交
+        chain_strikes = chain_premiums = None
+        if self.chain is not None:
+            chain_strikes, chain_premiums = self._chain_quotes()
+        
+        for k, (i, direction) in enumerate(zip(self._signal_bars.tolist(), self._signal_directions.tolist())):
+            current_price = float(self._close[i])
+            if direction == -1:  # 卖出看涨期权
+                strike = current_price * 0.99  # 轻度虚值期权
+                premium = current_price * self.premium_rate  # 使用设定的权利金费率
+            else:  # 卖出看跌期权
+                strike = current_price * 1.01  # 轻度虚值期权
+                premium = current_price * self.premium_rate
+            if chain_premiums is not None and np.isfinite(chain_premiums[k]):
+                strike = float(chain_strikes[k])  # 期权链中最接近的挂牌行权价
+                premium = float(chain_premiums[k])
+            rows.append((i, EVENT_SELL_CALL if direction == -1 else EVENT_SELL_PUT, self.trade_shares, current_price, strike, premium))
             
-            # 检查是否有新的期权交易
-            signal = self.positions.iloc[i]['Signal']
-            if signal != 0:
-                # 收取期权费
-                premium = self.positions.iloc[i]['Premium'] * self.trade_shares
-                self.positions.iloc[i, self.positions.columns.get_loc('Cash')] += premium
-                premium_income += premium
-                self.positions.iloc[i, self.positions.columns.get_loc('Premium_Income')] = premium_income
+            # 收取期权费
+            cash += premium * self.trade_shares
+            premium_income += premium * self.trade_shares
             
             # 检查期权是否被行权（月底）
-            if self.data.index[i].is_month_end:
-                strike = self.positions.iloc[i]['Strike']
-                current_price = self.positions.iloc[i]['Close']
-                
-                if signal == -1 and current_price > strike:  # 看涨期权被行权
-                    # 更新行权状态
-                    self.positions.iloc[i, self.positions.columns.get_loc('IsExercised')] = True
-                    
-                    # 按行权价卖出股票
-                    proceeds = float(strike * self.trade_shares)
-                    self.positions.iloc[i, self.positions.columns.get_loc('Shares')] -= self.trade_shares
-                    self.positions.iloc[i, self.positions.columns.get_loc('Cash')] += proceeds
-                    
-                elif signal == 1 and current_price < strike:  # 看跌期权被行权
-                    # 更新行权状态
-                    self.positions.iloc[i, self.positions.columns.get_loc('IsExercised')] = True
-                    
-                    # 按行权价买入股票
-                    cost = float(strike * self.trade_shares)
-                    self.positions.iloc[i, self.positions.columns.get_loc('Shares')] += self.trade_shares
-                    self.positions.iloc[i, self.positions.columns.get_loc('Cash')] -= cost
-            
-            # 更新总资产价值（使用复权价格）
-            total_asset = float(
-                self.positions.iloc[i]['Shares'] * self.positions.iloc[i]['Close'] +
-                self.positions.iloc[i]['Cash']
-            )
-            self.positions.iloc[i, self.positions.columns.get_loc('Total_Asset')] = total_asset
+            if month_end[i]:
+                if direction == -1 and current_price > strike:  # 看涨期权被行权，按行权价卖出股票
+                    rows.append((i, EVENT_CALL_EXERCISED, self.trade_shares, current_price, strike, 0.0))
+                    shares -= self.trade_shares
+                    cash += float(strike * self.trade_shares)
+                elif direction == 1 and current_price < strike:  # 看跌期权被行权，按行权价买入股票
+                    rows.append((i, EVENT_PUT_EXERCISED, self.trade_shares, current_price, strike, 0.0))
+                    shares += self.trade_shares
+                    cash -= float(strike * self.trade_shares)
+        
+        self.events = make_events(rows)
+        self.final_shares = shares
+        self.final_cash = cash
+        self.total_premium = premium_income
+    
+    def _restore_events(self, events):
+        """由已保存的事件日志恢复回测结果"""
+        self.events = events
+        is_sale = (events['type'] == EVENT_SELL_PUT) | (events['type'] == EVENT_SELL_CALL)
+        self._signal_bars = events['bar'][is_sale].astype(np.int64)
+        self._signal_directions = event_signals(events)[is_sale]
+        self.final_shares = running_total(share_deltas(events), float(self.initial_shares))
+        self.final_cash = running_total(cash_deltas(events), self.initial_cash)
+        self.total_premium = running_total(premium_deltas(events), 0.0)
+        if self.chain is not None:
+            self._chain_quotes()
+    
+    def contract_marks(self):
+        """
+        使用期权链时，各信号卖出的合约从卖出日到到期日的逐日中间价（期权空头的盯市价值）
+        :return: DataFrame，行为交易日，列为信号序号，没有报价的日期为NaN；未使用期权链时为None
+        """
+        if self.chain is None:
+            return None
+        with phase('option.contract_marks'):
+            marks = self.chain.mark(self.chain_rows, self._data.index)
+        before_sale = np.arange(len(self._close))[:, None] < self._signal_bars[None, :]
+        marks[before_sale] = np.nan
+        return pd.DataFrame(marks, index=self._data.index)
+    
+    @property
+    def initial_asset(self):
+        """初始总资产"""
+        return float(self.initial_shares * self._close[0] + self.initial_cash)
+    
+    @property
+    def final_asset(self):
+        """最终总资产，直接由事件日志的结果计算，无需生成逐日持仓"""
+        return float(self.final_shares * self._close[-1] + self.final_cash)
+    
+    @property
+    def data(self):
+        """价格数据及逐日期权列，期权列在首次访问时由事件日志生成"""
+        if not self._option_columns_added:
+            with phase('option.data_columns'):
+                self._add_option_columns()
+            self._option_columns_added = True
+        return self._data
+    
+    @property
+    def positions(self):
+        """逐日持仓DataFrame，首次访问时由事件日志生成"""
+        if self._positions is None:
+            with phase('option.positions'):
+                self._positions = self._build_positions()
+        return self._positions
+    
+    def _sale_columns(self):
+        """期权卖出事件展开成的逐日信号、行权价和权利金"""
+        n = len(self._close)
+        events = self.events
+        is_sale = (events['type'] == EVENT_SELL_PUT) | (events['type'] == EVENT_SELL_CALL)
+        signals = dense_per_bar(events, event_signals(events), n, mask=is_sale, dtype=SIGNAL_DTYPE)
+        strikes = dense_per_bar(events, events['strike'], n, mask=is_sale)
+        premiums = dense_per_bar(events, events['premium'], n, mask=is_sale)
+        return signals, strikes, premiums
+    
+    def _add_option_columns(self):
+        """把期权交易信息写入 data DataFrame"""
+        signals, strikes, premiums = self._sale_columns()
+        option_codes = np.where(signals == -1, 1, np.where(signals == 1, 2, 0))
+        option_shares = np.where(signals != 0, self.trade_shares, 0)
+        if self.lean:
+            self._data['Signal'] = signals
+            self._data['OptionType'] = pd.Categorical.from_codes(option_codes, dtype=OPTION_TYPE_DTYPE)
+            self._data['IsExercised'] = False
+            self._data['StrikePrice'] = strikes.astype(PRICE_DTYPE)
+            self._data['Premium'] = premiums.astype(PRICE_DTYPE)
+            self._data['OptionShares'] = option_shares.astype(SHARES_DTYPE)
+        else:
+            self._data['Signal'] = signals.astype(np.int64)
+            self._data['OptionType'] = np.array(['', 'call', 'put'], dtype=object)[option_codes]
+            self._data['IsExercised'] = False
+            self._data['StrikePrice'] = strikes
+            self._data['Premium'] = premiums
+            self._data['OptionShares'] = option_shares.astype(np.int64)
+    
+    def _build_positions(self):
+        """由事件日志展开逐日持仓，精简模式下使用紧凑的数据类型"""
+        n = len(self._close)
+        events = self.events
+        signals, strikes, premiums = self._sale_columns()
+        is_exercise = (events['type'] == EVENT_PUT_EXERCISED) | (events['type'] == EVENT_CALL_EXERCISED)
+        exercised = dense_per_bar(events, np.ones(len(events), dtype=bool), n, mask=is_exercise, fill=False, dtype=bool)
+        shares = dense_running(events, share_deltas(events), n, self.initial_shares)
+        cash = dense_running(events, cash_deltas(events), n, self.initial_cash)
+        premium_income = dense_running(events, premium_deltas(events), n, 0.0)
+        
+        positions = pd.DataFrame(index=self._data.index)
+        if self.lean:
+            positions['Close'] = self._close.astype(PRICE_DTYPE)
+            positions['Signal'] = signals
+            positions['Strike'] = strikes.astype(PRICE_DTYPE)
+            positions['Premium'] = premiums.astype(PRICE_DTYPE)
+            positions['Shares'] = shares.astype(SHARES_DTYPE)
+        else:
+            positions['Close'] = self._data['Close']
+            positions['Signal'] = signals.astype(np.int64)
+            positions['Strike'] = strikes
+            positions['Premium'] = premiums
+            positions['Shares'] = shares
+        positions['Cash'] = cash
+        positions['IsExercised'] = exercised
+        positions['Premium_Income'] = premium_income
+        # 总资产价值（使用复权价格）
+        positions['Total_Asset'] = shares * self._close + cash
+        return positions
+    
+    def memory_components(self):
+        """当前已生成的数据组件，用于内存报告（不会触发逐日数据的生成）"""
+        return {'data': self._data, 'events': self.events, 'positions': self._positions}
 
 # 使用示例
 if __name__ == "__main__":
+    from data_providers import provider_chain_from_env
     trader = OptionTrader(
-        data=yf.Ticker("AAPL").history(start="2023-05-01", end="2024-05-01"),
+        data=provider_chain_from_env().get_stock_data("AAPL", "2023-05-01", "2024-05-01"),
         initial_shares=1000,
         trade_shares=100,
         threshold=0.1
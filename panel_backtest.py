@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from profiler import profiled, phase
+
+# 面板文件：收盘价矩阵、有效数据掩码、交易日和股票列表
+_CLOSE_FILE = 'close.npy'
+_MASK_FILE = 'mask.npy'
+_DATES_FILE = 'dates.npy'
+_META_FILE = 'panel.json'
+
+
+def _write_index(directory, dates, symbols, shape):
+    """写入交易日和股票列表，元数据最后写入，存在即表示面板完整"""
+    np.save(os.path.join(directory, _DATES_FILE), np.asarray(dates, dtype=np.int64), allow_pickle=False)
+    meta_path = os.path.join(directory, _META_FILE)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'symbols': list(symbols), 'shape': list(shape)}, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+
+class PricePanel:
+    """
+    对齐到同一交易日历的多股票价格面板
+    收盘价保存为一个 (交易日 × 股票) 的二维float64数组，同一交易日的所有股票在内存中连续，
+    回测时每个交易日对整个股票池只需一次数组运算。mask 标记有效数据（上市前、退市后和停牌日为False）。
+    保存到目录后以内存映射方式打开，多个进程可以共享同一份数据而不复制。
+    """
+
+    def __init__(self, dates, symbols, close, mask):
+        """
+        :param dates: 交易日 DatetimeIndex
+        :param symbols: 股票代码列表
+        :param close: (交易日 × 股票) 收盘价数组，无效位置为NaN
+        :param mask: (交易日 × 股票) 有效数据掩码
+        """
+        self.dates = pd.DatetimeIndex(dates)
+        self.symbols = list(symbols)
+        self.close = close
+        self.mask = mask
+        self._columns = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    @classmethod
+    @profiled('panel.build')
+    def from_frames(cls, datasets, column='Close', directory=None):
+        """
+        由 {股票代码: 价格DataFrame} 创建面板，交易日历为所有股票日期的并集
+        :param column: 使用的价格列
+        :param directory: 提供时直接写入该目录下的内存映射文件（不在内存中保留完整矩阵），并以只读方式打开
+        """
+        symbols = list(datasets)
+        indices = [pd.DatetimeIndex(datasets[symbol].index).asi8 for symbol in symbols]
+        dates = np.unique(np.concatenate(indices)) if indices else np.empty(0, dtype=np.int64)
+        shape = (len(dates), len(symbols))
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            tmp_close = os.path.join(directory, _CLOSE_FILE + '.tmp')
+            tmp_mask = os.path.join(directory, _MASK_FILE + '.tmp')
+            close = np.lib.format.open_memmap(tmp_close, mode='w+', dtype=np.float64, shape=shape)
+            mask = np.lib.format.open_memmap(tmp_mask, mode='w+', dtype=np.bool_, shape=shape)
+            close[:] = np.nan
+            mask[:] = False
+        else:
+            close = np.full(shape, np.nan)
+            mask = np.zeros(shape, dtype=np.bool_)
+
+        # 每个股票只做一次查找和一次散列写入
+        for j, symbol in enumerate(symbols):
+            values = datasets[symbol][column].to_numpy(dtype=np.float64)
+            rows = np.searchsorted(dates, indices[j])
+            valid = np.isfinite(values) & (values > 0)
+            close[rows[valid], j] = values[valid]
+            mask[rows[valid], j] = True
+
+        if directory is None:
+            return cls(pd.DatetimeIndex(dates), symbols, close, mask)
+
+        close.flush()
+        mask.flush()
+        del close, mask
+        os.replace(tmp_close, os.path.join(directory, _CLOSE_FILE))
+        os.replace(tmp_mask, os.path.join(directory, _MASK_FILE))
+        _write_index(directory, dates, symbols, shape)
+        return cls.open(directory)
+
+    @classmethod
+    def open(cls, directory, mode='r'):
+        """以内存映射方式打开已保存的面板"""
+        with open(os.path.join(directory, _META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        dates = np.load(os.path.join(directory, _DATES_FILE), allow_pickle=False)
+        close = np.load(os.path.join(directory, _CLOSE_FILE), mmap_mode=mode)
+        mask = np.load(os.path.join(directory, _MASK_FILE), mmap_mode=mode)
+        return cls(pd.DatetimeIndex(dates), meta['symbols'], close, mask)
+
+    def save(self, directory):
+        """保存到目录，返回以内存映射方式打开的面板"""
+        os.makedirs(directory, exist_ok=True)
+        for name, array in ((_CLOSE_FILE, self.close), (_MASK_FILE, self.mask)):
+            tmp_path = os.path.join(directory, name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+            os.replace(tmp_path, os.path.join(directory, name))
+        _write_index(directory, self.dates.asi8, self.symbols, self.shape)
+        return PricePanel.open(directory)
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    @property
+    def nbytes(self):
+        return self.close.nbytes + self.mask.nbytes
+
+    def symbol_frame(self, symbol):
+        """单个股票的有效价格数据（可直接用于 SwingTrader / OptionTrader）"""
+        j = self._columns[symbol]
+        valid = np.asarray(self.mask[:, j])
+        return pd.DataFrame({'Close': np.asarray(self.close[valid, j])}, index=self.dates[valid])
+
+
+class PanelBacktestResult:
+    """
+    面板回测结果
+    summary 为每个股票一行的汇总表；record=True 时 swing_asset / option_asset 为逐日总资产矩阵（上市前为NaN）
+    """
+
+    def __init__(self, summary, swing_asset=None, option_asset=None):
+        self.summary = summary
+        self.swing_asset = swing_asset
+        self.option_asset = option_asset
+
+
+@profiled('panel.backtest')
+def panel_backtest(panel, threshold=0.1, initial_shares=1000, trade_shares=100, premium_rate=0.05,
+                   initial_cash=100000.0, record=False):
+    """
+    在整个股票池上同时运行波段策略和期权策略
+    规则与 SwingTrader / OptionTrader 完全相同，但每个交易日对所有股票执行一次向量运算，
+    而不是逐个股票回测。每个股票从第一个有效价格开始交易，无效数据的交易日不产生信号。
+    :param panel: PricePanel
+    :param threshold: 波动阈值，可以是标量或每个股票一个值的数组
+    :param record: 是否记录逐日总资产矩阵
+    :return: PanelBacktestResult
+    """
+    dates, symbols = panel.shape
+    threshold = np.broadcast_to(np.asarray(threshold, dtype=np.float64), (symbols,))
+    # 与 OptionTrader 一致按自然月判断月底，不受索引 freq 影响
+    month_end = np.asarray(panel.dates.day == panel.dates.days_in_month)
+    qty = float(trade_shares)
+    # 内存映射数组转为普通数组视图（不复制），避免每个交易日创建 memmap 切片对象
+    close_matrix = np.asarray(panel.close)
+    mask_matrix = np.asarray(panel.mask)
+
+    reference = np.full(symbols, np.nan)
+    first_price = np.full(symbols, np.nan)
+    last_price = np.full(symbols, np.nan)
+    shares = np.full(symbols, float(initial_shares))
+    cash = np.full(symbols, float(initial_cash))
+    option_shares = shares.copy()
+    option_cash = cash.copy()
+    premium_income = np.zeros(symbols)
+    signals = np.zeros(symbols, dtype=np.int64)
+    trades = np.zeros(symbols, dtype=np.int64)
+    exercised = np.zeros(symbols, dtype=np.int64)
+    if record:
+        swing_asset = np.full((dates, symbols), np.nan)
+        option_asset = np.full((dates, symbols), np.nan)
+
+    with phase('panel.backtest.steps', dates=dates, symbols=symbols):
+        for t in range(dates):
+            price = close_matrix[t]
+            valid = mask_matrix[t]
+            last_price = np.where(valid, price, last_price)
+
+            # 第一个有效价格作为初始参考价格，当天不产生信号
+            started = valid & np.isnan(reference)
+            if started.any():
+                reference[started] = price[started]
+                first_price[started] = price[started]
+
+            with np.errstate(invalid='ignore'):
+                change = (price - reference) / reference
+                sell = valid & ~started & (change >= threshold)
+                buy = valid & ~started & (change <= -threshold)
+            fired = sell | buy
+            if fired.any():
+                reference[fired] = price[fired]
+                signals += fired
+
+                # 波段策略：资金或持股不足时信号不执行
+                can_buy = buy & (qty * price <= cash)
+                can_sell = sell & (qty <= shares)
+                shares += np.where(can_buy, qty, 0.0) - np.where(can_sell, qty, 0.0)
+                cash += np.where(can_sell, qty * price, 0.0) - np.where(can_buy, qty * price, 0.0)
+                trades += can_buy | can_sell
+
+                # 期权策略：卖出看涨（上涨）或看跌（下跌）期权，月底价内期权被行权
+                premium = np.where(fired, price * premium_rate * qty, 0.0)
+                option_cash += premium
+                premium_income += premium
+                if month_end[t]:
+                    call_strike = price * 0.99
+                    put_strike = price * 1.01
+                    call_exercised = sell & (price > call_strike)
+                    put_exercised = buy & (price < put_strike)
+                    option_shares += np.where(put_exercised, qty, 0.0) - np.where(call_exercised, qty, 0.0)
+                    option_cash += (np.where(call_exercised, call_strike * qty, 0.0)
+                                    - np.where(put_exercised, put_strike * qty, 0.0))
+                    exercised += call_exercised | put_exercised
+
+            if record:
+                swing_asset[t] = shares * last_price + cash
+                option_asset[t] = option_shares * last_price + option_cash
+
+    initial_asset = initial_shares * first_price + initial_cash
+    swing_final = shares * last_price + cash
+    option_final = option_shares * last_price + option_cash
+    summary = pd.DataFrame({
+        'bars': np.count_nonzero(panel.mask, axis=0),
+        'signals': signals,
+        'swing_trades': trades,
+        'swing_final_asset': swing_final,
+        'swing_return_pct': (swing_final / initial_asset - 1) * 100,
+        'option_final_asset': option_final,
+        'option_return_pct': (option_final / initial_asset - 1) * 100,
+        'premium_income': premium_income,
+        'exercised': exercised,
+        'buy_and_hold_return_pct': (last_price / first_price - 1) * 100,
+    }, index=pd.Index(panel.symbols, name='symbol'))
+    if record:
+        return PanelBacktestResult(summary, swing_asset, option_asset)
+    return PanelBacktestResult(summary)
+
+
+def synthetic_universe(symbols, dates, seed=0, start_date='2004-01-01', listing_gaps=True):
+    """
+    生成模拟的股票池价格数据，部分股票晚上市或提前退市，并有少量停牌日
+    :return: {股票代码: 价格DataFrame}
+    """
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex(pd.bdate_range(start_date, periods=dates), freq=None)
+    close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (dates, symbols)), axis=0))
+    datasets = {}
+    for j in range(symbols):
+        keep = rng.random(dates) > 0.002
+        if listing_gaps and j % 5 == 0:
+            start, stop = sorted(rng.integers(0, dates, 2))
+            keep[:start] = False
+            keep[stop + 1:] = False
+        datasets[f"S{j:04d}"] = pd.DataFrame({'Close': close[keep, j]}, index=index[keep])
+    return datasets
+
+
+def main():
+    from swing_strategy import SwingTrader
+    from option_strategy import OptionTrader
+
+    parser = argparse.ArgumentParser(description='面板回测基准测试（使用模拟数据）')
+    parser.add_argument('--symbols', type=int, default=500, help='股票数量')
+    parser.add_argument('--dates', type=int, default=5040, help='交易日数（默认约20年）')
+    parser.add_argument('--threshold', type=float, default=0.1, help='波动阈值')
+    parser.add_argument('--directory', default=os.path.join('cache', 'panel_benchmark'), help='面板文件目录')
+    parser.add_argument('--sample', type=int, default=20, help='用于估算逐个回测耗时的股票数')
+    args = parser.parse_args()
+
+    datasets = synthetic_universe(args.symbols, args.dates)
+    start = time.perf_counter()
+    panel = PricePanel.from_frames(datasets, directory=args.directory)
+    print(f"构建面板 {panel.shape[0]} 交易日 × {panel.shape[1]} 股票（{panel.nbytes / 1024 / 1024:.1f} MB）: "
+          f"{time.perf_counter() - start:.2f} 秒")
+
+    start = time.perf_counter()
+    result = panel_backtest(panel, args.threshold)
+    panel_seconds = time.perf_counter() - start
+    print(f"面板回测: {panel_seconds:.2f} 秒")
+
+    sample = panel.symbols[:args.sample]
+    start = time.perf_counter()
+    for symbol in sample:
+        data = datasets[symbol]
+        SwingTrader(data, threshold=args.threshold)
+        OptionTrader(data, threshold=args.threshold)
+    loop_seconds = (time.perf_counter() - start) / len(sample) * len(panel.symbols)
+    print(f"逐个回测（按 {len(sample)} 个股票估算）: {loop_seconds:.2f} 秒，加速 {loop_seconds / panel_seconds:.1f} 倍")
+    print(result.summary.describe().T[['mean', 'min', 'max']])
+    shutil.rmtree(args.directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
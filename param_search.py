@@ -0,0 +1,259 @@
+import math
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from profiler import phase
+from signal_engine import threshold_crossings
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from performance_metrics import trader_metrics
+
+# 默认的参数空间：(类型, 参数)
+# 'uniform' 为区间内均匀分布，'log' 为对数均匀分布，'choice' 为从列表中选取
+DEFAULT_SPACE = {
+    'threshold': ('uniform', (0.02, 0.2)),
+    'premium_rate': ('uniform', (0.01, 0.1)),
+    'trade_shares': ('choice', (50, 100, 200, 300)),
+}
+
+# 可用的评分指标（越大越好）
+SCORE_METRICS = ('sharpe', 'sortino', 'calmar', 'total_return_pct', 'cagr_pct')
+
+# 工作进程中的价格数据，由 Pool 的 initializer 设置一次，避免每个任务重复传输
+_WORKER_DATASETS = None
+
+
+def sample_configs(space, n, rng):
+    """
+    从参数空间随机抽取 n 组参数
+    :param space: {参数名: (类型, 参数)}，见 DEFAULT_SPACE
+    :param rng: numpy 随机数生成器
+    :return: 参数字典列表
+    """
+    columns = {}
+    for name, (kind, args) in space.items():
+        if kind == 'uniform':
+            columns[name] = rng.uniform(args[0], args[1], n)
+        elif kind == 'log':
+            columns[name] = np.exp(rng.uniform(math.log(args[0]), math.log(args[1]), n))
+        elif kind == 'choice':
+            columns[name] = np.asarray(args)[rng.integers(0, len(args), n)]
+        else:
+            raise ValueError(f"未知的参数类型：{kind}")
+    return [{name: values[i].item() for name, values in columns.items()} for i in range(n)]
+
+
+def evaluate_config(datasets, config, budget, strategy='option', metric='sharpe', initial_shares=1000):
+    """
+    在每个股票最近 budget 根K线上回测一组参数，返回各股票评分的平均值
+    :param datasets: {股票代码: 价格DataFrame}
+    :param config: 参数字典（threshold、premium_rate、trade_shares）
+    :param budget: 使用的K线数（从最近的数据往前取）
+    :param strategy: 'swing'、'option' 或 'both'（两种策略评分的平均）
+    :param metric: 评分指标，见 SCORE_METRICS
+    """
+    threshold = config.get('threshold', 0.1)
+    trade_shares = int(config.get('trade_shares', 100))
+    premium_rate = config.get('premium_rate', 0.05)
+    scores = []
+    for data in datasets.values():
+        window = data.iloc[-budget:]
+        close = window['Close'].to_numpy(dtype=np.float64)
+        signals = threshold_crossings(close, threshold)
+        traders = []
+        if strategy in ('swing', 'both'):
+            traders.append(SwingTrader(window, initial_shares, trade_shares, threshold, lean=True, signals=signals))
+        if strategy in ('option', 'both'):
+            traders.append(OptionTrader(window, initial_shares, trade_shares, threshold, premium_rate,
+                                        lean=True, signals=signals))
+        values = trader_metrics(traders, close)[metric].to_numpy()
+        # 没有波动的窗口（评分为NaN）视为最差
+        scores.append(np.where(np.isfinite(values), values, -np.inf).mean())
+    return float(np.mean(scores))
+
+
+def _init_worker(datasets):
+    global _WORKER_DATASETS
+    _WORKER_DATASETS = datasets
+
+
+def _evaluate_task(task):
+    config, budget, strategy, metric = task
+    return evaluate_config(_WORKER_DATASETS, config, budget, strategy, metric)
+
+
+class ParameterSearch:
+    """
+    自适应参数搜索：随机抽样 + 逐次减半（successive halving）/ Hyperband
+    以历史长度为预算：先用较短的最近窗口评估所有候选参数，每一轮只保留评分最好的 1/eta，
+    并把窗口长度乘以 eta，只有最有希望的参数才会在完整历史上评估。
+    相同的 seed 得到完全相同的候选参数和结果；评估可以在本地进程池中并行执行。
+    """
+
+    def __init__(self, datasets, space=None, strategy='option', metric='sharpe', eta=3, min_budget=60,
+                 max_budget=None, seed=0, workers=1):
+        """
+        :param datasets: {股票代码: 价格DataFrame}，也可以是单个DataFrame
+        :param space: 参数空间，默认 DEFAULT_SPACE
+        :param strategy: 'swing'、'option' 或 'both'
+        :param metric: 评分指标，见 SCORE_METRICS
+        :param eta: 每轮保留 1/eta 的候选参数，预算乘以 eta
+        :param min_budget: 最短的评估窗口（K线数）
+        :param max_budget: 最长的评估窗口，默认为最短股票的完整历史
+        :param seed: 随机种子
+        :param workers: 进程数，1 为在当前进程中执行
+        """
+        if isinstance(datasets, pd.DataFrame):
+            datasets = {'data': datasets}
+        if metric not in SCORE_METRICS:
+            raise ValueError(f"不支持的评分指标：{metric}，可选 {', '.join(SCORE_METRICS)}")
+        if eta < 2:
+            raise ValueError("eta 必须不小于2")
+        self.datasets = datasets
+        self.space = space or DEFAULT_SPACE
+        self.strategy = strategy
+        self.metric = metric
+        self.eta = eta
+        history = min(len(data) for data in datasets.values())
+        self.max_budget = min(max_budget or history, history)
+        self.min_budget = min(min_budget, self.max_budget)
+        self.seed = seed
+        self.workers = workers
+        self.trials = []
+        self.bars_evaluated = 0
+        self._pool = None
+
+    def _evaluate(self, configs, budget):
+        """评估一批参数，结果顺序与输入相同"""
+        tasks = [(config, budget, self.strategy, self.metric) for config in configs]
+        self.bars_evaluated += budget * len(configs) * len(self.datasets)
+        with phase('search.evaluate', configs=len(configs), budget=budget):
+            if self._pool is not None:
+                return self._pool.map(_evaluate_task, tasks)
+            return [evaluate_config(self.datasets, *task) for task in tasks]
+
+    def _record(self, configs, scores, budget, bracket, rung):
+        for config, score in zip(configs, scores):
+            self.trials.append(dict(config, budget=budget, score=score, bracket=bracket, rung=rung))
+
+    def successive_halving(self, n_configs, min_budget=None, bracket=0, rng=None):
+        """
+        运行一轮逐次减半
+        :param n_configs: 初始候选参数数量
+        :param min_budget: 第一轮的窗口长度，默认为 self.min_budget
+        :return: (最佳参数, 最佳参数在最长窗口上的评分)
+        """
+        rng = rng if rng is not None else np.random.default_rng(self.seed)
+        budget = min_budget or self.min_budget
+        configs = sample_configs(self.space, n_configs, rng)
+        rung = 0
+        while True:
+            scores = self._evaluate(configs, budget)
+            self._record(configs, scores, budget, bracket, rung)
+            if budget >= self.max_budget or len(configs) == 1:
+                break
+            # 按评分排序（相同评分保持原顺序），保留前 1/eta
+            keep = max(1, len(configs) // self.eta)
+            order = np.argsort(-np.asarray(scores), kind='stable')[:keep]
+            configs = [configs[i] for i in order]
+            # 只剩一组参数时直接在完整历史上评估
+            budget = self.max_budget if keep == 1 else min(budget * self.eta, self.max_budget)
+            rung += 1
+        best = int(np.argmax(scores))
+        return configs[best], scores[best]
+
+    def hyperband(self, max_configs=None):
+        """
+        Hyperband：用不同的初始候选数量和初始窗口长度运行多轮逐次减半，
+        兼顾"多候选、短窗口"和"少候选、长窗口"两种情况
+        :param max_configs: 第一轮（最激进）的候选数量，默认由预算范围决定
+        :return: (最佳参数, 评分)
+        """
+        rng = np.random.default_rng(self.seed)
+        s_max = max(0, int(math.floor(math.log(self.max_budget / self.min_budget, self.eta) + 1e-9)))
+        best_config, best_score, best_budget = None, -np.inf, -1
+        for s in range(s_max, -1, -1):
+            n_configs = max_configs if max_configs and s == s_max else \
+                int(math.ceil((s_max + 1) / (s + 1) * self.eta ** s))
+            min_budget = max(self.min_budget, int(self.max_budget / self.eta ** s))
+            config, score = self.successive_halving(n_configs, min_budget, bracket=s_max - s, rng=rng)
+            budget = self.trials[-1]['budget']
+            # 只比较在最长窗口上得到的评分
+            if (budget, score) > (best_budget, best_score):
+                best_config, best_score, best_budget = config, score, budget
+        return best_config, best_score
+
+    def run(self, method='hyperband', n_configs=27):
+        """
+        执行搜索
+        :param method: 'hyperband' 或 'halving'
+        :param n_configs: 逐次减半的初始候选数量（hyperband 时为第一轮的候选数量）
+        :return: SearchResult
+        """
+        start = time.perf_counter()
+        self.trials = []
+        self.bars_evaluated = 0
+        if self.workers > 1:
+            from multiprocessing import Pool
+            self._pool = Pool(self.workers, initializer=_init_worker, initargs=(self.datasets,))
+        try:
+            if method == 'hyperband':
+                best, score = self.hyperband(n_configs)
+            elif method == 'halving':
+                best, score = self.successive_halving(n_configs)
+            else:
+                raise ValueError(f"未知的搜索方法：{method}")
+        finally:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool.join()
+                self._pool = None
+        return SearchResult(best, score, pd.DataFrame(self.trials), self.bars_evaluated,
+                            time.perf_counter() - start)
+
+
+class SearchResult:
+    """参数搜索结果：最佳参数、评分、全部评估记录和评估开销"""
+
+    def __init__(self, best, score, trials, bars_evaluated, seconds):
+        self.best = best
+        self.score = score
+        self.trials = trials
+        self.bars_evaluated = bars_evaluated
+        self.seconds = seconds
+
+    def summary(self):
+        """每轮（bracket, rung）的候选数量、窗口长度和最佳评分"""
+        return self.trials.groupby(['bracket', 'rung']).agg(
+            configs=('score', 'size'), budget=('budget', 'first'), best_score=('score', 'max'))
+
+
+def main():
+    from panel_backtest import synthetic_universe
+
+    parser = argparse.ArgumentParser(description='自适应参数搜索（使用模拟数据）')
+    parser.add_argument('--symbols', type=int, default=5, help='股票数量')
+    parser.add_argument('--dates', type=int, default=1500, help='交易日数')
+    parser.add_argument('--method', choices=['hyperband', 'halving'], default='hyperband')
+    parser.add_argument('--configs', type=int, default=81, help='初始候选数量')
+    parser.add_argument('--metric', choices=SCORE_METRICS, default='sharpe')
+    parser.add_argument('--strategy', choices=['swing', 'option', 'both'], default='option')
+    parser.add_argument('--workers', type=int, default=1, help='进程数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    datasets = synthetic_universe(args.symbols, args.dates, listing_gaps=False)
+    search = ParameterSearch(datasets, strategy=args.strategy, metric=args.metric, seed=args.seed,
+                             workers=args.workers)
+    result = search.run(args.method, args.configs)
+    sampled = int((result.trials['rung'] == 0).sum())
+    full_cost = sampled * search.max_budget * len(datasets)
+    print(result.summary())
+    print(f"最佳参数: {result.best}，评分: {result.score:.3f}")
+    print(f"评估 {len(result.trials)} 次（{sampled} 组候选参数），共 {result.bars_evaluated:,} 根K线，"
+          f"耗时 {result.seconds:.2f} 秒；全部候选在完整历史上评估需 {full_cost:,} 根K线")
+
+
+if __name__ == "__main__":
+    main()
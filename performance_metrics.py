@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from trade_events import dense_running, share_deltas, cash_deltas
+
+# 每年的K线数（日线）
+PERIODS_PER_YEAR = 252
+
+# 指标的显示名称和格式
+METRIC_LABELS = {
+    'total_return_pct': ('总收益率', '{:.2f}%'),
+    'cagr_pct': ('年化收益率', '{:.2f}%'),
+    'volatility_pct': ('年化波动率', '{:.2f}%'),
+    'sharpe': ('夏普比率', '{:.2f}'),
+    'sortino': ('索提诺比率', '{:.2f}'),
+    'max_drawdown_pct': ('最大回撤', '{:.2f}%'),
+    'max_drawdown_bars': ('最长回撤期（交易日）', '{:.0f}'),
+    'calmar': ('卡玛比率', '{:.2f}'),
+    'win_rate_pct': ('上涨交易日占比', '{:.2f}%'),
+    'exposure_pct': ('平均持股仓位', '{:.2f}%'),
+    'turnover': ('年化换手率', '{:.2f}'),
+    'trades': ('交易次数', '{:.0f}'),
+}
+
+
+def performance_metrics(total_asset, shares=None, cash=None, close=None, periods_per_year=PERIODS_PER_YEAR,
+                        risk_free_rate=0.0, names=None):
+    """
+    计算一批回测的完整绩效指标
+    输入为 (回测数 × K线数) 的数组（单个回测也可以是一维数组），所有回测一次完成，
+    每个数组只做少数几次整批运算，没有逐回测的pandas操作。
+    :param total_asset: 逐日总资产
+    :param shares: 逐日持股数，提供时计算换手率和交易次数（换手率还需要 close）
+    :param cash: 逐日现金，提供时计算平均持股仓位
+    :param close: 收盘价，一维（所有回测共用）或与 total_asset 形状相同
+    :param periods_per_year: 每年的K线数
+    :param risk_free_rate: 年化无风险利率
+    :param names: 各回测的名称，作为结果的索引
+    :return: DataFrame，每行一个回测，列见 METRIC_LABELS（缺少输入的指标为NaN）
+    """
+    total_asset = np.atleast_2d(np.asarray(total_asset, dtype=np.float64))
+    runs, bars = total_asset.shape
+    years = max(bars - 1, 1) / periods_per_year
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = total_asset[:, 1:] / total_asset[:, :-1] - 1
+        excess = returns - risk_free_rate / periods_per_year
+        mean_excess = excess.mean(axis=1)
+        volatility = returns.std(axis=1, ddof=1) if bars > 2 else np.full(runs, np.nan)
+        downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2, axis=1))
+        growth = total_asset[:, -1] / total_asset[:, 0]
+
+        # 回撤：相对历史最高点的跌幅；回撤期：距离上一次创新高的K线数
+        running_max = np.maximum.accumulate(total_asset, axis=1)
+        drawdown = 1 - total_asset / running_max
+        bar_index = np.arange(bars)
+        last_peak = np.maximum.accumulate(np.where(total_asset >= running_max, bar_index, 0), axis=1)
+        max_drawdown = drawdown.max(axis=1)
+
+        cagr = np.where(growth > 0, growth ** (1 / years) - 1, np.nan)
+        metrics = {
+            'total_return_pct': (growth - 1) * 100,
+            'cagr_pct': cagr * 100,
+            'volatility_pct': volatility * np.sqrt(periods_per_year) * 100,
+            'sharpe': mean_excess / volatility * np.sqrt(periods_per_year),
+            'sortino': mean_excess / downside * np.sqrt(periods_per_year),
+            'max_drawdown_pct': max_drawdown * 100,
+            'max_drawdown_bars': (bar_index - last_peak).max(axis=1).astype(np.float64),
+            'calmar': cagr / max_drawdown,
+            'win_rate_pct': (returns > 0).mean(axis=1) * 100 if bars > 1 else np.full(runs, np.nan),
+            'exposure_pct': np.full(runs, np.nan),
+            'turnover': np.full(runs, np.nan),
+            'trades': np.full(runs, np.nan),
+        }
+
+        if cash is not None:
+            cash = np.atleast_2d(np.asarray(cash, dtype=np.float64))
+            metrics['exposure_pct'] = ((total_asset - cash) / total_asset).mean(axis=1) * 100
+        if shares is not None:
+            shares = np.atleast_2d(np.asarray(shares, dtype=np.float64))
+            traded = np.abs(np.diff(shares, axis=1))
+            metrics['trades'] = np.count_nonzero(traded, axis=1).astype(np.float64)
+            if close is not None:
+                close = np.asarray(close, dtype=np.float64)
+                traded_value = (traded * (close[..., 1:] if close.ndim == 1 else close[:, 1:])).sum(axis=1)
+                metrics['turnover'] = traded_value / total_asset.mean(axis=1) / years
+
+    return pd.DataFrame(metrics, index=names)
+
+
+def ledger_arrays(events, close, initial_shares, initial_cash):
+    """
+    由事件日志直接展开逐日总资产、持股和现金数组（不生成positions DataFrame）
+    :return: (total_asset, shares, cash)
+    """
+    n = len(close)
+    shares = dense_running(events, share_deltas(events), n, float(initial_shares))
+    cash = dense_running(events, cash_deltas(events), n, float(initial_cash))
+    return shares * close + cash, shares, cash
+
+
+def trader_metrics(traders, close, names=None, periods_per_year=PERIODS_PER_YEAR):
+    """
+    一批 SwingTrader / OptionTrader 的绩效指标（同一价格数据）
+    :param traders: 策略对象列表
+    :param close: 收盘价数组
+    :param periods_per_year: 每年的K线数（周线、月线等周期需要相应调整）
+    :return: DataFrame，每行一个策略对象
+    """
+    close = np.asarray(close, dtype=np.float64)
+    ledgers = [ledger_arrays(trader.events, close, trader.initial_shares, trader.initial_cash) for trader in traders]
+    total_asset, shares, cash = (np.vstack(columns) for columns in zip(*ledgers))
+    return performance_metrics(total_asset, shares, cash, close, periods_per_year=periods_per_year, names=names)
+
+
+def format_metrics(metrics):
+    """把指标表转换为便于显示的文本表（指标为行，回测为列）"""
+    rows = {}
+    for column, (label, fmt) in METRIC_LABELS.items():
+        rows[label] = [fmt.format(value) if np.isfinite(value) else '-' for value in metrics[column]]
+    return pd.DataFrame(rows, index=metrics.index).T
@@ -0,0 +1,203 @@
+import os
+import time
+import argparse
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from profiler import phase
+from data_cache import StockDataCache
+from data_providers import provider_chain_from_env, quota_from_env, is_valid_price_data
+
+# 应用侧边栏的默认日期范围，预取这个范围可以让大多数首次请求直接命中缓存
+DEFAULT_RANGES = [('2023-01-01', '2024-01-01')]
+
+
+def parse_watchlist(text):
+    """解析逗号分隔的股票代码列表"""
+    return [symbol.strip().upper() for symbol in (text or '').split(',') if symbol.strip()]
+
+
+def parse_ranges(text):
+    """解析 '开始:结束' 形式、逗号分隔的日期范围列表，为空时使用默认范围"""
+    ranges = []
+    for item in (text or '').split(','):
+        if item.strip():
+            start, end = item.strip().split(':')
+            ranges.append((start.strip(), end.strip()))
+    return ranges or list(DEFAULT_RANGES)
+
+
+def parse_hours(text):
+    """解析 '开始-结束' 形式的时段（本地时间的小时，可跨午夜），为空时不限时段"""
+    if not text:
+        return None
+    start, end = text.split('-')
+    return int(start), int(end)
+
+
+def in_window(hours, now=None):
+    """当前时间是否在预取时段内"""
+    if hours is None:
+        return True
+    hour = (now or datetime.now()).hour
+    start, end = hours
+    return start <= hour < end if start <= end else (hour >= start or hour < end)
+
+
+class Prefetcher:
+    """
+    后台预取：在空闲时段刷新监控列表中股票的缓存
+    请求通过 RequestQuota 的后台上下文发出，只使用交互请求不需要的配额；
+    取不到配额时等待下一轮，从未完成的股票继续。缓存写入与交互请求使用同一把跨进程锁。
+    """
+
+    def __init__(self, cache, provider, watchlist, ranges=None, quota=None, hours=None, refresh_after=12 * 3600,
+                 poll_interval=30.0):
+        """
+        :param cache: StockDataCache
+        :param provider: 数据源（通常为 provider_chain_from_env 创建的回退链）
+        :param watchlist: 股票代码列表
+        :param ranges: (开始日期, 结束日期) 列表，默认 DEFAULT_RANGES
+        :param quota: 与交互请求共用的 RequestQuota，None 表示不限配额
+        :param hours: 预取时段 (开始小时, 结束小时)，None 表示任何时间
+        :param refresh_after: 缓存写入超过该秒数才重新获取
+        :param poll_interval: 两轮之间的等待秒数
+        """
+        self.cache = cache
+        self.provider = provider
+        self.watchlist = list(watchlist)
+        self.ranges = list(ranges or DEFAULT_RANGES)
+        self.quota = quota
+        self.hours = hours
+        self.refresh_after = refresh_after
+        self.poll_interval = poll_interval
+        self.counters = {'refreshed': 0, 'fresh': 0, 'deferred': 0, 'failed': 0, 'rounds': 0}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def pending(self):
+        """需要刷新的 (股票代码, 开始日期, 结束日期) 列表，按监控列表顺序"""
+        items = []
+        for symbol in self.watchlist:
+            for start_date, end_date in self.ranges:
+                age = self.cache.age(self.cache.key_for(symbol, start_date, end_date))
+                if age is None or age >= self.refresh_after:
+                    items.append((symbol, start_date, end_date))
+        return items
+
+    def _fetch(self, symbol, start_date, end_date):
+        if self.quota is None:
+            return self.provider.get_stock_data(symbol, start_date, end_date)
+        with self.quota.background():
+            return self.provider.get_stock_data(symbol, start_date, end_date)
+
+    def run_once(self):
+        """
+        执行一轮预取，取不到配额或离开预取时段时提前结束
+        :return: 本轮的计数 {'refreshed', 'fresh', 'deferred', 'failed'}
+        """
+        result = {'refreshed': 0, 'fresh': 0, 'deferred': 0, 'failed': 0}
+        pending = self.pending()
+        result['fresh'] = len(self.watchlist) * len(self.ranges) - len(pending)
+        for i, (symbol, start_date, end_date) in enumerate(pending):
+            # 离开预取时段、配额不足或交互请求正在使用配额时，剩余的股票留到下一轮
+            if self._stop.is_set() or not in_window(self.hours) or \
+                    (self.quota is not None and not self.quota.background_ready()):
+                result['deferred'] += len(pending) - i
+                break
+            with phase('prefetch.fetch', symbol=symbol):
+                data = self.cache.refresh(symbol, start_date, end_date,
+                                          lambda: self._fetch(symbol, start_date, end_date),
+                                          validate=is_valid_price_data)
+            result['refreshed' if is_valid_price_data(data) else 'failed'] += 1
+        with self._lock:
+            for name, value in result.items():
+                self.counters[name] += value
+            self.counters['rounds'] += 1
+        return result
+
+    def _loop(self):
+        while not self._stop.is_set():
+            if in_window(self.hours):
+                try:
+                    result = self.run_once()
+                    if result['refreshed']:
+                        print(f"预取完成：刷新 {result['refreshed']} 项，推迟 {result['deferred']} 项")
+                except Exception as e:
+                    print(f"预取失败：{str(e)}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """在后台守护线程中运行"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='stock-prefetcher', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        """计数和待刷新的项数"""
+        with self._lock:
+            counters = dict(self.counters)
+        counters['pending'] = len(self.pending())
+        counters['running'] = self._thread is not None and self._thread.is_alive()
+        return counters
+
+
+def prefetcher_from_env(cache, provider, quota=None):
+    """
+    根据环境变量创建预取器，未配置监控列表时返回None
+    PREFETCH_WATCHLIST: 逗号分隔的股票代码
+    PREFETCH_RANGES: 逗号分隔的 '开始:结束' 日期范围，默认为应用的默认日期范围
+    PREFETCH_HOURS: 预取时段，例如 '0-8'（本地时间），不设置则任何时间都可以预取
+    PREFETCH_REFRESH_HOURS: 缓存超过多少小时重新获取，默认12
+    PREFETCH_POLL_SECONDS: 两轮之间的等待秒数，默认30
+    """
+    watchlist = parse_watchlist(os.getenv('PREFETCH_WATCHLIST'))
+    if not watchlist:
+        return None
+    return Prefetcher(
+        cache, provider, watchlist,
+        ranges=parse_ranges(os.getenv('PREFETCH_RANGES')),
+        quota=quota,
+        hours=parse_hours(os.getenv('PREFETCH_HOURS')),
+        refresh_after=float(os.getenv('PREFETCH_REFRESH_HOURS', '12')) * 3600,
+        poll_interval=float(os.getenv('PREFETCH_POLL_SECONDS', '30')),
+    )
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description='后台预取监控列表的股票数据（独立进程运行）')
+    parser.add_argument('--once', action='store_true', help='只执行一轮')
+    parser.add_argument('--cache-dir', default='cache', help='缓存目录（与应用相同）')
+    args = parser.parse_args()
+
+    cache = StockDataCache(args.cache_dir, background=False)
+    # 独立进程的配额与应用进程不共享，应设置较低的 ALPHA_VANTAGE_RATE_PER_MIN，为交互请求留出余量
+    quota = quota_from_env()
+    provider = provider_chain_from_env(os.getenv('ALPHA_VANTAGE_API_KEY', 'demo'), quota=quota)
+    prefetcher = prefetcher_from_env(cache, provider, quota)
+    if prefetcher is None:
+        print("未设置 PREFETCH_WATCHLIST，无需预取")
+        return
+    if args.once:
+        print(prefetcher.run_once())
+        return
+    prefetcher.start()
+    try:
+        while True:
+            time.sleep(60)
+            print(prefetcher.status())
+    except KeyboardInterrupt:
+        prefetcher.stop()
+
+
+if __name__ == "__main__":
+    main()
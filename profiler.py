@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import threading
+import contextvars
+import tracemalloc
+from collections import deque
+from functools import wraps
+
+
+class _NullPhase:
+    """关闭剖析时使用的空上下文，进入和退出都不做任何事情"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+# 当前上下文（线程或Streamlit会话的一次运行）所属的运行编号，各会话互不影响
+_RUN_ID = contextvars.ContextVar('profile_run_id', default=0)
+
+
+class _Phase:
+    """单个阶段的计时上下文，记录墙钟时间、CPU时间和tracemalloc峰值"""
+
+    def __init__(self, profiler, name, meta):
+        self.profiler = profiler
+        self.name = name
+        self.meta = meta
+        self.child_peak = 0
+
+    def __enter__(self):
+        stack = self.profiler._stack()
+        if not stack:
+            self.profiler._thread_started()
+        # tracemalloc 的峰值是进程级的，其他线程同时在剖析时峰值不可信
+        self.epoch = self.profiler._memory_epoch() if self.profiler.active_threads == 1 else None
+        if self.profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # 内层阶段会重置峰值，先把外层到目前为止的峰值记下来
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+            tracemalloc.reset_peak()
+            self.start_memory = current
+        stack.append(self)
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        stack = self.profiler._stack()
+        stack.pop()
+
+        peak_kb = None
+        if self.profiler.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self.child_peak)
+            if self.epoch is not None and self.epoch == self.profiler._memory_epoch():
+                peak_kb = max(peak - self.start_memory, 0) / 1024
+            if stack:
+                stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        if not stack:
+            self.profiler._thread_finished()
+
+        self.profiler._record(self.name, wall, cpu, peak_kb, len(stack), self.meta, exc_type)
+        return False
+
+
+class Profiler:
+    """
+    阶段级性能剖析器
+    按阶段（API请求、缓存读取、信号生成、回测、图表构建、表格渲染等）
+    记录墙钟时间、CPU时间和tracemalloc内存峰值。
+    关闭时 phase() 直接返回共享的空上下文，几乎没有额外开销。
+    是否启用是进程级的设置（PROFILE_PHASES），运行编号按上下文保存，
+    多个会话并发时各自的记录互不混淆；此时内存峰值无法区分各线程，记为空。
+    """
+
+    def __init__(self, enabled=False, trace_memory=True, jsonl_path=None, max_records=5000):
+        """
+        :param enabled: 是否启用剖析
+        :param trace_memory: 是否使用tracemalloc记录内存峰值（有一定开销）
+        :param jsonl_path: JSON Lines 输出文件路径，为None时不写文件
+        :param max_records: 内存中保留的最大记录条数
+        """
+        self.enabled = False
+        self.trace_memory = trace_memory
+        self.jsonl_path = jsonl_path
+        self.records = deque(maxlen=max_records)
+        self.run_id = 0
+        self.active_threads = 0
+        self._overlaps = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._started_tracemalloc = False
+        if enabled:
+            self.enable()
+
+    @classmethod
+    def from_env(cls):
+        """
+        根据环境变量创建剖析器
+        PROFILE_PHASES=1 启用剖析，PROFILE_JSONL 指定输出文件，
+        PROFILE_TRACEMALLOC=0 关闭内存追踪
+        """
+        return cls(
+            enabled=os.getenv('PROFILE_PHASES', '0') == '1',
+            trace_memory=os.getenv('PROFILE_TRACEMALLOC', '1') == '1',
+            jsonl_path=os.getenv('PROFILE_JSONL') or None,
+        )
+
+    def enable(self, trace_memory=None):
+        """启用剖析，必要时启动tracemalloc"""
+        if trace_memory is not None:
+            self.trace_memory = trace_memory
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self.enabled = True
+
+    def disable(self):
+        """关闭剖析，并停止由本剖析器启动的tracemalloc"""
+        self.enabled = False
+        if self._started_tracemalloc and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._started_tracemalloc = False
+
+    def start_run(self):
+        """开始新的一次分析运行，当前上下文中后续的记录都会带上新的运行编号"""
+        with self._lock:
+            self.run_id += 1
+            run_id = self.run_id
+        _RUN_ID.set(run_id)
+        return run_id
+
+    def use_run(self, run_id):
+        """在当前上下文中继续记录到已有的运行（例如Streamlit片段单独重新运行时）"""
+        _RUN_ID.set(run_id or 0)
+
+    def current_run(self):
+        """当前上下文的运行编号"""
+        return _RUN_ID.get()
+
+    def _thread_started(self):
+        with self._lock:
+            self.active_threads += 1
+            if self.active_threads > 1:
+                self._overlaps += 1
+
+    def _thread_finished(self):
+        with self._lock:
+            self.active_threads -= 1
+
+    def _memory_epoch(self):
+        """其他线程开始剖析时变化，用来判断阶段期间内存峰值是否被其他线程重置过"""
+        return self._overlaps
+
+    def phase(self, name, **meta):
+        """
+        返回阶段计时上下文
+        用法: with profiler.phase('swing.backtest', symbol='AAPL'): ...
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name, meta)
+
+    def profiled(self, name):
+        """装饰器版本的 phase()，在调用时检查是否启用"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Phase(self, name, {}):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, name, wall, cpu, peak_kb, depth, meta, exc_type):
+        record = {
+            'run_id': _RUN_ID.get(),
+            'phase': name,
+            'depth': depth,
+            'wall_ms': round(wall * 1000, 3),
+            'cpu_ms': round(cpu * 1000, 3),
+            'peak_kb': round(peak_kb, 1) if peak_kb is not None else None,
+            'ts': time.time(),
+        }
+        if meta:
+            record['meta'] = meta
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        with self._lock:
+            self.records.append(record)
+            if self.jsonl_path:
+                try:
+                    with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                except Exception as e:
+                    print(f"写入剖析记录失败：{str(e)}")
+
+    def summary(self, run_id=None):
+        """
+        按阶段汇总记录
+        :param run_id: 只汇总指定运行的记录，为None时汇总全部
+        :return: 列表，每项包含 phase/calls/wall_ms/cpu_ms/peak_kb，按墙钟时间降序
+        """
+        with self._lock:
+            records = [r for r in self.records if run_id is None or r['run_id'] == run_id]
+
+        totals = {}
+        for r in records:
+            item = totals.setdefault(r['phase'], {
+                'phase': r['phase'], 'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'peak_kb': None
+            })
+            item['calls'] += 1
+            item['wall_ms'] += r['wall_ms']
+            item['cpu_ms'] += r['cpu_ms']
+            if r['peak_kb'] is not None:
+                item['peak_kb'] = max(item['peak_kb'] or 0.0, r['peak_kb'])
+        return sorted(totals.values(), key=lambda x: x['wall_ms'], reverse=True)
+
+    def clear(self):
+        """清空内存中的记录"""
+        with self._lock:
+            self.records.clear()
+
+
+# 进程级默认剖析器，各模块共用
+profiler = Profiler.from_env()
+
+
+def phase(name, **meta):
+    """使用默认剖析器记录一个阶段"""
+    return profiler.phase(name, **meta)
+
+
+def profiled(name):
+    """使用默认剖析器的装饰器"""
+    return profiler.profiled(name)
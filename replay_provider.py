@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from alpha_vantage_api import AlphaVantageAPI
+
+# Alpha Vantage 免费额度用尽时返回的提示（回放时按配置注入）
+RATE_LIMIT_NOTE = ("Thank you for using Alpha Vantage! Our standard API call frequency is 5 calls per minute "
+                   "and 500 calls per day.")
+
+# 不参与夹具文件名的查询参数
+_IGNORED_PARAMS = ('apikey',)
+
+
+def fixture_name(params):
+    """根据查询参数生成夹具文件名，例如 TIME_SERIES_DAILY_AAPL_full.json（不包含API密钥）"""
+    names = sorted(name for name in params if name not in _IGNORED_PARAMS and name not in ('function', 'symbol'))
+    parts = [str(params['function'])]
+    if 'symbol' in params:
+        parts.append(str(params['symbol']))
+    parts += [str(params[name]) for name in names]
+    return '_'.join(parts).replace(os.sep, '-') + '.json'
+
+
+def _write_json_atomic(payload, path):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class RecordingAlphaVantageAPI(AlphaVantageAPI):
+    """
+    录制模式：正常请求Alpha Vantage，并把完整的成功响应保存为本地夹具
+    限流提示和错误响应不会被录制
+    """
+
+    def __init__(self, api_key='demo', fixture_dir='fixtures'):
+        """
+        :param api_key: Alpha Vantage API密钥
+        :param fixture_dir: 夹具目录
+        """
+        super().__init__(api_key)
+        self.fixture_dir = fixture_dir
+
+    def _request(self, params):
+        data = super()._request(params)
+        if not any(key in data for key in ('Note', 'Information', 'Error Message')):
+            path = os.path.join(self.fixture_dir, fixture_name(params))
+            _write_json_atomic(data, path)
+            print(f"已录制响应到 {path}")
+        return data
+
+
+class ReplayAlphaVantageAPI(AlphaVantageAPI):
+    """
+    回放模式：从本地夹具读取响应，不访问网络
+    可以配置每次请求的延迟（含确定性的随机抖动）和限流提示注入，
+    使获取数据路径和端到端的基准测试可以离线、可重复地运行。
+    """
+
+    def __init__(self, api_key='demo', fixture_dir='fixtures', latency=0.0, jitter=0.0, note_every=0, seed=0):
+        """
+        :param api_key: 不使用，仅为保持接口一致
+        :param fixture_dir: 夹具目录
+        :param latency: 每次请求的固定延迟（秒）
+        :param jitter: 延迟的随机抖动上限（秒），由 seed 决定，结果可重复
+        :param note_every: 每第N次请求返回限流提示，0表示不注入
+        :param seed: 抖动的随机种子
+        """
+        super().__init__(api_key)
+        self.fixture_dir = fixture_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.note_every = note_every
+        self.calls = 0
+        self.notes = 0
+        self._rng = np.random.default_rng(seed)
+        # 夹具原始文本只从磁盘读取一次，每次请求仍然重新解析JSON，与真实请求的解析开销一致
+        self._raw = {}
+
+    def _request(self, params):
+        self.calls += 1
+        delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.note_every and self.calls % self.note_every == 0:
+            self.notes += 1
+            return {'Note': RATE_LIMIT_NOTE}
+
+        name = fixture_name(params)
+        raw = self._raw.get(name)
+        if raw is None:
+            path = os.path.join(self.fixture_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    raw = f.read()
+            except FileNotFoundError:
+                return {'Error Message': f"回放夹具不存在：{path}"}
+            self._raw[name] = raw
+        return json.loads(raw)
+
+
+def synthetic_daily_payload(symbol, start_date='2000-01-01', end_date='2024-01-01', start_price=100.0,
+                            volatility=0.02, seed=0):
+    """
+    生成与 TIME_SERIES_DAILY (outputsize=full) 响应格式相同的模拟数据
+    用于没有录制夹具的环境（价格为几何布朗运动，只包含工作日）
+    :return: 响应的JSON字典
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, end_date)
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, len(dates))))
+    open_ = close * (1 + rng.normal(0, volatility / 4, len(dates)))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, volatility / 4, len(dates))))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, volatility / 4, len(dates))))
+    volume = rng.integers(1_000_000, 50_000_000, len(dates))
+
+    series = {}
+    # 与真实响应一致，日期从新到旧排列
+    for i in range(len(dates) - 1, -1, -1):
+        series[dates[i].strftime('%Y-%m-%d')] = {
+            '1. open': f"{open_[i]:.4f}",
+            '2. high': f"{high[i]:.4f}",
+            '3. low': f"{low[i]:.4f}",
+            '4. close': f"{close[i]:.4f}",
+            '5. volume': str(volume[i]),
+        }
+    return {
+        'Meta Data': {
+            '1. Information': 'Daily Prices (open, high, low, close) and Volumes',
+            '2. Symbol': symbol,
+            '3. Last Refreshed': dates[-1].strftime('%Y-%m-%d'),
+            '4. Output Size': 'Full size',
+            '5. Time Zone': 'US/Eastern',
+        },
+        'Time Series (Daily)': series,
+    }
+
+
+def write_synthetic_fixture(fixture_dir, symbol, **kwargs):
+    """
+    把模拟数据写成回放夹具
+    :return: 夹具文件路径
+    """
+    params = {'function': 'TIME_SERIES_DAILY', 'symbol': symbol, 'outputsize': 'full'}
+    path = os.path.join(fixture_dir, fixture_name(params))
+    _write_json_atomic(synthetic_daily_payload(symbol, **kwargs), path)
+    return path
+
+
+def api_from_env(api_key='demo'):
+    """
+    根据环境变量创建数据接口
+    ALPHA_VANTAGE_MODE: live（默认）/ record / replay
+    ALPHA_VANTAGE_FIXTURES: 夹具目录，默认 fixtures
+    ALPHA_VANTAGE_REPLAY_LATENCY_MS: 回放延迟（毫秒）
+    ALPHA_VANTAGE_REPLAY_NOTE_EVERY: 回放时每第N次请求返回限流提示
+    """
+    mode = os.getenv('ALPHA_VANTAGE_MODE', 'live').lower()
+    fixture_dir = os.getenv('ALPHA_VANTAGE_FIXTURES', 'fixtures')
+    if mode == 'record':
+        return RecordingAlphaVantageAPI(api_key, fixture_dir)
+    if mode == 'replay':
+        return ReplayAlphaVantageAPI(
+            api_key, fixture_dir,
+            latency=float(os.getenv('ALPHA_VANTAGE_REPLAY_LATENCY_MS', '0')) / 1000,
+            note_every=int(os.getenv('ALPHA_VANTAGE_REPLAY_NOTE_EVERY', '0')),
+        )
+    return AlphaVantageAPI(api_key)
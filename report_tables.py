@@ -0,0 +1,74 @@
+import math
+import numpy as np
+import pandas as pd
+from trade_events import EVENT_NAMES, EVENT_BUY, EVENT_SELL
+
+# 每页显示的行数
+PAGE_SIZE = 50
+
+# 显示格式（printf风格），由前端格式化，服务端只传数值
+SWING_TABLE_FORMATS = {'价格': '$%.2f', '交易金额': '$%.2f', '交易股数': '%d'}
+OPTION_TABLE_FORMATS = {'价格': '$%.2f', '行权价': '$%.2f', '权利金': '$%.2f', '期权股数': '%d'}
+
+# 事件类型代码到显示名称的查找表，按代码直接索引，避免逐行映射
+_EVENT_CODES = np.array(sorted(EVENT_NAMES), dtype=np.int64)
+_EVENT_LABELS = [EVENT_NAMES[code] for code in _EVENT_CODES]
+_SWING_LABELS = ['买入', '卖出']
+
+
+def _positive_or_missing(values, dtype=np.float64):
+    """大于0的值保留，其余显示为空（对应原表格中的 '-'）"""
+    values = np.asarray(values)
+    if np.issubdtype(np.dtype(dtype), np.integer):
+        return pd.arrays.IntegerArray(values.astype(dtype), values <= 0)
+    return np.where(values > 0, values, np.nan).astype(dtype)
+
+
+def swing_trade_table(events, index):
+    """
+    波段策略的交易记录表（只包含实际成交的交易）
+    :param events: SwingTrader.events
+    :param index: 价格数据的日期索引
+    :return: DataFrame，列为 交易类型、价格、交易股数、交易金额（数值列，由显示层格式化）
+    """
+    executed = events[events['qty'] > 0]
+    codes = np.select([executed['type'] == EVENT_BUY, executed['type'] == EVENT_SELL], [0, 1], default=-1)
+    qty = executed['qty'].astype(np.int64)
+    return pd.DataFrame({
+        '交易类型': pd.Categorical.from_codes(codes, categories=_SWING_LABELS),
+        '价格': executed['price'],
+        '交易股数': qty,
+        '交易金额': qty * executed['price'],
+    }, index=index[executed['bar']])
+
+
+def option_trade_table(events, index):
+    """
+    期权策略的交易记录表（卖出期权和行权事件）
+    :param events: OptionTrader.events
+    :param index: 价格数据的日期索引
+    :return: DataFrame，列为 操作、价格、行权价、权利金、期权股数；为0的行权价、权利金和股数显示为空
+    """
+    codes = np.searchsorted(_EVENT_CODES, events['type'].astype(np.int64))
+    return pd.DataFrame({
+        '操作': pd.Categorical.from_codes(codes, categories=_EVENT_LABELS),
+        '价格': events['price'],
+        '行权价': _positive_or_missing(events['strike']),
+        '权利金': _positive_or_missing(events['premium']),
+        '期权股数': _positive_or_missing(events['qty'], np.int64),
+    }, index=index[events['bar']])
+
+
+def page_count(rows, page_size=PAGE_SIZE):
+    return max(1, math.ceil(rows / page_size))
+
+
+def paginate(table, page, page_size=PAGE_SIZE):
+    """
+    取出第 page 页（从1开始），只有这一页会被发送到前端
+    :return: 该页的DataFrame
+    """
+    page = min(max(int(page), 1), page_count(len(table), page_size))
+    start = (page - 1) * page_size
+    return table.iloc[start:start + page_size]
+
@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+from profiler import phase
+from trade_events import EVENT_DTYPE
+
+# 存储格式版本，存储布局变化时递增
+STORE_FORMAT_VERSION = '1'
+
+# 各策略参与缓存键计算的参数（lean 等只影响存储方式的参数不参与）
+RESULT_PARAMS = {
+    'SwingTrader': ('initial_shares', 'trade_shares', 'threshold'),
+    'OptionTrader': ('initial_shares', 'trade_shares', 'threshold', 'premium_rate', 'chain', 'days_to_expiry'),
+}
+
+# 只在提供时参与缓存键计算的参数（取默认值时不影响已保存结果的键）
+OPTIONAL_PARAMS = ('chain', 'days_to_expiry')
+
+DEFAULT_PARAMS = {
+    'initial_shares': 1000,
+    'trade_shares': 100,
+    'threshold': 0.1,
+    'premium_rate': 0.05,
+    'chain': None,
+    'days_to_expiry': 30,
+}
+
+
+def data_fingerprint(data):
+    """价格数据的内容哈希，只使用策略实际读取的日期索引和收盘价"""
+    digest = hashlib.sha256()
+    index_values = np.asarray(data.index.values)
+    if index_values.dtype.kind == 'M':
+        digest.update(index_values.astype('datetime64[ns]').view(np.int64).tobytes())
+    else:
+        digest.update('\x1f'.join(map(str, index_values)).encode('utf-8'))
+    digest.update(np.ascontiguousarray(data['Close'].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+class ResultStore:
+    """
+    按内容寻址的回测结果持久化存储
+    键由价格数据的内容哈希、策略类名及引擎版本和参数共同决定；
+    索引保存在SQLite中，每个结果的事件日志保存为单独的 .npy 列文件。
+    总大小超过上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, root='cache/results', max_bytes=200 * 1024 * 1024):
+        """
+        :param root: 存储目录
+        :param max_bytes: 结果文件总大小上限（字节）
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.db_path = os.path.join(root, 'index.sqlite')
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    strategy TEXT NOT NULL,
+                    engine_version TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_access ON results(last_access)")
+
+    @contextmanager
+    def _connect(self):
+        """打开SQLite连接，正常结束时提交，最后关闭连接"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def result_params(cls, params):
+        """取出参与缓存键计算的参数，未提供的使用策略默认值"""
+        names = RESULT_PARAMS[cls.__name__]
+        result = {}
+        for name in names:
+            value = params.get(name, DEFAULT_PARAMS[name])
+            if name in OPTIONAL_PARAMS and (value is None or value == DEFAULT_PARAMS[name]):
+                continue
+            # 期权链按内容哈希参与键计算
+            value = getattr(value, 'fingerprint', value)
+            # numpy 标量统一转换为Python数值，保证相同参数得到相同的键
+            result[name] = value.item() if isinstance(value, np.generic) else value
+        return result
+
+    def key_for(self, cls, data, params, fingerprint=None):
+        """
+        计算结果的缓存键
+        :param fingerprint: 可选的预先计算好的价格数据哈希，同一数据多次查询时避免重复计算
+        """
+        payload = json.dumps({
+            'format': STORE_FORMAT_VERSION,
+            'strategy': cls.__name__,
+            'engine': cls.ENGINE_VERSION,
+            'data': fingerprint or data_fingerprint(data),
+            'params': self.result_params(cls, params),
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _object_path(self, key):
+        return os.path.join('objects', key[:2], f"{key}.npy")
+
+    def get(self, key):
+        """读取事件日志，不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT path FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            full_path = os.path.join(self.root, row[0])
+            try:
+                with phase('result_store.read'):
+                    events = np.load(full_path, allow_pickle=False)
+            except (OSError, ValueError) as e:
+                print(f"读取回测结果失败：{str(e)}")
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            if events.dtype != EVENT_DTYPE:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        return events
+
+    def put(self, key, cls, params, events):
+        """保存事件日志（先写临时文件再原子替换），并在超过大小上限时淘汰旧结果"""
+        relative_path = self._object_path(key)
+        full_path = os.path.join(self.root, relative_path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with phase('result_store.write'):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(full_path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(events, dtype=EVENT_DTYPE), allow_pickle=False)
+                os.replace(tmp_path, full_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, strategy, engine_version, params, path, size, created, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (key, cls.__name__, cls.ENGINE_VERSION, json.dumps(self.result_params(cls, params), sort_keys=True),
+                 relative_path, os.path.getsize(full_path), now, now)
+            )
+        self.evict()
+
+    def run(self, cls, data, fingerprint=None, **params):
+        """
+        运行策略，结果已存在时直接从存储恢复
+        :param cls: SwingTrader 或 OptionTrader
+        :param params: 策略参数，与策略类的构造参数相同
+        :return: 策略对象
+        """
+        key = self.key_for(cls, data, params, fingerprint)
+        events = self.get(key)
+        if events is not None:
+            return cls(data, events=events, **params)
+        trader = cls(data, **params)
+        try:
+            self.put(key, cls, params, trader.events)
+        except Exception as e:
+            print(f"保存回测结果失败：{str(e)}")
+        return trader
+
+    def evict(self):
+        """总大小超过上限时，按最近访问时间从旧到新删除结果"""
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            removed = 0
+            for key, path, size in conn.execute("SELECT key, path, size FROM results ORDER BY last_access").fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._remove_file(path)
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+        return removed
+
+    def purge_stale(self, classes):
+        """删除引擎版本与当前策略类不一致的结果"""
+        removed = 0
+        with self._connect() as conn:
+            for cls in classes:
+                rows = conn.execute(
+                    "SELECT key, path FROM results WHERE strategy = ? AND engine_version != ?",
+                    (cls.__name__, cls.ENGINE_VERSION)
+                ).fetchall()
+                for key, path in rows:
+                    self._remove_file(path)
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                    removed += 1
+        return removed
+
+    def _remove_file(self, relative_path):
+        try:
+            os.remove(os.path.join(self.root, relative_path))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"删除回测结果文件失败：{str(e)}")
+
+    def stats(self):
+        """存储统计：结果数量、总大小和累计命中次数"""
+        with self._connect() as conn:
+            count, size, hits = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM results"
+            ).fetchone()
+        return {'count': count, 'bytes': size, 'hits': hits}
@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-import alpha_vantage_api as av
 import matplotlib.pyplot as plt
 from datetime import datetime, timedelta
 
@@ -10,6 +9,7 @@ ALPHA_VANTAGE_API_KEY = "7H89Q1YFCR6FW9IB"
 # 导入策略类
 from swing_strategy import SwingTrader
 from option_strategy import OptionTrader
+from replay_provider import api_from_env
 
 print("========== 苹果股票波段策略与期权策略对比分析 ==========")
 
@@ -47,7 +47,7 @@ try:
     
     # 获取股票数据
     print(f"正在获取{symbol}股票数据...")
-    api = av.AlphaVantageAPI(api_key=ALPHA_VANTAGE_API_KEY)
+    api = api_from_env(ALPHA_VANTAGE_API_KEY)
     stock_data = api.get_stock_data(symbol, start_date_str, adjusted_end_date_str)
     
     if stock_data.empty:
@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+import threading
+import weakref
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from profiler import phase
+from result_store import data_fingerprint
+
+_META_FILE = 'meta.json'
+_INDEX_FILE = 'index.npy'
+
+
+def _safe_name(key):
+    return re.sub(r'[^0-9A-Za-z_.-]', '_', key)
+
+
+def write_frame(data, directory):
+    """
+    把价格数据写入目录：每种数据类型的列保存为一个二维 .npy 文件，日期索引单独保存
+    先写入临时目录再重命名，其他进程不会看到写了一半的目录；目录已存在（其他进程已写入）时直接使用
+    """
+    parent = os.path.dirname(directory) or '.'
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        groups = OrderedDict()
+        for column in data.columns:
+            groups.setdefault(data[column].dtype.str, []).append(column)
+        blocks = []
+        for i, (dtype, columns) in enumerate(groups.items()):
+            np.save(os.path.join(tmp_dir, f'block{i}.npy'),
+                    np.ascontiguousarray(data[columns].to_numpy(dtype=dtype)), allow_pickle=False)
+            blocks.append(columns)
+        index = pd.DatetimeIndex(data.index)
+        np.save(os.path.join(tmp_dir, _INDEX_FILE), index.asi8, allow_pickle=False)
+        meta = {'blocks': blocks, 'columns': list(data.columns), 'index_name': index.name,
+                'tz': str(index.tz) if index.tz is not None else None, 'freq': index.freqstr}
+        with open(os.path.join(tmp_dir, _META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # 其他进程已经写入了同一版本
+            if not os.path.exists(os.path.join(directory, _META_FILE)):
+                raise
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return directory
+
+
+def open_frame(directory):
+    """
+    以只读内存映射方式打开 write_frame 写入的价格数据
+    返回的DataFrame直接引用映射的数组（同类型的列为一个数据块，不会被合并复制），任何写入都会报错
+    """
+    with open(os.path.join(directory, _META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    index = pd.DatetimeIndex(np.load(os.path.join(directory, _INDEX_FILE), mmap_mode='r').view('datetime64[ns]'),
+                             name=meta['index_name'])
+    if meta['tz']:
+        index = index.tz_localize('UTC').tz_convert(meta['tz'])
+    if meta['freq']:
+        index.freq = meta['freq']
+    frames = [pd.DataFrame(np.load(os.path.join(directory, f'block{i}.npy'), mmap_mode='r'),
+                           index=index, columns=columns, copy=False)
+              for i, columns in enumerate(meta['blocks'])]
+    if not frames:
+        return pd.DataFrame(index=index)
+    return frames[0] if len(frames) == 1 else pd.concat(frames, axis=1, copy=False)
+
+
+class _SharedEntry:
+    """注册表中的一份数据：内存映射的DataFrame、引用计数和所在目录"""
+    __slots__ = ('key', 'data', 'directory', 'nbytes', 'refs', 'loaded_at', 'retired')
+
+    def __init__(self, key, data, directory, nbytes):
+        self.key = key
+        self.data = data
+        self.directory = directory
+        self.nbytes = nbytes
+        self.refs = 0
+        self.loaded_at = time.time()
+        self.retired = False
+
+
+class PriceLease:
+    """
+    对共享价格数据的一次引用
+    持有期间数据不会被淘汰；调用 release()、退出 with 块或对象被回收时释放引用
+    """
+
+    def __init__(self, registry, entry):
+        self.key = entry.key
+        self.data = entry.data
+        self._finalizer = weakref.finalize(self, registry._release, entry)
+
+    def release(self):
+        self._finalizer()
+
+    @property
+    def released(self):
+        return not self._finalizer.alive
+
+    def __enter__(self):
+        return self.data
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class SharedPriceRegistry:
+    """
+    进程级的只读价格数据注册表
+    同一键的价格数据在进程内只保留一份：写入磁盘后以只读内存映射方式打开，
+    所有会话和策略引擎直接引用同一组数组（数据页由操作系统页缓存提供，多个工作进程之间也共享）。
+    每份数据有引用计数，只有没有会话引用的数据才会在总大小超过上限时按LRU淘汰；
+    超过 max_age 的数据在下次请求时重新加载，仍被引用的旧版本在最后一个引用释放后删除。
+    """
+
+    def __init__(self, directory='cache/shared', max_bytes=200 * 1024 * 1024, max_age=3600):
+        """
+        :param directory: 内存映射文件目录
+        :param max_bytes: 未被引用的数据的总大小上限（字节），被引用的数据不计入淘汰
+        :param max_age: 数据重新加载前的有效期（秒）
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self._counters = {'hits': 0, 'loads': 0, 'reopened': 0, 'evictions': 0, 'reloads': 0}
+
+    def key_for(self, symbol, start_date, end_date, timeframe='D'):
+        return f"{symbol}_{start_date}_{end_date}_{timeframe}"
+
+    def _pointer_path(self, key):
+        return os.path.join(self.directory, f"{_safe_name(key)}.json")
+
+    def _fresh(self, entry):
+        return not entry.retired and time.time() - entry.loaded_at < self.max_age
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._fresh(entry):
+                self._entries.move_to_end(key)
+                entry.refs += 1
+                self._counters['hits'] += 1
+                return entry
+        return None
+
+    def acquire(self, key, load):
+        """
+        获取共享价格数据的引用，未注册或已过期时调用 load() 加载
+        同一键的并发请求只加载一次
+        :param load: 无参函数，返回价格DataFrame，返回None或空数据时不注册
+        :return: PriceLease，load() 没有返回有效数据时为None
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            return PriceLease(self, entry)
+
+        with self._lock:
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        with key_lock:
+            # 等待锁期间其他线程可能已经加载
+            entry = self._lookup(key)
+            if entry is None:
+                entry = self._load(key, load)
+        return PriceLease(self, entry) if entry is not None else None
+
+    def _reopen(self, key):
+        """其他进程（或本进程之前）写入的未过期版本直接映射，不需要重新加载"""
+        try:
+            with open(self._pointer_path(key), 'r', encoding='utf-8') as f:
+                pointer = json.load(f)
+            if time.time() - pointer['written'] >= self.max_age:
+                return None
+            directory = os.path.join(self.directory, pointer['version'])
+            return directory, open_frame(directory), pointer['written']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _load(self, key, load):
+        reopened = self._reopen(key)
+        if reopened is not None:
+            directory, data, written = reopened
+            counter = 'reopened'
+        else:
+            with phase('shared.load', key=key):
+                source = load()
+            if source is None or len(source) == 0:
+                return None
+            with phase('shared.write', key=key, rows=len(source)):
+                version = f"{_safe_name(key)}.{data_fingerprint(source)[:16]}"
+                directory = os.path.join(self.directory, version)
+                if not os.path.exists(os.path.join(directory, _META_FILE)):
+                    write_frame(source, directory)
+                written = time.time()
+                pointer_path = self._pointer_path(key)
+                with open(pointer_path + f'.{os.getpid()}.tmp', 'w', encoding='utf-8') as f:
+                    json.dump({'version': version, 'written': written}, f)
+                os.replace(pointer_path + f'.{os.getpid()}.tmp', pointer_path)
+                data = open_frame(directory)
+            counter = 'loads'
+        nbytes = int(data.memory_usage(index=True).sum())
+        entry = _SharedEntry(key, data, directory, nbytes)
+        entry.loaded_at = written
+        entry.refs = 1
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            # 先登记新版本再退役旧版本：数据未变时两者是同一目录，不能删除
+            self._entries[key] = entry
+            if previous is not None:
+                self._counters['reloads'] += 1
+                self._retire(previous)
+            self._counters[counter] += 1
+            self._evict_locked()
+        return entry
+
+    def _retire(self, entry):
+        """从注册表中移除；仍被引用时等最后一个引用释放后再删除文件"""
+        entry.retired = True
+        if entry.refs == 0:
+            self._remove_files(entry)
+
+    def _remove_files(self, entry):
+        current = self._entries.get(entry.key)
+        if current is not None and current.directory == entry.directory:
+            return
+        entry.data = None
+        # 其他进程可能仍在映射该目录，POSIX系统上删除不影响已有映射，Windows上删除失败时保留
+        shutil.rmtree(entry.directory, ignore_errors=True)
+
+    def _release(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.refs == 0 and entry.retired:
+                self._remove_files(entry)
+            else:
+                self._evict_locked()
+
+    def _evict_locked(self):
+        idle = sum(entry.nbytes for entry in self._entries.values() if entry.refs == 0)
+        for key in list(self._entries):
+            if idle <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.refs == 0:
+                del self._entries[key]
+                idle -= entry.nbytes
+                self._counters['evictions'] += 1
+                # 淘汰只解除本进程的映射，文件保留给其他进程和之后的请求重新映射
+                entry.retired = True
+                entry.data = None
+
+    def clear(self):
+        """移除所有未被引用的数据并删除其文件"""
+        with self._lock:
+            for key in list(self._entries):
+                entry = self._entries[key]
+                if entry.refs == 0:
+                    del self._entries[key]
+                    entry.retired = True
+                    self._remove_files(entry)
+
+    def stats(self):
+        """注册的数据份数、引用数、映射的总字节数和各计数器"""
+        with self._lock:
+            entries = list(self._entries.values())
+            result = dict(self._counters)
+        result['entries'] = len(entries)
+        result['refs'] = sum(entry.refs for entry in entries)
+        result['bytes'] = sum(entry.nbytes for entry in entries)
+        result['max_bytes'] = self.max_bytes
+        return result
+
+
+def main():
+    import pickle
+    import tracemalloc
+    import tempfile
+
+    parser = argparse.ArgumentParser(description='共享价格数据与逐会话复制的内存对比（使用模拟数据）')
+    parser.add_argument('--sessions', type=int, default=50, help='并发会话数')
+    parser.add_argument('--symbols', type=int, default=3, help='会话分析的股票数')
+    parser.add_argument('--dates', type=int, default=2520, help='交易日数')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    index = pd.date_range('2014-01-02', periods=args.dates, freq='D')
+    datasets = {}
+    for i in range(args.symbols):
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, args.dates)))
+        datasets[f'SYM{i}'] = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close,
+                                            'Volume': rng.integers(1e5, 1e7, args.dates)}, index=index)
+    payloads = {symbol: pickle.dumps(data) for symbol, data in datasets.items()}
+
+    # 逐会话复制：与 st.cache_data 每次返回反序列化的副本相同
+    tracemalloc.start()
+    copies = [pickle.loads(payloads[f'SYM{i % args.symbols}']) for i in range(args.sessions)]
+    copied = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del copies
+
+    with tempfile.TemporaryDirectory() as directory:
+        registry = SharedPriceRegistry(directory)
+        tracemalloc.start()
+        leases = [registry.acquire(f'SYM{i % args.symbols}', lambda i=i: pickle.loads(payloads[f'SYM{i % args.symbols}']))
+                  for i in range(args.sessions)]
+        shared = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        stats = registry.stats()
+        print(f"{args.sessions} 个会话、{args.symbols} 个股票：")
+        print(f"- 逐会话复制：堆内存 {copied / 1024 / 1024:.2f} MB")
+        print(f"- 共享注册表：堆内存 {shared / 1024 / 1024:.2f} MB，内存映射 {stats['bytes'] / 1024 / 1024:.2f} MB"
+              f"（{stats['entries']} 份，{stats['refs']} 个引用）")
+        for lease in leases:
+            lease.release()
+        print(f"释放后：{registry.stats()}")
+
+
+if __name__ == "__main__":
+    main()
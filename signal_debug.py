@@ -1,67 +1,35 @@
-import yfinance as yf
+import argparse
 import pandas as pd
-import numpy as np
-from datetime import datetime
-
-# 获取AAPL数据
-data = yf.download("AAPL", start="2023-01-01", end="2023-12-31")
-
-# 手动打印数据分析
+from signal_diagnostics import SignalDiagnostics, load_close
+
+parser = argparse.ArgumentParser(description='按月检查收盘价相对参考价格的变化，以及从各月初开始的下一次信号')
+parser.add_argument('--symbol', default='AAPL')
+parser.add_argument('--start', default='2023-01-01')
+parser.add_argument('--end', default='2023-12-31')
+parser.add_argument('--reference', type=float, default=142.31, help='参考价格，默认为2023-01-26的收盘价')
+parser.add_argument('--threshold', type=float, default=0.1)
+args = parser.parse_args()
+
+# 读取缓存的价格数据（缺失时才通过数据源获取）
+data = load_close(args.symbol, args.start, args.end)
+diagnostics = SignalDiagnostics.from_frame(data)
 print(f"获取了{len(data)}个交易日的数据")
 print(f"开始日期: {data.index[0].strftime('%Y-%m-%d')}")
 print(f"结束日期: {data.index[-1].strftime('%Y-%m-%d')}")
 
-# 关键价格
-ref_price = 142.31  # 2023-01-26的收盘价
-sell_threshold = ref_price * 1.1
-buy_threshold = ref_price * 0.9
-
+ref_price = args.reference
 print(f"\n参考价格: ${ref_price}")
-print(f"卖出阈值 (10%上涨): ${sell_threshold:.2f}")
-
-# 找出超过阈值的日期
-above_threshold = []
-for i in range(len(data)):
-    date = data.index[i]
-    close = float(data['Close'].iloc[i])  # 转换为float
-    if close > sell_threshold:
-        above_threshold.append((date, close))
-
-print(f"\n收盘价超过卖出阈值的天数: {len(above_threshold)}")
-
-if above_threshold:
-    first_date, first_price = above_threshold[0]
-    print(f"首次超过阈值日期: {first_date.strftime('%Y-%m-%d')}")
-    print(f"首次超过阈值收盘价: ${first_price:.2f}")
-    print(f"相对于参考价格涨幅: {(first_price - ref_price) / ref_price * 100:.2f}%")
-    
-    # 检查前10个超过阈值的日期
-    print("\n前10个超过阈值的日期:")
-    for i, (date, price) in enumerate(above_threshold[:10]):
-        change = (price - ref_price) / ref_price * 100
-        print(f"{date.strftime('%Y-%m-%d')}: ${price:.2f} ({change:.2f}%)")
-        
-# 检查特定日期的价格
-specific_dates = [
-    datetime(2023, 2, 1),
-    datetime(2023, 3, 1),
-    datetime(2023, 4, 3),
-    datetime(2023, 5, 1),
-    datetime(2023, 6, 1),
-    datetime(2023, 7, 3),
-    datetime(2023, 8, 1),
-    datetime(2023, 9, 1),
-    datetime(2023, 10, 2),
-    datetime(2023, 11, 1),
-    datetime(2023, 12, 1)
-]
-
-print("\n各月价格检查:")
-for date in specific_dates:
-    closest_idx = data.index.searchsorted(date)
-    if closest_idx < len(data):
-        closest_date = data.index[closest_idx]
-        price = float(data['Close'].iloc[closest_idx])  # 转换为float
-        change = (price - ref_price) / ref_price * 100
-        status = "✓" if price > sell_threshold else "✗"
-        print(f"{closest_date.strftime('%Y-%m-%d')}: ${price:.2f} ({change:+.2f}%) {status}") 
\ No newline at end of file
+print(f"卖出阈值 ({args.threshold:.0%}上涨): ${ref_price * (1 + args.threshold):.2f}")
+
+# 各月第一个交易日作为参考日期（查询从参考日期之后开始，因此传入前一天以包含月初当天），一次查询全部月份
+month_starts = data.index[data.index.searchsorted(pd.date_range(data.index[0], data.index[-1], freq='MS'))]
+bars = data.index.get_indexer(month_starts)
+result = diagnostics.what_if(ref_price, month_starts - pd.Timedelta(days=1), args.threshold)
+result.insert(1, '当日收盘价', diagnostics.close[bars])
+result.insert(2, '相对变化(%)', (diagnostics.close[bars] - ref_price) / ref_price * 100)
+result['参考日期'] = month_starts.strftime('%Y-%m-%d')
+result['触发日期'] = result['触发日期'].dt.strftime('%Y-%m-%d')
+
+print("\n各月价格检查（从月初开始的下一次信号）:")
+pd.set_option('display.width', 160)
+print(result.round(2).to_string(index=False))
@@ -0,0 +1,248 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from profiler import phase
+
+
+class SparseTable:
+    """
+    区间最大值（或最小值）的稀疏表
+    levels[k][i] 为 values[i : i + 2^k] 的最大值；建表 O(n log n)，任意区间查询 O(1)，
+    "从某个位置起第一个达到某价格的K线" 用倍增查找，O(log n)。
+    """
+
+    def __init__(self, values, op='max'):
+        """
+        :param values: 一维数组
+        :param op: 'max' 或 'min'
+        """
+        if op not in ('max', 'min'):
+            raise ValueError(f"不支持的运算：{op}")
+        self.op = op
+        self._combine = np.maximum if op == 'max' else np.minimum
+        level = np.asarray(values, dtype=np.float64)
+        self.n = len(level)
+        self.levels = [level]
+        width = 1
+        while width * 2 <= self.n:
+            level = self._combine(level[:-width], level[width:])
+            self.levels.append(level)
+            width *= 2
+
+    def query(self, lo, hi):
+        """区间 [lo, hi) 的最大（最小）值，lo、hi 可以是数组，空区间返回 -inf（+inf）"""
+        scalar = np.ndim(lo) == 0 and np.ndim(hi) == 0
+        lo, hi = np.broadcast_arrays(np.atleast_1d(np.asarray(lo, dtype=np.int64)),
+                                     np.atleast_1d(np.asarray(hi, dtype=np.int64)))
+        length = hi - lo
+        valid = length > 0
+        k = np.zeros(lo.shape, dtype=np.int64)
+        k[valid] = np.floor(np.log2(length[valid])).astype(np.int64)
+        result = np.full(lo.shape, -np.inf if self.op == 'max' else np.inf)
+        # 两个长度为 2^k 的区间覆盖 [lo, hi)
+        for level in np.unique(k[valid]).tolist():
+            mask = valid & (k == level)
+            result[mask] = self._combine(self.levels[level][lo[mask]], self.levels[level][hi[mask] - (1 << level)])
+        return float(result[0]) if scalar else result
+
+    def first_reaching(self, start, level):
+        """
+        从 start 起第一个值达到 level（最大值表为 >= level，最小值表为 <= level）的位置，没有时为 -1
+        倍增查找：从最高层开始，整段都未达到时跳过这一段
+        """
+        pos = np.array(start, dtype=np.int64, copy=True)
+        level = np.asarray(level, dtype=np.float64)
+        reached = (lambda values: values >= level) if self.op == 'max' else (lambda values: values <= level)
+        for k in range(len(self.levels) - 1, -1, -1):
+            width = 1 << k
+            can_jump = pos + width <= self.n
+            safe = np.where(can_jump, pos, 0)
+            jump = can_jump & ~reached(self.levels[k][safe])
+            pos = np.where(jump, pos + width, pos)
+        return np.where(pos < self.n, pos, -1)
+
+
+def trigger_prices(reference, threshold):
+    """
+    卖出和买入触发价：与 signal_engine.threshold_crossings 的比较方式完全一致，
+    (price - reference) / reference >= threshold 当且仅当 price >= 卖出触发价，
+    (price - reference) / reference <= -threshold 当且仅当 price <= 买入触发价
+    （该比较对价格单调，先按公式估算，再逐个浮点数调整到边界）
+    :return: (卖出触发价, 买入触发价)
+    """
+    reference = np.asarray(reference, dtype=np.float64)
+
+    def sells(price):
+        return (price - reference) / reference >= threshold
+
+    def buys(price):
+        return (price - reference) / reference <= -threshold
+
+    upper = reference * (1 + threshold)
+    for _ in range(8):
+        upper = np.where(sells(upper), upper, np.nextafter(upper, np.inf))
+    for _ in range(8):
+        lower_step = np.nextafter(upper, -np.inf)
+        upper = np.where(sells(lower_step), lower_step, upper)
+    lower = reference * (1 - threshold)
+    for _ in range(8):
+        lower = np.where(buys(lower), lower, np.nextafter(lower, -np.inf))
+    for _ in range(8):
+        upper_step = np.nextafter(lower, np.inf)
+        lower = np.where(buys(upper_step), upper_step, lower)
+    return upper, lower
+
+
+class SignalDiagnostics:
+    """
+    阈值穿越的假设查询："以价格 X 作为参考价格、从日期 D 开始，下一次买入/卖出信号在哪天触发？"
+    对收盘价预先建立区间最大值和最小值的稀疏表，每次查询为 O(log n)，
+    数千个 (参考价格, 日期) 查询可以一次向量化完成。
+    """
+
+    def __init__(self, close, index=None):
+        """
+        :param close: 收盘价数组或Series
+        :param index: 日期索引，close 为Series时默认使用其索引
+        """
+        if index is None and isinstance(close, pd.Series):
+            index = close.index
+        self.close = np.asarray(close, dtype=np.float64)
+        self.index = pd.DatetimeIndex(index) if index is not None else None
+        with phase('diagnostics.build', bars=len(self.close)):
+            self.highs = SparseTable(self.close, 'max')
+            self.lows = SparseTable(self.close, 'min')
+
+    @classmethod
+    def from_frame(cls, data, column='Close'):
+        return cls(data[column])
+
+    def bar_after(self, dates):
+        """参考日期之后的第一根K线序号（参考日当天的收盘价不参与判断）"""
+        if self.index is None:
+            raise ValueError("按日期查询需要提供日期索引")
+        return self.index.searchsorted(pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(dates))), side='right')
+
+    def next_trigger(self, references, starts, threshold):
+        """
+        从 starts 开始（含）第一根触发信号的K线
+        :param references: 参考价格（标量或数组）
+        :param starts: 开始检查的K线序号（标量或数组）
+        :param threshold: 价格变化阈值
+        :return: (K线序号, 方向)，方向 -1 为卖出，1 为买入；没有触发时K线序号为 -1、方向为 0
+        """
+        references, starts = np.broadcast_arrays(np.asarray(references, dtype=np.float64),
+                                                 np.asarray(starts, dtype=np.int64))
+        sell_price, buy_price = trigger_prices(references, threshold)
+        sell_bar = self.highs.first_reaching(starts, sell_price)
+        buy_bar = self.lows.first_reaching(starts, buy_price)
+        # 同一根K线不可能同时满足两个方向（阈值为正），取较早的一个
+        sell_first = (sell_bar >= 0) & ((buy_bar < 0) | (sell_bar < buy_bar))
+        bars = np.where(sell_first, sell_bar, buy_bar)
+        directions = np.where(sell_first, -1, np.where(buy_bar >= 0, 1, 0)).astype(np.int8)
+        return bars, directions
+
+    def what_if(self, references, dates, threshold):
+        """
+        按 (参考价格, 参考日期) 批量查询下一次信号
+        :return: DataFrame，每个查询一行：参考日期、参考价格、买入/卖出触发价、触发日期、方向、触发价格、间隔天数
+        """
+        references = np.atleast_1d(np.asarray(references, dtype=np.float64))
+        dates = pd.DatetimeIndex(np.atleast_1d(pd.to_datetime(dates)))
+        references, starts = np.broadcast_arrays(references, self.bar_after(dates))
+        with phase('diagnostics.what_if', queries=len(references)):
+            bars, directions = self.next_trigger(references, starts, threshold)
+        sell_price, buy_price = trigger_prices(references, threshold)
+        found = bars >= 0
+        safe = np.where(found, bars, 0)
+        trigger_dates = pd.DatetimeIndex(np.where(found, self.index.values[safe], np.datetime64('NaT')))
+        reference_dates = dates if len(dates) == len(references) else dates.repeat(len(references))
+        return pd.DataFrame({
+            '参考日期': reference_dates,
+            '参考价格': references,
+            '买入触发价': buy_price,
+            '卖出触发价': sell_price,
+            '触发日期': trigger_dates,
+            '方向': np.where(directions == -1, '卖出', np.where(directions == 1, '买入', '')),
+            '触发价格': np.where(found, self.close[safe], np.nan),
+            '间隔天数': (trigger_dates - reference_dates).days,
+        })
+
+    def signal_path(self, threshold, start=0, reference=None):
+        """
+        从 start 开始按策略规则连续触发的信号（每次信号后以触发价作为新的参考价格），
+        与 threshold_crossings 的结果完全一致，每个信号 O(log n)
+        :return: (信号K线序号数组, 信号方向数组)
+        """
+        bars = []
+        directions = []
+        if len(self.close) == 0:
+            return np.array(bars, dtype=np.int64), np.array(directions, dtype=np.int8)
+        reference = float(self.close[start]) if reference is None else reference
+        position = start + 1
+        while position < len(self.close):
+            bar, direction = self.next_trigger(reference, position, threshold)
+            bar = int(bar)
+            if bar < 0:
+                break
+            bars.append(bar)
+            directions.append(int(direction))
+            reference = float(self.close[bar])
+            position = bar + 1
+        return np.array(bars, dtype=np.int64), np.array(directions, dtype=np.int8)
+
+    def price_bands(self, reference, threshold, start=0):
+        """从 start 起收盘价落在买入触发价以下、参考价格上下和卖出触发价以上的K线数"""
+        sell_price, buy_price = trigger_prices(reference, threshold)
+        close = self.close[start:]
+        return {
+            f"<= {float(buy_price):.2f}": int(np.count_nonzero(close <= buy_price)),
+            f"{float(buy_price):.2f} - {reference:.2f}": int(np.count_nonzero((close > buy_price) & (close < reference))),
+            f"{reference:.2f} - {float(sell_price):.2f}": int(np.count_nonzero((close >= reference) & (close < sell_price))),
+            f">= {float(sell_price):.2f}": int(np.count_nonzero(close >= sell_price)),
+        }
+
+
+def load_close(symbol, start_date, end_date, cache_dir='cache'):
+    """读取股票数据（优先使用本地缓存，缺失时通过数据源回退链获取并写入缓存）"""
+    from data_providers import cached_loader_from_env
+
+    return cached_loader_from_env(cache_dir)(symbol, start_date, end_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='阈值穿越诊断：查询从指定参考价格和日期开始的下一次买入/卖出信号')
+    parser.add_argument('--symbol', default='AAPL')
+    parser.add_argument('--start', default='2023-01-01', help='数据开始日期')
+    parser.add_argument('--end', default='2023-12-31', help='数据结束日期')
+    parser.add_argument('--reference', type=float, action='append', help='参考价格（可多次指定）')
+    parser.add_argument('--date', action='append', help='参考日期（可多次指定，与参考价格一一对应）')
+    parser.add_argument('--threshold', type=float, default=0.1, help='价格变化阈值')
+    parser.add_argument('--benchmark', type=int, default=0, help='额外运行指定数量的随机查询并报告耗时')
+    args = parser.parse_args()
+
+    data = load_close(args.symbol, args.start, args.end)
+    if data is None or data.empty:
+        print(f"无法获取 {args.symbol} 的数据")
+        return
+    diagnostics = SignalDiagnostics.from_frame(data)
+    print(f"{args.symbol}：{data.index[0]:%Y-%m-%d} 至 {data.index[-1]:%Y-%m-%d}，共 {len(data)} 个交易日")
+
+    dates = args.date or [data.index[0].strftime('%Y-%m-%d')]
+    references = args.reference or [float(data['Close'].asof(pd.Timestamp(date))) for date in dates]
+    pd.set_option('display.width', 160)
+    print(diagnostics.what_if(references, dates, args.threshold).round(2).to_string(index=False))
+
+    if args.benchmark:
+        rng = np.random.default_rng(0)
+        query_dates = data.index[rng.integers(0, len(data), args.benchmark)]
+        query_references = data['Close'].to_numpy()[rng.integers(0, len(data), args.benchmark)]
+        start = time.perf_counter()
+        diagnostics.what_if(query_references, query_dates, args.threshold)
+        elapsed = time.perf_counter() - start
+        print(f"{args.benchmark} 个假设查询耗时 {elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import numpy as np
+from profiler import profiled
+
+
+@profiled('signals.crossings')
+def threshold_crossings(close, threshold, scalar_window=32):
+    """
+    计算价格相对参考价格的阈值穿越事件（波段策略和期权策略共用的信号规则）
+    上涨超过阈值产生 -1（卖出/卖出看涨期权），下跌超过阈值产生 1（买入/卖出看跌期权），
+    每次产生信号后以当日价格作为新的参考价格。
+    每个信号之后先逐日检查紧邻的几根K线（信号密集时更快），未找到再用加倍的窗口向量化查找。
+    比较方式与逐日循环完全一致，结果也完全一致。
+    :param close: 收盘价数组
+    :param threshold: 触发信号的价格变化阈值
+    :param scalar_window: 逐日检查的K线数量，也是向量化查找的初始窗口长度
+    :return: (信号K线序号数组 int64, 信号方向数组 int8)
+    """
+    close = np.asarray(close, dtype=np.float64)
+    prices = close.tolist()
+    n = len(prices)
+    bars = []
+    directions = []
+    if n == 0:
+        return np.array(bars, dtype=np.int64), np.array(directions, dtype=np.int8)
+
+    reference_price = prices[0]
+    start = 1
+    while start < n:
+        hit = -1
+        direction = 0
+        stop = min(start + scalar_window, n)
+        for i in range(start, stop):
+            price_change = (prices[i] - reference_price) / reference_price
+            if price_change >= threshold:
+                hit, direction = i, -1
+                break
+            elif price_change <= -threshold:
+                hit, direction = i, 1
+                break
+
+        chunk = scalar_window * 2
+        while hit < 0 and stop < n:
+            window_start, stop = stop, min(stop + chunk, n)
+            price_change = (close[window_start:stop] - reference_price) / reference_price
+            found = np.flatnonzero((price_change >= threshold) | (price_change <= -threshold))
+            if len(found):
+                hit = window_start + int(found[0])
+                direction = -1 if price_change[found[0]] >= threshold else 1
+            chunk *= 2
+
+        if hit < 0:
+            break
+        bars.append(hit)
+        directions.append(direction)
+        reference_price = prices[hit]
+        start = hit + 1
+
+    return np.array(bars, dtype=np.int64), np.array(directions, dtype=np.int8)
+
+
+class RaggedSignals:
+    """
+    多个阈值的信号结果（阈值 × 信号）的不等长结构
+    按阈值顺序把各阈值的信号首尾相连存放，offsets[k]:offsets[k+1] 为第k个阈值的信号
+    """
+
+    def __init__(self, thresholds, offsets, bars, directions):
+        self.thresholds = thresholds
+        self.offsets = offsets
+        self.bars = bars
+        self.directions = directions
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def __getitem__(self, k):
+        """第k个阈值的 (信号K线序号, 信号方向)，可直接传给策略类的 signals 参数"""
+        start, stop = self.offsets[k], self.offsets[k + 1]
+        return self.bars[start:stop], self.directions[start:stop]
+
+    def counts(self):
+        """每个阈值的信号数量"""
+        return np.diff(self.offsets)
+
+
+@profiled('signals.multi_threshold')
+def multi_threshold_crossings(close, thresholds, block=64):
+    """
+    一次扫描价格数组，同时计算多个阈值的穿越事件
+    每个阈值各自维护参考价格，按K线分块，每块用一次 (阈值 × K线) 的矩阵运算同时推进所有阈值；
+    块内只有产生了信号的阈值需要从信号之后继续检查。
+    每个阈值的结果与 threshold_crossings 完全一致。
+    :param close: 收盘价数组
+    :param thresholds: 阈值数组
+    :param block: 每块的K线数量
+    :return: RaggedSignals
+    """
+    close = np.asarray(close, dtype=np.float64)
+    thresholds = np.asarray(thresholds, dtype=np.float64).ravel()
+    n = len(close)
+    k = len(thresholds)
+    found_thresholds, found_bars, found_directions = [], [], []
+
+    if n > 0 and k > 0:
+        reference_prices = np.full(k, close[0])
+        next_column = np.zeros(k, dtype=np.int64)
+        for start in range(1, n, block):
+            window = close[start:start + block]
+            columns = np.arange(len(window))
+            next_column[:] = 0
+            active = np.arange(k)
+            while len(active):
+                reference = reference_prices[active][:, None]
+                limit = thresholds[active][:, None]
+                price_change = (window[None, :] - reference) / reference
+                hit = ((price_change >= limit) | (price_change <= -limit)) & (columns[None, :] >= next_column[active][:, None])
+                has_hit = hit.any(axis=1)
+                if not has_hit.any():
+                    break
+                rows = np.flatnonzero(has_hit)
+                active = active[rows]
+                first = hit[rows].argmax(axis=1)
+                directions = np.where(price_change[rows, first] >= thresholds[active], -1, 1)
+
+                found_thresholds.append(active)
+                found_bars.append(start + first)
+                found_directions.append(directions)
+                reference_prices[active] = window[first]
+                next_column[active] = first + 1
+
+    if found_thresholds:
+        threshold_index = np.concatenate(found_thresholds)
+        bars = np.concatenate(found_bars).astype(np.int64)
+        directions = np.concatenate(found_directions).astype(np.int8)
+        order = np.lexsort((bars, threshold_index))
+        threshold_index, bars, directions = threshold_index[order], bars[order], directions[order]
+    else:
+        threshold_index = np.zeros(0, dtype=np.int64)
+        bars = np.zeros(0, dtype=np.int64)
+        directions = np.zeros(0, dtype=np.int8)
+
+    offsets = np.zeros(k + 1, dtype=np.int64)
+    np.cumsum(np.bincount(threshold_index, minlength=k), out=offsets[1:])
+    return RaggedSignals(thresholds, offsets, bars, directions)
+
+
+def buy_and_hold(close, initial_shares=1000, initial_cash=100000.0):
+    """
+    买入持有基准
+    :return: 字典，final_value 为期末总资产，return_pct 为期间价格收益率(%)
+    """
+    first_price = float(close[0])
+    last_price = float(close[-1])
+    return {
+        'final_value': initial_shares * last_price + initial_cash,
+        'return_pct': (last_price / first_price - 1) * 100,
+    }
@@ -0,0 +1,189 @@
+import threading
+from collections import OrderedDict
+import pandas as pd
+from profiler import phase
+from memory_utils import readonly_array
+from signal_engine import threshold_crossings, buy_and_hold
+from result_store import data_fingerprint
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from performance_metrics import trader_metrics
+
+
+class Stage:
+    """流水线中的一个阶段：由上游阶段的输出和自身的参数计算输出"""
+
+    def __init__(self, name, func, params=(), upstream=()):
+        """
+        :param name: 阶段名称
+        :param func: 计算函数，以关键字参数接收上游阶段的输出（按阶段名）和参数（按参数名）
+        :param params: 使用的输入参数名
+        :param upstream: 依赖的上游阶段名
+        """
+        self.name = name
+        self.func = func
+        self.params = tuple(params)
+        self.upstream = tuple(upstream)
+
+
+def input_key(value):
+    """输入参数的缓存键：可哈希的值直接使用，DataFrame 使用内容哈希"""
+    if isinstance(value, pd.DataFrame):
+        return ('frame', data_fingerprint(value))
+    try:
+        hash(value)
+    except TypeError:
+        raise TypeError(f"无法作为缓存键的输入参数类型：{type(value).__name__}")
+    return value
+
+
+class StagePipeline:
+    """
+    分阶段记忆化的计算流水线
+    每个阶段的缓存键只由它自己的参数和上游阶段的缓存键组成（不包含无关的参数），
+    因此参数变化时只有依赖该参数的阶段及其下游需要重新计算，其余阶段直接复用上次的输出。
+    每个阶段按LRU保留最近 max_entries 个输出；同一实例可以被多个线程（会话）共用。
+    """
+
+    def __init__(self, max_entries=32):
+        """
+        :param max_entries: 每个阶段保留的输出数量
+        """
+        self.max_entries = max_entries
+        self.stages = OrderedDict()
+        self._cache = {}
+        self._lock = threading.RLock()
+        self.counters = {}
+
+    def add(self, name, func, params=(), upstream=()):
+        """添加一个阶段，上游阶段必须已经添加"""
+        for dependency in upstream:
+            if dependency not in self.stages:
+                raise ValueError(f"阶段 {name} 依赖的阶段 {dependency} 不存在")
+        self.stages[name] = Stage(name, func, params, upstream)
+        self._cache[name] = OrderedDict()
+        self.counters[name] = {'computed': 0, 'reused': 0}
+        return self
+
+    def _key(self, stage, keys, stage_keys):
+        return (tuple(keys[param] for param in stage.params),
+                tuple(stage_keys[dependency] for dependency in stage.upstream))
+
+    def run(self, targets, computed=None, **inputs):
+        """
+        计算目标阶段（及其依赖的阶段），未变化的阶段复用缓存
+        :param targets: 阶段名，或阶段名列表
+        :param computed: 可选的列表，追加本次实际计算（未复用缓存）的阶段名；
+                         实例被多个会话共用，因此不保存在实例上
+        :param inputs: 输入参数
+        :return: 单个阶段名时返回其输出，列表时返回 {阶段名: 输出}
+        """
+        single = isinstance(targets, str)
+        names = [targets] if single else list(targets)
+        keys = {}
+        stage_keys = {}
+        outputs = {}
+        if computed is None:
+            computed = []
+
+        def resolve(name):
+            if name in outputs:
+                return outputs[name]
+            stage = self.stages[name]
+            for dependency in stage.upstream:
+                resolve(dependency)
+            for param in stage.params:
+                if param not in keys:
+                    if param not in inputs:
+                        raise KeyError(f"阶段 {name} 缺少输入参数 {param}")
+                    keys[param] = input_key(inputs[param])
+            key = self._key(stage, keys, stage_keys)
+            stage_keys[name] = (name, key)
+            cache = self._cache[name]
+            with self._lock:
+                hit = key in cache
+                if hit:
+                    cache.move_to_end(key)
+                    output = cache[key]
+                    self.counters[name]['reused'] += 1
+            if not hit:
+                kwargs = {dependency: outputs[dependency] for dependency in stage.upstream}
+                kwargs.update({param: inputs[param] for param in stage.params})
+                with phase(f'stage.{name}'):
+                    output = stage.func(**kwargs)
+                with self._lock:
+                    cache[key] = output
+                    while len(cache) > self.max_entries:
+                        cache.popitem(last=False)
+                    self.counters[name]['computed'] += 1
+                computed.append(name)
+            outputs[name] = output
+            return output
+
+        for name in names:
+            resolve(name)
+        return outputs[names[0]] if single else {name: outputs[name] for name in names}
+
+    def clear(self):
+        with self._lock:
+            for cache in self._cache.values():
+                cache.clear()
+
+
+def _stored_trader(store, cls, data, params, lean, build):
+    """结果存储中已有时直接恢复，否则由 build() 计算并保存"""
+    if store is None:
+        return build()
+    key = store.key_for(cls, data, params)
+    events = store.get(key)
+    if events is not None:
+        return cls(data, lean=lean, events=events, **params)
+    trader = build()
+    try:
+        store.put(key, cls, params, trader.events)
+    except Exception as e:
+        print(f"保存回测结果失败：{str(e)}")
+    return trader
+
+
+def backtest_pipeline(store=None, max_entries=32):
+    """
+    波段/期权回测的阶段划分：
+    data → close → signals（threshold）→ 账本（trade_shares、premium_rate 等）→ 指标
+    修改 premium_rate 只重新计算期权账本和指标；修改 trade_shares 不重新计算信号。
+    账本由策略类使用共享的信号计算，交易规则只在策略类中实现。
+    :param store: 可选的 ResultStore，账本阶段先查询已保存的回测结果
+    :return: StagePipeline，可继续添加图表等下游阶段
+    """
+    pipeline = StagePipeline(max_entries)
+
+    pipeline.add('close', lambda data: readonly_array(data['Close']), params=('data',))
+    pipeline.add('signals', lambda close, threshold: threshold_crossings(close, threshold),
+                 params=('threshold',), upstream=('close',))
+    pipeline.add('benchmark', lambda close, initial_shares: buy_and_hold(close, initial_shares),
+                 params=('initial_shares',), upstream=('close',))
+
+    def swing(signals, data, initial_shares, trade_shares, threshold, lean):
+        params = dict(initial_shares=initial_shares, trade_shares=trade_shares, threshold=threshold)
+        return _stored_trader(store, SwingTrader, data, params, lean,
+                              lambda: SwingTrader(data, lean=lean, signals=signals, **params))
+
+    pipeline.add('swing', swing, params=('data', 'initial_shares', 'trade_shares', 'threshold', 'lean'),
+                 upstream=('signals',))
+
+    def option(signals, data, initial_shares, trade_shares, threshold, premium_rate, lean):
+        params = dict(initial_shares=initial_shares, trade_shares=trade_shares, threshold=threshold,
+                      premium_rate=premium_rate)
+        return _stored_trader(store, OptionTrader, data, params, lean,
+                              lambda: OptionTrader(data, lean=lean, signals=signals, **params))
+
+    pipeline.add('option', option,
+                 params=('data', 'initial_shares', 'trade_shares', 'threshold', 'premium_rate', 'lean'),
+                 upstream=('signals',))
+
+    def metrics(swing, option, close, periods_per_year):
+        return trader_metrics([swing, option], close, names=["波段策略", "期权策略"],
+                              periods_per_year=periods_per_year)
+
+    pipeline.add('metrics', metrics, params=('periods_per_year',), upstream=('swing', 'option', 'close'))
+    return pipeline
@@ -0,0 +1,57 @@
+from profiler import phase
+from memory_utils import readonly_array
+from signal_engine import threshold_crossings, buy_and_hold
+from result_store import data_fingerprint
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+
+
+class StrategyComparison:
+    """
+    两种策略对比的组合评估器
+    两种策略使用相同的收盘价和阈值，穿越事件只计算一次，
+    然后由同一组信号分别驱动波段策略账本和期权账本，买入持有基准也只计算一次。
+    swing / option 的结果与单独运行 SwingTrader / OptionTrader 完全一致。
+    """
+
+    def __init__(self, data, initial_shares=1000, trade_shares=100, threshold=0.1, premium_rate=0.05, lean=False,
+                 store=None):
+        """
+        :param data: DataFrame，包含股票价格数据
+        :param initial_shares: 初始持股数量
+        :param trade_shares: 每次交易的股数
+        :param threshold: 触发信号的价格变化阈值
+        :param premium_rate: 期权费率
+        :param lean: 内存精简模式，参见 SwingTrader / OptionTrader
+        :param store: 可选的 ResultStore，两种策略的结果都已保存时不再计算信号
+        """
+        close = readonly_array(data['Close'])
+        swing_params = dict(initial_shares=initial_shares, trade_shares=trade_shares, threshold=threshold)
+        option_params = dict(swing_params, premium_rate=premium_rate)
+
+        swing_events = option_events = None
+        if store is not None:
+            fingerprint = data_fingerprint(data)
+            swing_key = store.key_for(SwingTrader, data, swing_params, fingerprint)
+            option_key = store.key_for(OptionTrader, data, option_params, fingerprint)
+            swing_events = store.get(swing_key)
+            option_events = store.get(option_key)
+
+        self.signals = None
+        if swing_events is None or option_events is None:
+            with phase('comparison.signals'):
+                self.signals = threshold_crossings(close, threshold)
+
+        self.swing = SwingTrader(data, lean=lean, signals=self.signals, events=swing_events, **swing_params)
+        self.option = OptionTrader(data, lean=lean, signals=self.signals, events=option_events, **option_params)
+
+        if store is not None:
+            try:
+                if swing_events is None:
+                    store.put(swing_key, SwingTrader, swing_params, self.swing.events)
+                if option_events is None:
+                    store.put(option_key, OptionTrader, option_params, self.option.events)
+            except Exception as e:
+                print(f"保存回测结果失败：{str(e)}")
+
+        self.buy_and_hold = buy_and_hold(close, initial_shares, self.swing.initial_cash)
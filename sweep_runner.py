@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import traceback
+import numpy as np
+import pandas as pd
+from threshold_sweep import threshold_sweep
+
+# 工作队列目录结构：
+#   job.json              任务参数
+#   data/<symbol>.pkl     任务创建时保存的价格数据快照（所有工作进程使用相同的数据）
+#   pending/<unit>.json   待处理的工作单元
+#   claimed/<unit>.<worker>.json  已被某个工作进程领取的单元，文件修改时间即心跳
+#   results/<unit>.json   单元结果
+#   failed/<unit>.json    超过最大尝试次数或执行出错的单元
+QUEUE_DIRS = ('data', 'pending', 'claimed', 'results', 'failed')
+
+
+def _write_json_atomic(payload, path):
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _unit_id(name):
+    """claimed 目录中的文件名为 <unit>.<worker>.json（工作进程标识中不含 '.'），取出单元ID"""
+    return name[:-len('.json')].rsplit('.', 1)[0]
+
+
+def create_sweep(queue_dir, datasets, thresholds, chunk_size=10, **params):
+    """
+    创建阈值扫描任务，按股票和阈值分块拆成工作单元
+    :param queue_dir: 共享的队列目录（可以是多台机器挂载的同一目录）
+    :param datasets: {股票代码: 价格DataFrame}，保存为快照供所有工作进程读取
+    :param thresholds: 阈值列表
+    :param chunk_size: 每个工作单元包含的阈值个数
+    :param params: 传给 threshold_sweep 的其他参数（initial_shares、trade_shares、premium_rate）
+    :return: 工作单元数
+    """
+    for name in QUEUE_DIRS:
+        os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+    thresholds = [float(t) for t in thresholds]
+    _write_json_atomic({'thresholds': thresholds, 'chunk_size': chunk_size, 'params': params,
+                        'symbols': sorted(datasets)}, os.path.join(queue_dir, 'job.json'))
+
+    units = 0
+    for symbol in sorted(datasets):
+        datasets[symbol].to_pickle(os.path.join(queue_dir, 'data', f"{symbol}.pkl"))
+        for chunk, start in enumerate(range(0, len(thresholds), chunk_size)):
+            unit_id = f"{symbol}-{chunk:05d}"
+            _write_json_atomic({
+                'unit_id': unit_id,
+                'symbol': symbol,
+                'thresholds': thresholds[start:start + chunk_size],
+                'params': params,
+                'attempts': 0,
+            }, os.path.join(queue_dir, 'pending', f"{unit_id}.json"))
+            units += 1
+    return units
+
+
+def reclaim_stale(queue_dir, stale_after=60.0):
+    """
+    把心跳超时的已领取单元放回待处理队列
+    重命名是原子操作，多个进程同时回收同一单元时只有一个会成功
+    :return: 回收的单元数
+    """
+    claimed_dir = os.path.join(queue_dir, 'claimed')
+    now = time.time()
+    reclaimed = 0
+    for name in os.listdir(claimed_dir):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(claimed_dir, name)
+        try:
+            if now - os.path.getmtime(path) < stale_after:
+                continue
+            unit_id = _unit_id(name)
+            if os.path.exists(os.path.join(queue_dir, 'results', f"{unit_id}.json")):
+                os.remove(path)
+            else:
+                # 先更新修改时间再放回：重命名保留修改时间，否则刚被重新领取的单元会立即再次被判定为超时
+                os.utime(path)
+                os.rename(path, os.path.join(queue_dir, 'pending', f"{unit_id}.json"))
+                print(f"回收超时的工作单元：{unit_id}")
+                reclaimed += 1
+        except FileNotFoundError:
+            continue
+    return reclaimed
+
+
+def _claim(queue_dir, worker_id):
+    """领取一个待处理单元，返回 (单元, 领取文件路径)，没有可领取的单元时返回 (None, None)"""
+    pending_dir = os.path.join(queue_dir, 'pending')
+    for name in sorted(os.listdir(pending_dir)):
+        if not name.endswith('.json'):
+            continue
+        claimed_path = os.path.join(queue_dir, 'claimed', f"{name[:-5]}.{worker_id}.json")
+        try:
+            os.rename(os.path.join(pending_dir, name), claimed_path)
+            # 重命名保留修改时间，等待已久的单元刚领取就会被判定为心跳超时，先刷新为当前时间
+            os.utime(claimed_path)
+        except FileNotFoundError:
+            continue  # 已被其他进程领取
+        try:
+            unit = _read_json(claimed_path)
+        except FileNotFoundError:
+            continue  # 刷新修改时间之前已被回收
+        unit['attempts'] += 1
+        _write_json_atomic(unit, claimed_path)
+        return unit, claimed_path
+    return None, None
+
+
+class _Heartbeat:
+    """后台线程定期更新领取文件的修改时间"""
+
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return  # 单元已被回收
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def run_unit(queue_dir, unit):
+    """执行一个工作单元，返回可JSON序列化的结果行"""
+    data = pd.read_pickle(os.path.join(queue_dir, 'data', f"{unit['symbol']}.pkl"))
+    table = threshold_sweep(data, unit['thresholds'], **unit['params'])
+    rows = table.reset_index().to_dict(orient='records')
+    for row in rows:
+        row['symbol'] = unit['symbol']
+        for key, value in row.items():
+            if isinstance(value, np.generic):
+                row[key] = value.item()
+    return rows
+
+
+def run_worker(queue_dir, worker_id=None, stale_after=60.0, heartbeat_interval=5.0, poll_interval=0.5,
+               max_attempts=3, max_units=None):
+    """
+    工作进程主循环：回收超时单元、领取单元、执行、写入结果，直到队列处理完毕
+    :param worker_id: 工作进程标识，默认使用 主机名-进程号
+    :param stale_after: 心跳超时时间（秒），超时的单元会被其他工作进程回收
+    :param heartbeat_interval: 心跳间隔（秒），应明显小于 stale_after
+    :param max_attempts: 每个单元的最大尝试次数
+    :param max_units: 最多处理的单元数，None 表示不限
+    :return: 本进程执行的单元数（结果已存在而跳过的单元不计）
+    """
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    worker_id = worker_id.replace('.', '_')
+    done = 0
+    while max_units is None or done < max_units:
+        reclaim_stale(queue_dir, stale_after)
+        unit, claimed_path = _claim(queue_dir, worker_id)
+        if unit is None:
+            if not any(name.endswith('.json') for name in os.listdir(os.path.join(queue_dir, 'claimed'))):
+                break  # 没有待处理和处理中的单元
+            time.sleep(poll_interval)
+            continue
+
+        unit_id = unit['unit_id']
+        result_path = os.path.join(queue_dir, 'results', f"{unit_id}.json")
+        try:
+            if unit['attempts'] > max_attempts:
+                raise RuntimeError(f"超过最大尝试次数（{max_attempts}次）")
+            if not os.path.exists(result_path):
+                with _Heartbeat(claimed_path, heartbeat_interval):
+                    rows = run_unit(queue_dir, unit)
+                # 结果行只由单元参数和数据快照决定，单元被回收后重复执行也得到相同的结果
+                _write_json_atomic({'unit_id': unit_id, 'worker': worker_id, 'rows': rows}, result_path)
+                done += 1
+        except Exception as e:
+            print(f"工作单元 {unit_id} 执行失败：{str(e)}")
+            unit['error'] = traceback.format_exc()
+            _write_json_atomic(unit, os.path.join(queue_dir, 'failed', f"{unit_id}.json"))
+        finally:
+            try:
+                os.remove(claimed_path)
+            except FileNotFoundError:
+                pass
+    return done
+
+
+def sweep_status(queue_dir):
+    """各状态的单元数"""
+    counts = {}
+    for name in ('pending', 'claimed', 'results', 'failed'):
+        counts[name] = sum(entry.endswith('.json') for entry in os.listdir(os.path.join(queue_dir, name)))
+    return counts
+
+
+def merge_results(queue_dir, allow_partial=False):
+    """
+    合并所有单元的结果
+    按单元ID和阈值排序，结果与工作进程数量、执行顺序和执行机器无关
+    :param allow_partial: 为 False 时有未完成的单元会抛出异常
+    :return: DataFrame，以 (symbol, threshold) 为索引
+    """
+    job = _read_json(os.path.join(queue_dir, 'job.json'))
+    chunk_size = job['chunk_size']
+    expected = [f"{symbol}-{chunk:05d}" for symbol in job['symbols']
+                for chunk in range((len(job['thresholds']) + chunk_size - 1) // chunk_size)]
+    rows = []
+    missing = []
+    for unit_id in expected:
+        path = os.path.join(queue_dir, 'results', f"{unit_id}.json")
+        if not os.path.exists(path):
+            missing.append(unit_id)
+            continue
+        rows.extend(_read_json(path)['rows'])
+    if missing and not allow_partial:
+        raise RuntimeError(f"有{len(missing)}个工作单元未完成：{', '.join(missing[:5])}")
+    if not rows:
+        return pd.DataFrame()
+    return pd.DataFrame(rows).set_index(['symbol', 'threshold']).sort_index()
+
+
+def _parse_thresholds(text):
+    """'0.02:0.3:15' 表示等间距的15个阈值，否则为逗号分隔的列表"""
+    if ':' in text:
+        start, stop, count = text.split(':')
+        return np.linspace(float(start), float(stop), int(count)).tolist()
+    return [float(value) for value in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分布式阈值扫描：共享目录工作队列")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create = subparsers.add_parser('create', help="创建扫描任务")
+    create.add_argument('queue_dir')
+    create.add_argument('--symbols', nargs='+', required=True)
+    create.add_argument('--thresholds', required=True, help="例如 0.02:0.3:15 或 0.05,0.1,0.2")
+    create.add_argument('--start', required=True)
+    create.add_argument('--end', required=True)
+    create.add_argument('--chunk-size', type=int, default=10)
+    create.add_argument('--initial-shares', type=int, default=1000)
+    create.add_argument('--trade-shares', type=int, default=100)
+    create.add_argument('--premium-rate', type=float, default=0.05)
+
+    work = subparsers.add_parser('work', help="启动工作进程")
+    work.add_argument('queue_dir')
+    work.add_argument('--workers', type=int, default=1, help="本机启动的工作进程数")
+    work.add_argument('--stale-after', type=float, default=60.0)
+    work.add_argument('--heartbeat', type=float, default=5.0)
+
+    status = subparsers.add_parser('status', help="查看任务进度")
+    status.add_argument('queue_dir')
+
+    merge = subparsers.add_parser('merge', help="合并结果")
+    merge.add_argument('queue_dir')
+    merge.add_argument('--output', default='sweep_results.csv')
+    merge.add_argument('--allow-partial', action='store_true')
+
+    args = parser.parse_args()
+    if args.command == 'create':
+        from data_providers import provider_chain_from_env
+        provider = provider_chain_from_env(os.getenv('ALPHA_VANTAGE_API_KEY', 'demo'))
+        datasets = {}
+        for symbol in args.symbols:
+            data = provider.get_stock_data(symbol, args.start, args.end)
+            if data.empty:
+                parser.error(f"无法获取 {symbol} 的数据")
+            datasets[symbol] = data
+        units = create_sweep(args.queue_dir, datasets, _parse_thresholds(args.thresholds), args.chunk_size,
+                             initial_shares=args.initial_shares, trade_shares=args.trade_shares,
+                             premium_rate=args.premium_rate)
+        print(f"已创建{units}个工作单元")
+    elif args.command == 'work':
+        if args.workers == 1:
+            done = run_worker(args.queue_dir, stale_after=args.stale_after, heartbeat_interval=args.heartbeat)
+            print(f"完成{done}个工作单元")
+        else:
+            from multiprocessing import Pool
+            with Pool(args.workers) as pool:
+                counts = pool.starmap(run_worker, [(args.queue_dir, None, args.stale_after, args.heartbeat)]
+                                      * args.workers)
+            print(f"完成{sum(counts)}个工作单元：{counts}")
+    elif args.command == 'status':
+        print(sweep_status(args.queue_dir))
+    elif args.command == 'merge':
+        merged = merge_results(args.queue_dir, allow_partial=args.allow_partial)
+        merged.to_csv(args.output)
+        print(f"已合并{len(merged)}行结果到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
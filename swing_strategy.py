@@ -1,80 +1,134 @@
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+from profiler import profiled, phase
+from memory_utils import shared_price_frame, readonly_array, is_readonly_frame, SIGNAL_DTYPE, PRICE_DTYPE, SHARES_DTYPE
+from signal_engine import threshold_crossings
+from trade_events import (
+    make_events, event_signals, share_deltas, cash_deltas, running_total, dense_running, dense_per_bar,
+    EVENT_BUY, EVENT_SELL
+)
 
 class SwingTrader:
-    def __init__(self, data, initial_shares=1000, trade_shares=100, threshold=0.1):
+    # 回测引擎版本，引擎逻辑变化时递增，使持久化的回测结果失效
+    ENGINE_VERSION = '2'
+    
+    def __init__(self, data, initial_shares=1000, trade_shares=100, threshold=0.1, lean=False, signals=None, events=None):
         """
         初始化波段交易策略
+        回测结果以稀疏的事件日志 events 保存，逐日的 positions 在首次访问时才生成
         :param data: DataFrame，包含股票价格数据
         :param initial_shares: 初始持股数量
         :param trade_shares: 每次交易的股数
         :param threshold: 触发信号的价格变化阈值
+        :param lean: 内存精简模式，共享价格数据而不复制，信号存为int8、价格存为float32
+        :param signals: 可选的预先计算好的 (信号K线序号, 信号方向)，多个策略对比时共用同一组信号
+        :param events: 可选的已保存的事件日志，提供时直接恢复回测结果，不再重新计算
         """
-        self.data = data.copy()
+        self.lean = lean
+        # 只读的共享价格数据（SharedPriceRegistry）不会被修改，直接共享而不复制
+        self.data = shared_price_frame(data) if lean or is_readonly_frame(data) else data.copy()
+        self.initial_shares = initial_shares
+        self.initial_cash = 100000.0  # 初始现金10万
         self.trade_shares = trade_shares
         self.threshold = threshold
         
-        # 初始化持仓DataFrame
-        self.positions = pd.DataFrame(index=data.index)
-        self.positions['Close'] = data['Close']
-        self.positions['Signal'] = 0
-        self.positions['Shares'] = float(initial_shares)
-        self.positions['Cash'] = 100000.0  # 初始现金10万
-        
-        # 计算初始总资产
-        initial_total_asset = float(initial_shares * data['Close'].iloc[0] + 100000.0)
-        self.positions['Total_Asset'] = initial_total_asset
+        # 计算过程统一使用float64的只读价格视图
+        self._close = readonly_array(self.data['Close'])
+        self._positions = None
         
         # 生成交易信号和执行回测
-        self._generate_signals()
-        self._backtest()
+        if events is not None:
+            self._restore_events(events)
+        else:
+            self._generate_signals(signals)
+            self._backtest()
     
-    def _generate_signals(self):
-        """生成交易信号，基于复权价格的波动"""
-        reference_price = self.data['Close'].iloc[0]  # 初始参考价格（复权）
-        
-        for i in range(1, len(self.data)):
-            current_price = self.data['Close'].iloc[i]
-            price_change = (current_price - reference_price) / reference_price
-            
-            # 根据价格变化生成信号
-            if price_change >= self.threshold:  # 上涨超过阈值，卖出
-                self.positions.iloc[i, self.positions.columns.get_loc('Signal')] = -1
-                reference_price = current_price
-            elif price_change <= -self.threshold:  # 下跌超过阈值，买入
-                self.positions.iloc[i, self.positions.columns.get_loc('Signal')] = 1
-                reference_price = current_price
+    @profiled('swing.generate_signals')
+    def _generate_signals(self, signals=None):
+        """生成交易信号，基于复权价格的波动，可直接使用预先计算好的共享信号"""
+        if signals is None:
+            signals = threshold_crossings(self._close, self.threshold)
+        self._signal_bars, self._signal_directions = signals
     
+    @profiled('swing.backtest')
     def _backtest(self):
-        """执行回测，使用复权价格计算资产价值"""
-        for i in range(1, len(self.positions)):
-            # 复制前一天的持仓和现金
-            self.positions.iloc[i, self.positions.columns.get_loc('Shares')] = self.positions.iloc[i-1]['Shares']
-            self.positions.iloc[i, self.positions.columns.get_loc('Cash')] = self.positions.iloc[i-1]['Cash']
-            
-            # 根据信号执行交易
-            signal = self.positions.iloc[i]['Signal']
-            if signal == 1:  # 买入信号
-                shares_to_buy = self.trade_shares
-                cost = shares_to_buy * self.positions.iloc[i]['Close']
-                if cost <= self.positions.iloc[i]['Cash']:
-                    self.positions.iloc[i, self.positions.columns.get_loc('Shares')] += shares_to_buy
-                    self.positions.iloc[i, self.positions.columns.get_loc('Cash')] -= float(cost)
-            elif signal == -1:  # 卖出信号
-                shares_to_sell = self.trade_shares
-                if shares_to_sell <= self.positions.iloc[i]['Shares']:
-                    proceeds = float(shares_to_sell * self.positions.iloc[i]['Close'])
-                    self.positions.iloc[i, self.positions.columns.get_loc('Shares')] -= shares_to_sell
-                    self.positions.iloc[i, self.positions.columns.get_loc('Cash')] += proceeds
-            
-            # 更新总资产价值（使用复权价格）
-            total_asset = float(
-                self.positions.iloc[i]['Shares'] * self.positions.iloc[i]['Close'] +
-                self.positions.iloc[i]['Cash']
-            )
-            self.positions.iloc[i, self.positions.columns.get_loc('Total_Asset')] = total_asset
+        """执行回测，逐个处理信号日并记录交易事件"""
+        shares = float(self.initial_shares)
+        cash = self.initial_cash
+        rows = []
+        
+        for i, direction in zip(self._signal_bars.tolist(), self._signal_directions.tolist()):
+            close = float(self._close[i])
+            qty = 0  # 资金或持股不足时信号不执行
+            if direction == 1:  # 买入信号
+                cost = self.trade_shares * close
+                if cost <= cash:
+                    qty = self.trade_shares
+                    shares += qty
+                    cash -= float(cost)
+                rows.append((i, EVENT_BUY, qty, close, 0.0, 0.0))
+            else:  # 卖出信号
+                if self.trade_shares <= shares:
+                    qty = self.trade_shares
+                    shares -= qty
+                    cash += float(qty * close)
+                rows.append((i, EVENT_SELL, qty, close, 0.0, 0.0))
+        
+        self.events = make_events(rows)
+        self.final_shares = shares
+        self.final_cash = cash
+    
+    def _restore_events(self, events):
+        """由已保存的事件日志恢复回测结果"""
+        self.events = events
+        self._signal_bars = events['bar'].astype(np.int64)
+        self._signal_directions = event_signals(events)
+        self.final_shares = running_total(share_deltas(events), float(self.initial_shares))
+        self.final_cash = running_total(cash_deltas(events), self.initial_cash)
+    
+    @property
+    def initial_asset(self):
+        """初始总资产"""
+        return float(self.initial_shares * self._close[0] + self.initial_cash)
+    
+    @property
+    def final_asset(self):
+        """最终总资产，直接由事件日志的结果计算，无需生成逐日持仓"""
+        return float(self.final_shares * self._close[-1] + self.final_cash)
+    
+    @property
+    def positions(self):
+        """逐日持仓DataFrame，首次访问时由事件日志生成"""
+        if self._positions is None:
+            with phase('swing.positions'):
+                self._positions = self._build_positions()
+        return self._positions
+    
+    def _build_positions(self):
+        """由事件日志展开逐日持仓，精简模式下使用紧凑的数据类型"""
+        n = len(self._close)
+        signals = dense_per_bar(self.events, event_signals(self.events), n, dtype=SIGNAL_DTYPE)
+        shares = dense_running(self.events, share_deltas(self.events), n, self.initial_shares)
+        cash = dense_running(self.events, cash_deltas(self.events), n, self.initial_cash)
+        
+        positions = pd.DataFrame(index=self.data.index)
+        if self.lean:
+            positions['Close'] = self._close.astype(PRICE_DTYPE)
+            positions['Signal'] = signals
+            positions['Shares'] = shares.astype(SHARES_DTYPE)
+        else:
+            positions['Close'] = self.data['Close']
+            positions['Signal'] = signals.astype(np.int64)
+            positions['Shares'] = shares
+        positions['Cash'] = cash
+        # 总资产价值（使用复权价格）
+        positions['Total_Asset'] = shares * self._close + cash
+        return positions
+    
+    def memory_components(self):
+        """当前已生成的数据组件，用于内存报告（不会触发逐日持仓的生成）"""
+        return {'data': self.data, 'events': self.events, 'positions': self._positions}
     
     def display_summary(self):
         """显示回测结果摘要"""
@@ -117,7 +171,7 @@ class SwingTrader:
 
 # 使用示例
 if __name__ == "__main__":
-    ticker = yf.Ticker("AAPL")
-    data = ticker.history(start="2023-05-01", end="2024-05-01")
+    from data_providers import provider_chain_from_env
+    data = provider_chain_from_env().get_stock_data("AAPL", "2023-05-01", "2024-05-01")
     trader = SwingTrader(data, initial_shares=1000, trade_shares=100)
     trader.display_summary() 
\ No newline at end of file
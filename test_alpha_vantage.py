@@ -1,4 +1,5 @@
 import alpha_vantage_api as av
+from replay_provider import api_from_env
 import pandas as pd
 from datetime import datetime, timedelta
 
@@ -16,7 +17,7 @@ print(f"尝试获取{symbol}从{start_date}到{end_date}的数据")
 
 try:
     # 初始化API
-    api = av.AlphaVantageAPI(api_key=API_KEY)
+    api = api_from_env(API_KEY)
     
     # 获取股票数据
     data = api.get_stock_data(symbol, start_date, end_date)
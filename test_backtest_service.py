@@ -0,0 +1,150 @@
+import json
+import time
+import tempfile
+import threading
+import http.client
+import numpy as np
+import pandas as pd
+
+from backtest_service import BacktestService, RequestBatcher, RequestCoalescer, start_server, request_json
+from shared_prices import SharedPriceRegistry
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from threshold_sweep import threshold_sweep
+
+print("测试回测HTTP服务...")
+
+rng = np.random.default_rng(5)
+dates = pd.bdate_range('2022-01-03', '2023-12-29')
+close = 100 * np.exp(np.cumsum(rng.normal(0, 0.025, len(dates))))
+data = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1e6}, index=dates)
+loads = []
+
+
+def load(symbol, start, end):
+    loads.append(symbol)
+    if symbol == 'MISSING':
+        return None
+    return data.loc[start:end]
+
+
+# 相同键的并发请求只计算一次
+coalescer = RequestCoalescer()
+calls = []
+release = threading.Event()
+
+
+def slow():
+    calls.append(1)
+    release.wait(5)
+    return 42
+
+
+results = []
+threads = [threading.Thread(target=lambda: results.append(coalescer.run('k', slow))) for _ in range(8)]
+for thread in threads:
+    thread.start()
+while coalescer.inflight() == 0 or coalescer.coalesced < 7:
+    time.sleep(0.001)
+release.set()
+for thread in threads:
+    thread.join()
+assert results == [42] * 8 and len(calls) == 1
+print("并发的相同请求只计算一次")
+
+# 窗口内到达的同键请求合并成一批，结果与请求一一对应
+batches = []
+batcher = RequestBatcher(lambda key, items: batches.append(list(items)) or [item * 10 for item in items], window=0.2)
+results = {}
+threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, batcher.submit('k', i))) for i in range(5)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert results == {i: i * 10 for i in range(5)}
+assert len(batches) == 1 and sorted(batches[0]) == list(range(5))
+print(f"5个请求合并为{len(batches)}批")
+
+with tempfile.TemporaryDirectory() as work_dir:
+    service = BacktestService(load, registry=SharedPriceRegistry(work_dir), batch_window=0.2)
+    server = start_server(service)
+    host, port = server.server_address[:2]
+    payload = {'symbol': 'aapl', 'start': '2022-01-01', 'end': '2023-12-31', 'trade_shares': 100,
+               'premium_rate': 0.05}
+
+    # 不同阈值的并发请求合并成一批，结果与单独运行策略一致
+    thresholds = [0.05, 0.08, 0.1, 0.15]
+    responses = {}
+
+    def client(threshold):
+        connection = http.client.HTTPConnection(host, port, timeout=30)
+        responses[threshold] = request_json(connection, 'POST', '/backtest', dict(payload, threshold=threshold))
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(threshold,)) for threshold in thresholds]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    window = data.loc['2022-01-01':'2023-12-31']
+    for threshold in thresholds:
+        status, result = responses[threshold]
+        assert status == 200, result
+        swing = SwingTrader(window, 1000, 100, threshold)
+        option = OptionTrader(window, 1000, 100, threshold, 0.05)
+        assert np.isclose(result['swing']['final_asset'], swing.final_asset)
+        assert np.isclose(result['option']['final_asset'], option.final_asset)
+        assert np.isclose(result['option']['premium'], option.total_premium)
+        assert 'sharpe' in result['swing']['metrics']
+    status = service.status()
+    assert status['batches'] == 1 and status['batched'] == len(thresholds), status
+    assert loads == ['AAPL']
+    print(f"{len(thresholds)}个阈值合并为1批计算，结果与单独运行一致")
+
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    # 重复请求直接使用结果缓存；只请求一种策略、不要指标时只返回对应部分
+    status, result = request_json(connection, 'POST', '/backtest',
+                                  dict(payload, threshold=0.1, strategy='swing', metrics=False))
+    assert status == 200 and 'option' not in result and 'metrics' not in result['swing']
+    assert service.status()['result_hits'] == 1
+
+    # 交易事件以NDJSON流式返回：第一行为摘要，其余每行一个事件
+    status, lines = request_json(connection, 'POST', '/backtest', dict(payload, threshold=0.1, events=True))
+    option = OptionTrader(window, 1000, 100, 0.1, 0.05)
+    events = [line for line in lines[1:] if line['strategy'] == 'option']
+    assert status == 200 and lines[0]['threshold'] == 0.1
+    assert len(events) == len(option.events)
+    assert [event['date'] for event in events] == [f"{window.index[bar]:%Y-%m-%d}" for bar in option.events['bar']]
+    print(f"流式返回{len(lines) - 1}个交易事件")
+
+    # 阈值扫描与 threshold_sweep 一致，每个阈值一行
+    status, rows = request_json(connection, 'POST', '/sweep', dict(payload, thresholds='0.05:0.2:4', metrics=False))
+    expected = threshold_sweep(window, np.linspace(0.05, 0.2, 4))
+    assert status == 200 and len(rows) == 4
+    assert np.allclose([row['option_final_asset'] for row in rows], expected['option_final_asset'])
+    print("阈值扫描结果一致")
+
+    # 参数错误返回400，没有数据返回404，服务继续处理之后的请求
+    status, result = request_json(connection, 'POST', '/backtest', {'symbol': 'AAPL'})
+    assert status == 400 and 'error' in result
+    status, result = request_json(connection, 'POST', '/backtest', dict(payload, symbol='MISSING'))
+    assert status == 404
+    for invalid in ({'threshold': -1}, {'initial_shares': -100}, {'premium_rate': -0.05}):
+        status, result = request_json(connection, 'POST', '/backtest', dict(payload, **invalid))
+        assert status == 400, invalid
+    status, result = request_json(connection, 'GET', '/health')
+    assert status == 200 and result['status'] == 'ok'
+
+    # 计数器：各接口的请求数、错误数和延迟分位数
+    status, stats = request_json(connection, 'GET', '/stats')
+    assert status == 200
+    assert stats['endpoints']['/backtest']['requests'] == len(thresholds) + 7
+    assert stats['endpoints']['/backtest']['errors'] == 5
+    assert stats['streamed'] == 2 and stats['throughput_rps'] > 0
+    assert stats['endpoints']['/backtest']['p99_ms'] >= stats['endpoints']['/backtest']['p50_ms']
+    print(json.dumps({key: stats[key] for key in ('requests', 'errors', 'computed', 'batches', 'result_hits')}))
+    connection.close()
+    server.shutdown()
+    server.server_close()
+
+print("\n测试完成")
@@ -0,0 +1,97 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+from bar_resampler import BarStore, resample_bars, periods_per_year
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+
+print("测试多周期K线存储...")
+
+rng = np.random.default_rng(11)
+dates = pd.bdate_range('2021-01-01', '2023-12-29')
+close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, len(dates))))
+daily = pd.DataFrame({
+    'Open': close * (1 + rng.normal(0, 0.003, len(dates))),
+    'High': close * 1.01,
+    'Low': close * 0.99,
+    'Close': close,
+    'Volume': rng.integers(1_000, 10_000, len(dates)).astype(np.int64),
+}, index=dates)
+
+
+def pandas_reference(frame, rule):
+    """pandas resample 作为参考实现，日期取每个周期最后一个交易日"""
+    grouped = frame.groupby(frame.index.to_period(rule))
+    expected = grouped.agg({'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'})
+    expected.index = grouped.apply(lambda group: group.index[-1]).to_numpy()
+    return expected
+
+
+# 与pandas参考实现一致
+for timeframe, rule in [('W', 'W-FRI'), ('M', 'M')]:
+    expected = pandas_reference(daily, rule)
+    result = resample_bars(daily, timeframe)
+    assert (result.index == pd.DatetimeIndex(expected.index)).all()
+    assert np.allclose(result[['Open', 'High', 'Low', 'Close']].to_numpy(), expected[['Open', 'High', 'Low', 'Close']].to_numpy())
+    assert (result['Volume'].to_numpy() == expected['Volume'].to_numpy()).all()
+five_day = resample_bars(daily, '5D')
+assert len(five_day) == -(-len(daily) // 5)
+assert five_day['Volume'].iloc[0] == daily['Volume'].iloc[:5].sum()
+print("聚合结果与pandas一致")
+
+with tempfile.TemporaryDirectory() as work_dir:
+    store = BarStore(os.path.join(work_dir, 'bars'))
+
+    # 先写入前一部分日线，读取各周期后逐段追加，结果应与一次性聚合相同
+    store.append('AAPL', daily.iloc[:400])
+    for timeframe in ['W', 'M', '5D']:
+        store.bars('AAPL', timeframe)
+    for end in [403, 410, 437, 600, len(daily)]:
+        added = store.append('AAPL', daily.iloc[:end])
+        assert added > 0
+        for timeframe in ['W', 'M', '5D']:
+            pd.testing.assert_frame_equal(store.bars('AAPL', timeframe), resample_bars(daily.iloc[:end], timeframe),
+                                          check_freq=False)
+    assert store.append('AAPL', daily.iloc[-50:]) == 0
+    print("增量更新与完全重建一致")
+
+    # 填补已有数据中间的缺口（先写2021年和2023年，再写2022年），派生周期按完整数据重建
+    years = [daily.loc[str(year)] for year in (2021, 2022, 2023)]
+    store.append('GAP', years[0])
+    store.bars('GAP', 'W')
+    store.append('GAP', years[2])
+    assert store.append('GAP', pd.concat([years[1], years[2].iloc[:5]])) == len(years[1])
+    assert len(store.bars('GAP', 'D', '2022-01-01', '2022-12-31')) == len(years[1])
+    for timeframe in ['W', 'M', '5D']:
+        pd.testing.assert_frame_equal(store.bars('GAP', timeframe), resample_bars(daily, timeframe), check_freq=False)
+    print("填补缺口后与完全重建一致")
+
+    # 新的实例直接读取持久化的派生K线
+    reopened = BarStore(os.path.join(work_dir, 'bars'))
+    weekly = reopened.bars('AAPL', 'W', '2023-01-01', '2023-12-31')
+    assert weekly.index.min() >= pd.Timestamp('2023-01-01') and weekly.index.max() <= pd.Timestamp('2023-12-31')
+    assert reopened.timeframes('AAPL') == ['5D', 'M', 'W']
+
+    # 日内数据：N日K线按交易日分组
+    minutes = pd.date_range('2024-01-02 09:30', periods=390, freq='min')
+    intraday_index = minutes.append([minutes + pd.Timedelta(days=offset) for offset in (1, 2)])
+    intraday = pd.DataFrame({'Open': 1.0, 'High': 2.0, 'Low': 0.5, 'Close': np.arange(len(intraday_index), dtype=float),
+                             'Volume': 1}, index=intraday_index)
+    store.append('SPY', intraday.iloc[:500])
+    store.bars('SPY', '2D')
+    store.append('SPY', intraday)
+    two_day = store.bars('SPY', '2D')
+    assert len(two_day) == 2 and two_day['Volume'].tolist() == [780, 390]
+    print("日内数据测试通过")
+
+    # 策略直接在周线上运行
+    swing = SwingTrader(weekly, threshold=0.05)
+    option = OptionTrader(weekly, threshold=0.05)
+    print(f"周线K线数: {len(weekly)}，波段策略最终资产: ${swing.positions['Total_Asset'].iloc[-1]:,.2f}，"
+          f"期权策略最终资产: ${option.final_asset:,.2f}")
+    assert len(swing.positions) == len(weekly) and len(option.positions) == len(weekly)
+
+assert periods_per_year('W') == 52 and periods_per_year('5D') == 252 / 5
+print("\n测试完成")
@@ -0,0 +1,99 @@
+import os
+import time
+import tempfile
+import pandas as pd
+
+from data_cache import StockDataCache
+from replay_provider import ReplayAlphaVantageAPI, write_synthetic_fixture
+from data_providers import (
+    DataProvider, ProviderError, AlphaVantageProvider, LocalFileProvider, CacheProvider, FallbackChain,
+    cached_loader_from_env
+)
+
+print("测试数据源回退链（使用本地替身，无需网络）...")
+
+
+class SlowProvider(DataProvider):
+    """模拟较慢或失败的远程数据源"""
+    remote = True
+
+    def __init__(self, name, data=None, delay=0.0):
+        self.name = name
+        self.data = data
+        self.delay = delay
+        self.calls = 0
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.data is None:
+            raise ProviderError(f"{self.name} 不可用")
+        return self.data
+
+
+with tempfile.TemporaryDirectory() as work_dir:
+    fixture_dir = os.path.join(work_dir, 'fixtures')
+    write_synthetic_fixture(fixture_dir, 'AAPL', start_date='2022-01-01', end_date='2023-12-31', seed=3)
+    alpha_vantage = AlphaVantageProvider(api=ReplayAlphaVantageAPI(fixture_dir=fixture_dir))
+    expected = alpha_vantage.get_stock_data('AAPL', '2023-01-01', '2023-06-30')
+    assert not expected.empty
+
+    # 本地CSV优先，没有文件时回退到Alpha Vantage
+    local_dir = os.path.join(work_dir, 'data')
+    os.makedirs(local_dir)
+    chain = FallbackChain([LocalFileProvider(local_dir), alpha_vantage])
+    data = chain.get_stock_data('AAPL', '2023-01-01', '2023-06-30')
+    assert chain.last_source == 'alphavantage'
+    pd.testing.assert_frame_equal(data, expected)
+
+    expected.to_csv(os.path.join(local_dir, 'AAPL.csv'))
+    data = chain.get_stock_data('AAPL', '2023-01-01', '2023-03-31')
+    assert chain.last_source == 'local'
+    assert data.index.max() <= pd.Timestamp('2023-03-31')
+    assert (data['Close'].to_numpy() == expected.loc[:'2023-03-31', 'Close'].to_numpy()).all()
+    print("本地优先回退测试通过")
+
+    # 所有数据源都失败时返回空数据
+    chain = FallbackChain([SlowProvider('down-1'), SlowProvider('down-2')])
+    assert chain.get_stock_data('AAPL').empty
+    assert chain.counters['down-2']['failed'] == 1
+    print("全部失败测试通过")
+
+    # 缓存在链首时，远程数据源获取的数据写回缓存，第二次直接从缓存读取
+    cache = StockDataCache(os.path.join(work_dir, 'cache'), background=False)
+    remote = SlowProvider('remote', data=expected)
+    chain = FallbackChain([CacheProvider(cache), remote])
+    chain.get_stock_data('AAPL', '2023-01-01', '2023-06-30')
+    data = chain.get_stock_data('AAPL', '2023-01-01', '2023-06-30')
+    assert chain.last_source == 'cache' and remote.calls == 1
+    pd.testing.assert_frame_equal(data, expected)
+    print("缓存写回测试通过")
+
+    # 对冲请求：慢数据源超时后同时请求下一个，取最先返回的结果
+    slow = SlowProvider('slow', data=expected.iloc[:10], delay=1.0)
+    fast = SlowProvider('fast', data=expected, delay=0.05)
+    chain = FallbackChain([slow, fast], hedge_after=0.1)
+    start = time.perf_counter()
+    data = chain.get_stock_data('AAPL')
+    elapsed = time.perf_counter() - start
+    assert chain.last_source == 'fast' and len(data) == len(expected)
+    assert elapsed < 0.5, elapsed
+    print(f"对冲请求测试通过：{elapsed * 1000:.0f} ms（慢数据源需要1000 ms）")
+
+    # 对冲模式下数据源失败时立即请求下一个
+    chain = FallbackChain([SlowProvider('down'), SlowProvider('backup', data=expected)], hedge_after=5.0)
+    start = time.perf_counter()
+    chain.get_stock_data('AAPL')
+    assert chain.last_source == 'backup' and time.perf_counter() - start < 1.0
+    print("对冲失败切换测试通过")
+
+    # 带缓存的读取函数：首次从回退链获取并写入缓存，之后数据源不可用时仍从缓存读取
+    os.environ['DATA_PROVIDERS'] = 'local'
+    os.environ['DATA_LOCAL_DIR'] = local_dir
+    load = cached_loader_from_env(os.path.join(work_dir, 'loader_cache'))
+    first = load('AAPL', '2023-01-01', '2023-03-31')
+    os.remove(os.path.join(local_dir, 'AAPL.csv'))
+    pd.testing.assert_frame_equal(load('AAPL', '2023-01-01', '2023-03-31'), first)
+    print("带缓存的读取函数测试通过")
+
+print("\n测试完成")
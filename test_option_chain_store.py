@@ -0,0 +1,93 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+from option_chain_store import OptionChainStore, synthetic_chain, normalize_chain, CALL, PUT
+from option_strategy import OptionTrader
+from result_store import ResultStore
+
+print("测试期权链存储...")
+
+
+rng = np.random.default_rng(5)
+dates = pd.bdate_range('2023-01-02', periods=120)
+close = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates)))), index=dates)
+data = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1}, index=dates)
+raw = synthetic_chain(close, strikes_per_expiry=12, expiries=3)
+
+with tempfile.TemporaryDirectory() as work_dir:
+    # 分两个文件导入（CSV 和 CSV 的重复部分），重复的合约只保留一行
+    first, second = raw.iloc[:len(raw) // 2], raw.iloc[len(raw) // 3:]
+    first.to_csv(os.path.join(work_dir, 'a.csv'), index=False)
+    second.to_csv(os.path.join(work_dir, 'b.csv.gz'), index=False)
+    store = OptionChainStore(os.path.join(work_dir, 'chains'))
+    store.ingest('syn', os.path.join(work_dir, 'a.csv'))
+    chain = store.ingest('SYN', [os.path.join(work_dir, 'b.csv.gz')])
+    assert len(chain) == len(raw), (len(chain), len(raw))
+    assert store.underlyings() == ['SYN'] and store.open('syn') is chain
+    print(f"导入 {len(chain)} 行，{len(chain.group_keys)} 个 (类型, 报价日, 到期日) 分组")
+
+    # 与直接在原始数据上筛选的结果一致
+    table = pd.DataFrame(normalize_chain(raw))
+    query_days = rng.choice(len(dates), 40)
+    query_dates = dates[query_days] + pd.Timedelta(days=1)  # 信号日可能没有报价（周末），使用最近的报价日
+    types = rng.choice([CALL, PUT], 40)
+    targets = close.to_numpy()[query_days] * rng.uniform(0.9, 1.1, 40)
+    rows = chain.select(query_dates, types, targets, days_to_expiry=45)
+    for k in range(40):
+        query_day = query_dates[k].to_datetime64().astype('datetime64[D]').astype(np.int64)
+        day = table['quote_date'][table['quote_date'] <= query_day].max()
+        candidates = table[(table['type'] == types[k]) & (table['quote_date'] == day)]
+        gaps = (candidates['expiry'] - (day + 45)).abs()
+        best_expiry = candidates['expiry'][gaps == gaps.min()].max()
+        candidates = candidates[candidates['expiry'] == best_expiry]
+        strike_gaps = (candidates['strike'] - targets[k]).abs()
+        best_strike = candidates['strike'][strike_gaps == strike_gaps.min()].min()
+        assert rows[k] >= 0
+        assert (chain.quote_date[rows[k]], chain.expiry[rows[k]], chain.strike[rows[k]], chain.type[rows[k]]) == \
+               (day, best_expiry, best_strike, types[k]), k
+    # 超过 max_stale_days 没有报价
+    assert chain.select([dates[-1] + pd.Timedelta(days=30)], [CALL], [100.0])[0] == -1
+    print("最近报价日、到期日和行权价查找与直接筛选一致")
+
+    # 逐日估值：卖出当日的估值等于所选合约的中间价
+    marks = chain.mark(rows[:5], dates)
+    for k in range(5):
+        quote_bar = dates.get_loc(pd.Timestamp(chain.quote_date[rows[k]], unit='D'))
+        assert marks[quote_bar, k] == chain.mid[rows[k]]
+        assert np.isnan(marks[dates > pd.Timestamp(chain.expiry[rows[k]], unit='D'), k]).all()
+
+    # 期权策略使用期权链：挂牌行权价和买价，没有期权链时结果不变
+    plain = OptionTrader(data, threshold=0.05)
+    priced = OptionTrader(data, threshold=0.05, chain=chain)
+    sales = np.isin(priced.events['type'], [3, 4])
+    assert priced.chain_misses == 0 and len(priced.chain_rows) == int(sales.sum())
+    assert np.array_equal(priced.events['strike'][sales], chain.strike[priced.chain_rows])
+    assert np.array_equal(priced.events['premium'][sales], chain.bid[priced.chain_rows])
+    assert priced.total_premium != plain.total_premium
+    restored = OptionTrader(data, threshold=0.05, chain=chain, events=priced.events)
+    assert restored.final_asset == priced.final_asset
+    assert np.array_equal(restored.chain_rows, priced.chain_rows)
+    # 部分合约没有报价：回测和恢复时未命中的信号数相同，未命中的信号按估算模型定价
+    unquoted = raw.copy()
+    unquoted.loc[unquoted.index % 2 == 0, ['bid', 'ask']] = np.nan
+    unquoted.to_csv(os.path.join(work_dir, 'gap.csv'), index=False)
+    gappy = store.ingest('GAP', os.path.join(work_dir, 'gap.csv'))
+    partial = OptionTrader(data, threshold=0.05, chain=gappy)
+    assert 0 < partial.chain_misses < len(partial.chain_rows)
+    assert OptionTrader(data, threshold=0.05, chain=gappy, events=partial.events).chain_misses == partial.chain_misses
+    contract_marks = priced.contract_marks()
+    assert contract_marks.shape == (len(data), len(priced.chain_rows))
+    print(f"期权链定价：累计权利金 {priced.total_premium:,.2f}（估算模型 {plain.total_premium:,.2f}）")
+
+    # 结果缓存键：不使用期权链时与之前相同，使用时按期权链内容区分
+    results = ResultStore(os.path.join(work_dir, 'results'))
+    params = dict(initial_shares=1000, trade_shares=100, threshold=0.05, premium_rate=0.05)
+    plain_key = results.key_for(OptionTrader, data, params)
+    assert results.key_for(OptionTrader, data, dict(params, chain=None, days_to_expiry=30)) == plain_key
+    chain_key = results.key_for(OptionTrader, data, dict(params, chain=chain))
+    assert chain_key != plain_key
+    assert results.key_for(OptionTrader, data, dict(params, chain=chain, days_to_expiry=60)) != chain_key
+
+print("\n测试完成")
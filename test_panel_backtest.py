@@ -0,0 +1,51 @@
+import os
+import tempfile
+import numpy as np
+
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from panel_backtest import PricePanel, panel_backtest, synthetic_universe
+
+print("测试面板回测...")
+
+datasets = synthetic_universe(30, 800, seed=2)
+with tempfile.TemporaryDirectory() as work_dir:
+    directory = os.path.join(work_dir, 'panel')
+    panel = PricePanel.from_frames(datasets, directory=directory)
+    assert isinstance(panel.close, np.memmap) and not panel.close.flags.writeable
+    assert panel.mask.sum() == sum(len(data) for data in datasets.values())
+
+    # 重新打开的面板与内存中创建的面板相同
+    in_memory = PricePanel.from_frames(datasets)
+    reopened = PricePanel.open(directory)
+    assert np.array_equal(reopened.mask, in_memory.mask)
+    assert np.array_equal(np.nan_to_num(reopened.close), np.nan_to_num(in_memory.close))
+    assert (reopened.symbol_frame('S0003')['Close'] == datasets['S0003']['Close']).all()
+    copied = in_memory.save(os.path.join(work_dir, 'copy'))
+    assert np.array_equal(copied.mask, in_memory.mask)
+
+    # 每个股票的结果与单独回测完全一致（包括上市前、退市后和停牌日）
+    result = panel_backtest(panel, threshold=0.05, record=True)
+    summary = result.summary
+    for symbol, data in datasets.items():
+        swing = SwingTrader(data, threshold=0.05)
+        option = OptionTrader(data, threshold=0.05)
+        row = summary.loc[symbol]
+        assert row['signals'] == len(swing._signal_bars), symbol
+        assert np.isclose(row['swing_final_asset'], swing.final_asset), symbol
+        assert np.isclose(row['option_final_asset'], option.final_asset), symbol
+        assert np.isclose(row['premium_income'], option.total_premium), symbol
+        column = panel.symbols.index(symbol)
+        valid = panel.mask[:, column]
+        assert np.allclose(result.swing_asset[valid, column], swing.positions['Total_Asset'].to_numpy())
+    print(f"{len(datasets)} 个股票的面板回测结果与逐个回测一致")
+
+    # 每个股票使用不同的阈值
+    thresholds = np.linspace(0.03, 0.15, len(datasets))
+    per_symbol = panel_backtest(panel, threshold=thresholds).summary
+    symbol = panel.symbols[-1]
+    assert np.isclose(per_symbol.loc[symbol, 'swing_final_asset'],
+                      SwingTrader(datasets[symbol], threshold=thresholds[-1]).final_asset)
+    del panel, reopened, copied
+
+print("\n测试完成")
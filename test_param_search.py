@@ -0,0 +1,34 @@
+import numpy as np
+
+from panel_backtest import synthetic_universe
+from param_search import ParameterSearch, evaluate_config, sample_configs, DEFAULT_SPACE
+
+print("测试自适应参数搜索...")
+
+if __name__ == "__main__":
+    datasets = synthetic_universe(3, 540, seed=4, listing_gaps=False)
+
+    # 相同的种子得到相同的候选参数和结果
+    search = ParameterSearch(datasets, min_budget=20, seed=7)
+    first = search.run('halving', n_configs=27)
+    second = ParameterSearch(datasets, min_budget=20, seed=7).run('halving', n_configs=27)
+    assert first.best == second.best and first.trials.equals(second.trials)
+    assert first.trials.groupby('rung').size().tolist() == [27, 9, 3, 1]
+    assert first.trials['budget'].max() == search.max_budget == min(len(data) for data in datasets.values())
+    print("逐次减半可复现")
+
+    # 逐次减半找到的参数在完整历史上的评分，与穷举所有候选参数的结果相比排名靠前
+    configs = sample_configs(DEFAULT_SPACE, 27, np.random.default_rng(7))
+    exhaustive = sorted((evaluate_config(datasets, config, search.max_budget) for config in configs), reverse=True)
+    assert first.score >= exhaustive[len(exhaustive) // 3], (first.score, exhaustive[:5])
+    print(f"最佳评分 {first.score:.3f}，穷举最佳 {exhaustive[0]:.3f}，"
+          f"评估K线数 {first.bars_evaluated:,} / {27 * search.max_budget * 3:,}")
+
+    # 进程池中的结果与单进程完全相同
+    serial = ParameterSearch(datasets, min_budget=20, seed=3).run('hyperband')
+    pooled = ParameterSearch(datasets, min_budget=20, seed=3, workers=2).run('hyperband')
+    assert serial.best == pooled.best and np.allclose(serial.trials['score'], pooled.trials['score'])
+    assert serial.trials['bracket'].nunique() > 1
+    print(serial.summary())
+
+    print("\n测试完成")
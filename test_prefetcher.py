@@ -0,0 +1,104 @@
+import os
+import time
+import tempfile
+import threading
+import pandas as pd
+
+from data_cache import StockDataCache
+from data_providers import DataProvider, RequestQuota, QuotaProvider, FallbackChain
+from prefetcher import Prefetcher, parse_ranges, in_window
+
+print("测试后台预取和请求配额...")
+
+
+class CountingProvider(DataProvider):
+    """返回固定数据并记录请求次数的远程数据源"""
+    name = 'remote'
+    remote = True
+
+    def __init__(self, data):
+        self.data = data
+        self.calls = []
+
+    def get_stock_data(self, symbol, start_date=None, end_date=None):
+        self.calls.append(symbol)
+        return self.data
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+index = pd.bdate_range('2023-01-02', periods=20)
+data = pd.DataFrame({'Open': 1.0, 'High': 1.0, 'Low': 1.0, 'Close': 1.0, 'Volume': 1}, index=index)
+
+# 令牌桶：后台请求只能使用保留之外的令牌，交互请求之后的安静期内后台请求不取令牌
+clock = FakeClock()
+quota = RequestQuota(rate_per_minute=6, burst=3, reserve=1, quiet_period=30, clock=clock)
+with quota.background():
+    assert quota.acquire() and quota.acquire()
+    assert not quota.acquire()  # 只剩保留给交互请求的1个令牌
+assert quota.acquire(background=False)
+clock.now += 20  # 补充2个令牌，但仍在安静期内
+assert not quota.background_ready()
+clock.now += 15
+assert quota.background_ready()
+# 每分钟请求数必须为正，否则等待令牌时会除以0
+for rate in (0, -1):
+    try:
+        RequestQuota(rate_per_minute=rate)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError(f"rate_per_minute={rate} 应当报错")
+print("令牌桶测试通过")
+
+# 后台请求等待期间交互请求优先取得令牌
+quota = RequestQuota(rate_per_minute=600, burst=1, reserve=0, quiet_period=0)
+assert quota.acquire(background=False)
+order = []
+interactive = threading.Thread(target=lambda: quota.acquire(background=False) and order.append('interactive'))
+interactive.start()
+time.sleep(0.02)
+if quota.acquire(background=True, timeout=0.5):
+    order.append('background')
+interactive.join()
+assert order[0] == 'interactive', order
+print("交互请求优先测试通过")
+
+with tempfile.TemporaryDirectory() as work_dir:
+    cache = StockDataCache(os.path.join(work_dir, 'cache'), background=False)
+    remote = CountingProvider(data)
+    quota = RequestQuota(rate_per_minute=60, burst=3, reserve=1, quiet_period=0)
+    chain = FallbackChain([QuotaProvider(remote, quota)])
+    watchlist = ['AAPL', 'MSFT', 'NVDA', 'AMZN']
+    prefetcher = Prefetcher(cache, chain, watchlist, ranges=parse_ranges(''), quota=quota, poll_interval=0.05)
+
+    # 第一轮：3个令牌中保留1个，只能刷新2个股票，其余推迟
+    result = prefetcher.run_once()
+    assert result['refreshed'] == 2 and result['deferred'] == 2, result
+    assert remote.calls == ['AAPL', 'MSFT']
+
+    # 后台线程继续，直到全部刷新；已刷新的股票不再请求
+    prefetcher.start()
+    deadline = time.time() + 10
+    while prefetcher.status()['pending'] and time.time() < deadline:
+        time.sleep(0.05)
+    prefetcher.stop()
+    assert prefetcher.status()['pending'] == 0
+    assert sorted(remote.calls) == sorted(watchlist)
+
+    # 交互请求直接命中预取的缓存
+    start = time.perf_counter()
+    cached = cache.get_or_fetch('NVDA', '2023-01-01', '2024-01-01', lambda: remote.get_stock_data('NVDA'))
+    elapsed = (time.perf_counter() - start) * 1000
+    assert len(remote.calls) == len(watchlist) and cached.equals(data)
+    assert cache.stats()['hits'] == 1
+    print(f"预取后的交互请求命中缓存：{elapsed:.2f} ms")
+
+assert in_window((22, 6), pd.Timestamp('2024-01-01 23:00')) and not in_window((0, 8), pd.Timestamp('2024-01-01 09:00'))
+print("\n测试完成")
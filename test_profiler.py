@@ -0,0 +1,57 @@
+import threading
+import numpy as np
+
+from profiler import Profiler
+
+print("测试阶段剖析器...")
+
+profiler = Profiler(enabled=True)
+
+# 单线程：记录墙钟时间和内存峰值，内层阶段的峰值计入外层
+first = profiler.start_run()
+with profiler.phase('outer'):
+    with profiler.phase('inner'):
+        block = np.ones(1_000_000)
+    del block
+records = {r['phase']: r for r in profiler.records if r['run_id'] == first}
+assert records['inner']['peak_kb'] > 7000 and records['outer']['peak_kb'] >= records['inner']['peak_kb']
+print(f"内存峰值：inner {records['inner']['peak_kb']} KB，outer {records['outer']['peak_kb']} KB")
+
+# 并发会话：运行编号按线程（上下文）区分，不会被其他会话的 start_run 覆盖
+inside = threading.Barrier(2)
+run_ids = {}
+
+
+def session(name):
+    run_ids[name] = profiler.start_run()
+    with profiler.phase(f'{name}.work'):
+        inside.wait()
+        np.ones(100_000).sum()
+        inside.wait()
+
+
+threads = [threading.Thread(target=session, args=(name,)) for name in ('a', 'b')]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+assert run_ids['a'] != run_ids['b']
+for name in ('a', 'b'):
+    summary = profiler.summary(run_id=run_ids[name])
+    assert [item['phase'] for item in summary] == [f'{name}.work'], summary
+    # tracemalloc 峰值是进程级的，并发剖析时不记录内存峰值
+    assert summary[0]['peak_kb'] is None
+assert profiler.current_run() == first and profiler.active_threads == 0
+print(f"并发会话的运行编号：{run_ids}")
+
+# 片段重新运行时可以继续记录到已有的运行
+profiler.use_run(run_ids['a'])
+with profiler.phase('a.rerun'):
+    pass
+assert {item['phase'] for item in profiler.summary(run_id=run_ids['a'])} == {'a.work', 'a.rerun'}
+with profiler.phase('single'):
+    np.ones(10_000)
+assert profiler.records[-1]['peak_kb'] is not None
+
+profiler.disable()
+print("\n测试完成")
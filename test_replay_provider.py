@@ -0,0 +1,52 @@
+import os
+import json
+import time
+import tempfile
+import pandas as pd
+
+from replay_provider import ReplayAlphaVantageAPI, write_synthetic_fixture, fixture_name, api_from_env
+
+print("测试回放数据源（无需网络）...")
+
+with tempfile.TemporaryDirectory() as fixture_dir:
+    path = write_synthetic_fixture(fixture_dir, 'AAPL', start_date='2020-01-01', end_date='2021-12-31', seed=1)
+    assert os.path.basename(path) == fixture_name({'function': 'TIME_SERIES_DAILY', 'symbol': 'AAPL',
+                                                   'outputsize': 'full', 'apikey': 'secret'})
+
+    # 回放的结果与直接解析夹具一致
+    api = ReplayAlphaVantageAPI(fixture_dir=fixture_dir)
+    data = api.get_stock_data('AAPL', '2021-01-01', '2021-06-30')
+    with open(path, encoding='utf-8') as f:
+        series = json.load(f)['Time Series (Daily)']
+    assert list(data.columns[:5]) == ['Open', 'High', 'Low', 'Close', 'Volume']
+    assert len(data) == sum('2021-01-01' <= day <= '2021-06-30' for day in series)
+    assert data.index.is_monotonic_increasing
+    assert data['Close'].iloc[-1] == float(series[data.index[-1].strftime('%Y-%m-%d')]['4. close'])
+    print(f"回放测试通过：{len(data)}条数据")
+
+    # 不存在的夹具返回空数据，与API错误时的行为一致
+    assert api.get_stock_data('MISSING').empty
+    print("缺失夹具测试通过")
+
+    # 限流提示按请求次数确定性地注入，延迟生效
+    api = ReplayAlphaVantageAPI(fixture_dir=fixture_dir, latency=0.01, note_every=3)
+    start = time.perf_counter()
+    results = [api.get_stock_data('AAPL').empty for _ in range(6)]
+    assert results == [False, False, True, False, False, True]
+    assert api.notes == 2
+    assert time.perf_counter() - start >= 0.06
+    print("限流提示注入测试通过")
+
+    # 环境变量切换到回放模式
+    os.environ['ALPHA_VANTAGE_MODE'] = 'replay'
+    os.environ['ALPHA_VANTAGE_FIXTURES'] = fixture_dir
+    try:
+        api = api_from_env('demo')
+        assert isinstance(api, ReplayAlphaVantageAPI)
+        pd.testing.assert_frame_equal(api.get_stock_data('AAPL', '2021-01-01', '2021-06-30'), data)
+    finally:
+        del os.environ['ALPHA_VANTAGE_MODE']
+        del os.environ['ALPHA_VANTAGE_FIXTURES']
+    print("环境变量配置测试通过")
+
+print("\n测试完成")
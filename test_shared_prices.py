@@ -0,0 +1,106 @@
+import gc
+import os
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+
+from shared_prices import SharedPriceRegistry, write_frame, open_frame
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+
+print("测试进程级共享价格数据...")
+
+rng = np.random.default_rng(3)
+dates = pd.bdate_range('2023-01-02', periods=300)
+close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+data = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close,
+                     'Volume': rng.integers(1e5, 1e6, len(dates))}, index=dates)
+
+with tempfile.TemporaryDirectory() as work_dir:
+    # 写入后以只读内存映射方式打开，数据、列类型和索引频率保持不变
+    shared = open_frame(write_frame(data, os.path.join(work_dir, 'frame')))
+    pd.testing.assert_frame_equal(shared[data.columns], data)
+    assert shared.index.freqstr == 'B'
+    try:
+        shared.iloc[0, 0] = 1.0
+        raise AssertionError("共享数据应为只读")
+    except ValueError:
+        pass
+    print("内存映射数据只读，内容一致")
+
+    # 策略直接引用共享数组，结果与普通数据相同
+    swing = SwingTrader(shared, threshold=0.05)
+    option = OptionTrader(shared, threshold=0.05)
+    assert np.shares_memory(swing.data['Close'].to_numpy(), shared['Close'].to_numpy())
+    assert np.array_equal(swing.events, SwingTrader(data, threshold=0.05).events)
+    assert option.final_asset == OptionTrader(data, threshold=0.05).final_asset
+    assert not np.shares_memory(SwingTrader(data).data['Close'].to_numpy(), close)
+    print("策略引擎零复制读取共享数据")
+
+    # 多个会话并发获取同一股票：只加载一次，引用同一组数组
+    registry = SharedPriceRegistry(os.path.join(work_dir, 'shared'), max_bytes=0)
+    loads = []
+
+    def load():
+        loads.append(1)
+        return data
+
+    leases = [None] * 8
+    threads = [threading.Thread(target=lambda i=i: leases.__setitem__(i, registry.acquire('AAPL', load)))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert all(lease.data is leases[0].data for lease in leases)
+    stats = registry.stats()
+    assert stats['entries'] == 1 and stats['refs'] == 8
+    print(f"并发获取：{stats}")
+
+    # 被引用的数据不会被淘汰；最后一个引用释放（或被回收）后按容量上限淘汰
+    for lease in leases[:7]:
+        lease.release()
+    leases[7].release()
+    leases[7].release()
+    assert registry.stats()['refs'] == 0 and registry.stats()['evictions'] == 1
+    lease = registry.acquire('MSFT', lambda: data.iloc[:100])
+    del lease
+    gc.collect()
+    assert registry.stats()['entries'] == 0
+
+    # 淘汰后文件保留，重新获取时直接映射而不重新加载（包括其他进程的注册表）
+    other = SharedPriceRegistry(os.path.join(work_dir, 'shared'))
+    lease = other.acquire('AAPL', lambda: (_ for _ in ()).throw(AssertionError("不应重新加载")))
+    assert other.stats()['reopened'] == 1 and len(lease.data) == len(data)
+
+    # 过期后重新加载，旧版本在引用释放后删除
+    other.max_age = 0
+    changed = data.copy()
+    changed['Close'] *= 1.1
+    renewed = other.acquire('AAPL', lambda: changed)
+    assert other.stats()['reloads'] == 1 and np.allclose(renewed.data['Close'], changed['Close'])
+    old_directory = [name for name in os.listdir(os.path.join(work_dir, 'shared')) if name.startswith('AAPL')]
+    lease.release()
+    remaining = [name for name in os.listdir(os.path.join(work_dir, 'shared')) if name.startswith('AAPL')]
+    assert len(remaining) == len(old_directory) - 1
+
+    # 过期后重新加载的数据未变时沿用同一目录，不能被删除，其他进程仍可直接映射
+    same_dir = os.path.join(work_dir, 'same')
+    same = SharedPriceRegistry(same_dir)
+    same.acquire('IBM', lambda: data).release()
+    same.max_age = 0
+    reloaded = same.acquire('IBM', lambda: data)
+    assert same.stats()['reloads'] == 1
+    fresh = SharedPriceRegistry(same_dir)
+    reopened = fresh.acquire('IBM', lambda: (_ for _ in ()).throw(AssertionError("不应重新加载")))
+    assert fresh.stats()['reopened'] == 1
+    pd.testing.assert_series_equal(reopened.data['Close'], reloaded.data['Close'])
+    reopened.release()
+    reloaded.release()
+    print("数据未变的重新加载保留映射目录")
+
+    assert registry.acquire('EMPTY', lambda: None) is None
+
+print("\n测试完成")
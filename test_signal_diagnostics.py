@@ -0,0 +1,72 @@
+import time
+import numpy as np
+import pandas as pd
+
+from signal_diagnostics import SparseTable, SignalDiagnostics, trigger_prices
+from signal_engine import threshold_crossings
+
+print("测试阈值穿越诊断...")
+
+rng = np.random.default_rng(11)
+
+# 稀疏表的区间查询和倍增查找与直接计算一致
+for n in (1, 2, 7, 64, 1000):
+    values = rng.normal(0, 1, n).cumsum()
+    highs, lows = SparseTable(values, 'max'), SparseTable(values, 'min')
+    lo, hi = rng.integers(0, n, 300), rng.integers(0, n + 1, 300)
+    expected = [values[a:b].max() if b > a else -np.inf for a, b in zip(lo, hi)]
+    assert np.array_equal(highs.query(lo, hi), expected)
+    levels = rng.normal(0, 2, 300)
+    found = highs.first_reaching(lo, levels)
+    for a, level, pos in zip(lo, levels, found):
+        hits = np.flatnonzero(values[a:] >= level)
+        assert pos == (a + hits[0] if len(hits) else -1)
+    found = lows.first_reaching(lo, levels)
+    for a, level, pos in zip(lo, levels, found):
+        hits = np.flatnonzero(values[a:] <= level)
+        assert pos == (a + hits[0] if len(hits) else -1)
+print("区间最大/最小值和首次到达查询正确")
+
+# 触发价与策略的比较方式在浮点边界上完全一致
+references = rng.uniform(1, 500, 2000)
+sell_price, buy_price = trigger_prices(references, 0.1)
+assert ((sell_price - references) / references >= 0.1).all()
+assert ((np.nextafter(sell_price, -np.inf) - references) / references < 0.1).all()
+assert ((buy_price - references) / references <= -0.1).all()
+assert ((np.nextafter(buy_price, np.inf) - references) / references > -0.1).all()
+
+# 连续信号与 threshold_crossings 完全一致
+dates = pd.bdate_range('2010-01-04', periods=3000)
+close = pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates)))), index=dates)
+diagnostics = SignalDiagnostics(close)
+for threshold in (0.02, 0.05, 0.1, 0.2):
+    bars, directions = diagnostics.signal_path(threshold)
+    expected_bars, expected_directions = threshold_crossings(close.to_numpy(), threshold)
+    assert np.array_equal(bars, expected_bars) and np.array_equal(directions, expected_directions)
+print("连续信号与 threshold_crossings 一致")
+
+# 假设查询：与逐日扫描结果一致
+query_dates = dates[rng.integers(0, len(dates), 500)]
+query_references = close.to_numpy()[rng.integers(0, len(dates), 500)]
+start = time.perf_counter()
+result = diagnostics.what_if(query_references, query_dates, 0.1)
+elapsed = time.perf_counter() - start
+for row in result.head(100).itertuples():
+    after = close[close.index > row.参考日期]
+    change = (after - row.参考价格) / row.参考价格
+    hits = after[(change >= 0.1) | (change <= -0.1)]
+    if len(hits):
+        assert row.触发日期 == hits.index[0] and row.触发价格 == hits.iloc[0]
+        assert row.方向 == ('卖出' if hits.iloc[0] > row.参考价格 else '买入')
+    else:
+        assert pd.isna(row.触发日期) and row.方向 == ''
+print(f"500 个假设查询耗时 {elapsed * 1000:.1f} ms，结果与逐日扫描一致")
+
+# 单个参考日期对应多个参考价格
+grid = diagnostics.what_if(np.linspace(50, 150, 5), dates[100], 0.1)
+assert len(grid) == 5 and (grid['参考日期'] == dates[100]).all()
+
+# 价格区间分布覆盖全部K线
+assert sum(diagnostics.price_bands(100.0, 0.1).values()) == len(close)
+
+print("\n测试完成")
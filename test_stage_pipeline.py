@@ -0,0 +1,76 @@
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from result_store import ResultStore
+from stage_pipeline import StagePipeline, backtest_pipeline
+
+print("测试分阶段记忆化流水线...")
+
+rng = np.random.default_rng(8)
+dates = pd.bdate_range('2022-01-03', periods=500)
+close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, len(dates))))
+data = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1}, index=dates)
+params = dict(data=data, initial_shares=1000, trade_shares=100, threshold=0.05, premium_rate=0.05, lean=False,
+              periods_per_year=252)
+
+pipeline = backtest_pipeline()
+result = pipeline.run(['swing', 'option', 'metrics'], **params)
+swing = SwingTrader(data, threshold=0.05)
+option = OptionTrader(data, threshold=0.05)
+assert np.array_equal(result['swing'].events, swing.events)
+assert np.array_equal(result['option'].events, option.events)
+assert result['option'].final_asset == option.final_asset and result['option'].total_premium == option.total_premium
+pd.testing.assert_frame_equal(result['option'].positions, option.positions)
+print("流水线结果与直接回测一致")
+
+# 只重新计算受影响的阶段
+computed = []
+pipeline.run(['swing', 'option', 'metrics'], computed=computed, **params)
+assert computed == []
+computed = []
+pipeline.run(['swing', 'option', 'metrics'], computed=computed, **dict(params, premium_rate=0.08))
+assert computed == ['option', 'metrics'], computed
+computed = []
+pipeline.run(['swing', 'option', 'metrics'], computed=computed, **dict(params, trade_shares=200))
+assert computed == ['swing', 'option', 'metrics'], computed
+computed = []
+pipeline.run(['swing', 'option', 'metrics'], computed=computed, **dict(params, threshold=0.08))
+assert 'signals' in computed and 'close' not in computed
+changed = pipeline.run('option', **dict(params, premium_rate=0.08, trade_shares=200))
+expected = OptionTrader(data, trade_shares=200, threshold=0.05, premium_rate=0.08)
+assert np.array_equal(changed.events, expected.events) and changed.final_asset == expected.final_asset
+assert pipeline.counters['signals']['computed'] == 2
+print(f"各阶段计算次数: { {name: c['computed'] for name, c in pipeline.counters.items()} }")
+
+# 价格数据内容变化时所有阶段重新计算
+modified = data.copy()
+modified.iloc[-1, modified.columns.get_loc('Close')] *= 1.5
+computed = []
+pipeline.run('swing', computed=computed, **dict(params, data=modified))
+assert computed == ['close', 'signals', 'swing']
+
+# 使用结果存储时，新的流水线实例直接恢复已保存的账本
+with tempfile.TemporaryDirectory() as work_dir:
+    store = ResultStore(os.path.join(work_dir, 'results'))
+    backtest_pipeline(store).run(['swing', 'option'], **params)
+    restored = backtest_pipeline(store).run(['swing', 'option'], **params)
+    assert store.stats()['hits'] == 2
+    assert np.array_equal(restored['option'].events, option.events)
+
+# 通用流水线：LRU淘汰和缺少参数
+pipeline = StagePipeline(max_entries=2)
+pipeline.add('square', lambda x: x * x, params=('x',))
+pipeline.add('plus', lambda square, y: square + y, params=('y',), upstream=('square',))
+assert [pipeline.run('plus', x=x, y=1) for x in (1, 2, 3, 1)] == [2, 5, 10, 2]
+assert pipeline.counters['square']['computed'] == 4
+try:
+    pipeline.run('plus', x=1)
+    raise AssertionError("缺少参数时应报错")
+except KeyError:
+    pass
+
+print("\n测试完成")
@@ -0,0 +1,157 @@
+import tempfile
+import numpy as np
+import pandas as pd
+
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from strategy_comparison import StrategyComparison
+from signal_engine import threshold_crossings, multi_threshold_crossings
+from threshold_sweep import threshold_sweep
+from result_store import ResultStore
+from trade_events import EVENT_BUY, EVENT_SELL_PUT
+from multi_leg_options import MultiLegOptionTrader, STRUCTURE_PRESETS, compare_structures
+from performance_metrics import trader_metrics
+from report_tables import swing_trade_table, option_trade_table, paginate
+
+print("测试策略引擎（使用模拟数据，无需网络）...")
+
+# 生成模拟价格数据（使用自然日，保证月底也会出现信号和行权）
+rng = np.random.default_rng(42)
+dates = pd.date_range("2020-01-01", periods=800, freq="D")
+close = 100 * np.exp(np.cumsum(rng.normal(0, 0.03, len(dates))))
+data = pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1e6}, index=dates)
+
+
+def loop_crossings(prices, threshold):
+    """逐日循环版本的阈值穿越，作为对照"""
+    reference_price = prices[0]
+    bars, directions = [], []
+    for i in range(1, len(prices)):
+        price_change = (prices[i] - reference_price) / reference_price
+        if price_change >= threshold:
+            bars.append(i)
+            directions.append(-1)
+            reference_price = prices[i]
+        elif price_change <= -threshold:
+            bars.append(i)
+            directions.append(1)
+            reference_price = prices[i]
+    return bars, directions
+
+
+# 测试向量化的阈值穿越与逐日循环一致
+for threshold in [0.01, 0.05, 0.1, 0.3, 5.0]:
+    bars, directions = threshold_crossings(close, threshold)
+    expected_bars, expected_directions = loop_crossings(close.tolist(), threshold)
+    assert bars.tolist() == expected_bars, threshold
+    assert directions.tolist() == expected_directions, threshold
+print("阈值穿越测试通过")
+
+# 测试多阈值内核与逐个阈值计算的结果一致
+thresholds = np.linspace(0.01, 0.3, 40)
+ragged = multi_threshold_crossings(close, thresholds)
+assert len(ragged) == len(thresholds)
+for k, threshold in enumerate(thresholds):
+    bars, directions = threshold_crossings(close, threshold)
+    assert ragged[k][0].tolist() == bars.tolist(), threshold
+    assert ragged[k][1].tolist() == directions.tolist(), threshold
+print(f"多阈值内核测试通过：{len(thresholds)}个阈值共{ragged.counts().sum()}个信号")
+
+# 测试组合评估器与单独运行两种策略的结果完全一致
+threshold = 0.05
+comparison = StrategyComparison(data, initial_shares=1000, trade_shares=200, threshold=threshold, premium_rate=0.05)
+swing = SwingTrader(data, initial_shares=1000, trade_shares=200, threshold=threshold)
+option = OptionTrader(data, initial_shares=1000, trade_shares=200, threshold=threshold, premium_rate=0.05)
+
+pd.testing.assert_frame_equal(comparison.swing.positions, swing.positions, check_exact=True)
+pd.testing.assert_frame_equal(comparison.option.positions, option.positions, check_exact=True)
+pd.testing.assert_frame_equal(comparison.option.data, option.data, check_exact=True)
+assert comparison.swing.final_asset == swing.positions['Total_Asset'].iloc[-1]
+assert comparison.option.final_asset == option.positions['Total_Asset'].iloc[-1]
+assert comparison.option.total_premium == option.positions['Premium_Income'].iloc[-1]
+assert option.positions['IsExercised'].any()
+print(f"组合评估测试通过：{len(comparison.swing.events)}个信号，"
+      f"期权行权{int(option.positions['IsExercised'].sum())}次")
+
+# 测试精简模式：结果一致，数据类型紧凑，且不复制价格数据
+lean_option = OptionTrader(data, initial_shares=1000, trade_shares=200, threshold=threshold, lean=True)
+assert lean_option.positions['Signal'].dtype == np.int8
+assert lean_option.data['OptionType'].dtype == 'category'
+assert np.shares_memory(lean_option.data['Close'].to_numpy(), data['Close'].to_numpy())
+np.testing.assert_array_equal(lean_option.positions['Total_Asset'].to_numpy(), option.positions['Total_Asset'].to_numpy())
+assert 'Signal' not in data.columns
+print("精简模式测试通过")
+
+# 测试月底行权按自然月判断：带 freq='B' 的索引中 2023-09-29（周五）不是月底，不应行权
+business_dates = pd.bdate_range('2023-09-01', '2023-10-31')
+business_close = np.where(business_dates >= '2023-09-29', 80.0, 100.0)
+business_data = pd.DataFrame({'Open': business_close, 'High': business_close, 'Low': business_close,
+                              'Close': business_close, 'Volume': 1e6}, index=business_dates)
+assert business_data.index.freq == 'B'
+business_option = OptionTrader(business_data, threshold=0.1)
+assert len(business_option.events) == 1 and business_option.events['type'][0] == EVENT_SELL_PUT
+plain_data = business_data.set_axis(pd.DatetimeIndex(business_dates, freq=None))
+assert np.isclose(business_option.final_asset, OptionTrader(plain_data, threshold=0.1).final_asset)
+print("月底行权测试通过")
+
+# 测试阈值敏感性分析与单独回测一致
+sweep = threshold_sweep(data, [0.05, 0.1], initial_shares=1000, trade_shares=200)
+assert sweep.loc[0.05, 'swing_final_asset'] == swing.final_asset
+assert sweep.loc[0.05, 'option_final_asset'] == option.final_asset
+# 重复的阈值各占一行，附加指标时按位置对应
+repeated = threshold_sweep(data, [0.05, 0.05, 0.1], metrics=True)
+assert len(repeated) == 3 and repeated['swing_sharpe'].iloc[0] == repeated['swing_sharpe'].iloc[1]
+print("阈值敏感性分析测试通过")
+
+# 测试回测结果存储：第二次运行直接从存储恢复，结果完全一致
+with tempfile.TemporaryDirectory() as store_dir:
+    store = ResultStore(store_dir)
+    first = store.run(OptionTrader, data, initial_shares=1000, trade_shares=200, threshold=threshold)
+    second = store.run(OptionTrader, data, initial_shares=1000, trade_shares=200, threshold=threshold)
+    assert store.stats()['hits'] == 1
+    pd.testing.assert_frame_equal(second.positions, option.positions, check_exact=True)
+    assert second.total_premium == option.total_premium
+print("回测结果存储测试通过")
+
+# 测试交易记录表：只包含成交的交易，标签和数值与事件日志一致，分页只取出一页
+trades = swing_trade_table(swing.events, data.index)
+executed = swing.events[swing.events['qty'] > 0]
+assert len(trades) == len(executed)
+assert (trades['交易类型'].astype(str).to_numpy() == np.where(executed['type'] == EVENT_BUY, '买入', '卖出')).all()
+np.testing.assert_array_equal(trades['交易金额'].to_numpy(), executed['qty'] * executed['price'])
+option_table = option_trade_table(option.events, data.index)
+assert option_table['行权价'].isna().sum() == np.count_nonzero(option.events['strike'] <= 0)
+assert len(paginate(option_table, 2, page_size=5)) == min(5, max(0, len(option_table) - 5))
+print(f"交易记录表测试通过：波段{len(trades)}条，期权{len(option_table)}条")
+
+# 测试多腿期权引擎：整批比较与单独回测一致，单腿备兑看涨与逐合约计算一致
+structures = [build() for build in STRUCTURE_PRESETS.values()]
+summary = compare_structures(data, structures, threshold=threshold)
+for structure in structures:
+    trader = MultiLegOptionTrader(data, structure, threshold=threshold)
+    assert np.isclose(summary.loc[structure.name, 'final_asset'], trader.final_asset, rtol=1e-12), structure
+    assert np.isclose(trader.positions['Total_Asset'].iloc[-1], trader.final_asset, rtol=1e-12), structure
+
+covered = MultiLegOptionTrader(data, STRUCTURE_PRESETS['covered_call'](), threshold=threshold)
+leg = covered.structure.legs[0]
+shares, cash = 1000.0, 100000.0
+for bar in covered.open_bars:
+    strike = close[bar] * leg['moneyness']
+    cash += close[bar] * leg['premium_rate'] * 100
+    if close[min(bar + leg['tenor'], len(close) - 1)] > strike:
+        shares -= 100
+        cash += strike * 100
+assert np.isclose(covered.final_asset, shares * close[-1] + cash, rtol=1e-12)
+print(f"多腿期权测试通过：{len(structures)}种组合")
+
+# 测试绩效指标：整批计算与逐个用pandas计算的结果一致
+metrics = trader_metrics([swing, option], close, names=['swing', 'option'])
+for name, trader in (('swing', swing), ('option', option)):
+    total_asset = trader.positions['Total_Asset']
+    daily = total_asset.pct_change().dropna()
+    assert np.isclose(metrics.loc[name, 'sharpe'], daily.mean() / daily.std() * np.sqrt(252))
+    assert np.isclose(metrics.loc[name, 'max_drawdown_pct'], (1 - total_asset / total_asset.cummax()).max() * 100)
+    assert metrics.loc[name, 'trades'] == np.count_nonzero(np.diff(trader.positions['Shares'].to_numpy()))
+print("绩效指标测试通过")
+
+print("\n测试完成")
@@ -0,0 +1,77 @@
+import os
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+from multiprocessing import Pool
+
+from threshold_sweep import threshold_sweep
+import sweep_runner
+from sweep_runner import create_sweep, run_worker, merge_results, sweep_status, reclaim_stale
+
+print("测试分布式扫描（本地多进程，无需网络）...")
+
+
+def make_data(seed, periods=600):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, periods)))
+    return pd.DataFrame({'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 1e6},
+                        index=pd.date_range("2020-01-01", periods=periods, freq="D"))
+
+
+if __name__ == "__main__":
+    datasets = {'AAPL': make_data(1), 'BRK.B': make_data(2)}
+    thresholds = np.linspace(0.02, 0.3, 23).tolist()
+
+    with tempfile.TemporaryDirectory() as queue_dir:
+        units = create_sweep(queue_dir, datasets, thresholds, chunk_size=5, trade_shares=200)
+        assert units == 10
+
+        # 模拟一个领取后卡住的工作进程：领取文件的心跳停在很久以前
+        pending = os.path.join(queue_dir, 'pending', 'AAPL-00001.json')
+        stalled = os.path.join(queue_dir, 'claimed', 'AAPL-00001.dead-worker.json')
+        os.rename(pending, stalled)
+        os.utime(stalled, (time.time() - 3600, time.time() - 3600))
+
+        with Pool(3) as pool:
+            counts = pool.starmap(run_worker, [(queue_dir, f"worker{k}", 30.0, 1.0, 0.1) for k in range(3)])
+        assert sum(counts) == units, counts
+        assert sweep_status(queue_dir) == {'pending': 0, 'claimed': 0, 'results': units, 'failed': 0}
+        print(f"多进程执行测试通过：各进程完成 {counts}")
+
+        # 合并结果与单机直接计算完全一致
+        merged = merge_results(queue_dir)
+        for symbol, data in datasets.items():
+            expected = threshold_sweep(data, thresholds, trade_shares=200)
+            actual = merged.loc[symbol]
+            np.testing.assert_array_equal(actual.index.to_numpy(), expected.index.to_numpy())
+            for column in expected.columns:
+                np.testing.assert_array_equal(actual[column].to_numpy(), expected[column].to_numpy())
+        print(f"结果合并测试通过：{len(merged)}行")
+
+        # 没有超时的单元时回收不做任何事
+        assert reclaim_stale(queue_dir, stale_after=0.0) == 0
+
+    # 领取等待已久的单元时，另一个进程在领取过程中回收超时单元，不应把刚领取的单元放回队列
+    with tempfile.TemporaryDirectory() as queue_dir:
+        create_sweep(queue_dir, {'AAPL': datasets['AAPL']}, thresholds[:5], chunk_size=5)
+        pending = os.path.join(queue_dir, 'pending', 'AAPL-00000.json')
+        os.utime(pending, (time.time() - 3600, time.time() - 3600))
+        read_json = sweep_runner._read_json
+        reclaimed = []
+
+        def read_during_reclaim(path):
+            reclaimed.append(reclaim_stale(queue_dir, stale_after=30.0))
+            return read_json(path)
+
+        sweep_runner._read_json = read_during_reclaim
+        try:
+            unit, claimed_path = sweep_runner._claim(queue_dir, 'worker0')
+        finally:
+            sweep_runner._read_json = read_json
+        assert reclaimed == [0] and unit['attempts'] == 1
+        assert sweep_status(queue_dir) == {'pending': 0, 'claimed': 1, 'results': 0, 'failed': 0}
+        assert reclaim_stale(queue_dir, stale_after=30.0) == 0
+        print("领取等待已久的单元测试通过")
+
+    print("\n测试完成")
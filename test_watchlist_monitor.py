@@ -0,0 +1,53 @@
+import asyncio
+import numpy as np
+import pandas as pd
+
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from watchlist_monitor import (
+    WatchlistMonitor, FakeQuoteFeed, SymbolState, seed_states, synthetic_datasets
+)
+
+print("测试监控列表...")
+
+# 用前200根K线的回测初始化状态，再回放剩余K线，产生的事件应与完整回测中200根之后的事件完全相同
+datasets = synthetic_datasets(20, 600, seed=5)
+split = 200
+states = seed_states({symbol: data.iloc[:split] for symbol, data in datasets.items()}, threshold=0.05)
+received = []
+monitor = WatchlistMonitor(states, on_event=received.append)
+asyncio.run(monitor.run(FakeQuoteFeed.from_frames(datasets, start=split)))
+assert monitor.counters['quotes'] == 20 * (600 - split)
+
+for symbol, data in datasets.items():
+    swing = SwingTrader(data, threshold=0.05)
+    option = OptionTrader(data, threshold=0.05)
+    expected = np.concatenate([swing.events[swing.events['bar'] >= split], option.events[option.events['bar'] >= split]])
+    actual = [event for event in received if event.symbol == symbol]
+    assert len(actual) == len(expected), (symbol, len(actual), len(expected))
+    key = lambda row: (row[0], row[1])
+    expected_rows = sorted(((data.index[e['bar']], int(e['type']), int(e['qty']), e['price'], e['strike'], e['premium'])
+                            for e in expected), key=key)
+    actual_rows = sorted(((e.time, e.type, e.qty, e.price, e.strike, e.premium) for e in actual), key=key)
+    for exp, act in zip(expected_rows, actual_rows):
+        assert exp[:3] == act[:3] and np.allclose(exp[3:], act[3:]), (symbol, exp, act)
+
+    state = monitor.states[symbol]
+    assert state.shares == swing.final_shares and np.isclose(state.cash, swing.final_cash)
+    assert state.option_shares == option.final_shares and np.isclose(state.option_cash, option.final_cash)
+    assert np.isclose(state.swing_asset, swing.final_asset) and np.isclose(state.option_asset, option.final_asset)
+print(f"回放结果与完整回测一致：{monitor.counters['signals']} 次信号，{monitor.counters['events']} 个事件")
+
+# 逐条产生的行情源、未知股票和过期行情
+state = SymbolState('AAA', 100.0, threshold=0.1, last_time=pd.Timestamp('2024-01-01'))
+monitor = WatchlistMonitor({'AAA': state}, queue_size=2)
+times = pd.to_datetime(['2023-12-29', '2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'])
+feed = FakeQuoteFeed({'AAA': [200.0, 111.0, 99.0, 112.0, 100.0]}, times, batch=False)
+asyncio.run(monitor.run(feed))
+monitor.process('BBB', times[-1], 1.0)
+assert monitor.counters['stale'] == 1 and monitor.counters['unknown'] == 1
+assert monitor.counters['signals'] == 4 and monitor.events.qsize() == 2 and monitor.counters['dropped'] == 6
+assert state.reference_price == 100.0 and state.open_contracts == 4
+print(monitor.snapshot())
+
+print("\n测试完成")
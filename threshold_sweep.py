@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from profiler import phase
+from memory_utils import readonly_array
+from signal_engine import multi_threshold_crossings
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from trade_events import EVENT_PUT_EXERCISED, EVENT_CALL_EXERCISED
+from performance_metrics import trader_metrics
+
+
+def threshold_sweep(data, thresholds, initial_shares=1000, trade_shares=100, premium_rate=0.05, metrics=False):
+    """
+    阈值敏感性分析
+    所有阈值的信号由 multi_threshold_crossings 一次扫描得到，
+    各阈值的账本再由各自的信号驱动（只处理信号日，开销很小）。
+    策略对象使用精简模式，不会为每个阈值复制价格数据。
+    :param data: DataFrame，包含股票价格数据
+    :param thresholds: 阈值列表
+    :param metrics: 是否附加两种策略的完整绩效指标（所有阈值作为一批计算），列名带 swing_ / option_ 前缀
+    :return: DataFrame，以阈值为索引，包含两种策略的期末资产、收益率和交易统计
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    close = readonly_array(data['Close'])
+    signals = multi_threshold_crossings(close, thresholds)
+
+    rows = []
+    swings, options = [], []
+    with phase('sweep.ledgers', thresholds=len(thresholds)):
+        for k, threshold in enumerate(thresholds):
+            params = dict(initial_shares=initial_shares, trade_shares=trade_shares, threshold=threshold,
+                          lean=True, signals=signals[k])
+            swing = SwingTrader(data, **params)
+            option = OptionTrader(data, premium_rate=premium_rate, **params)
+            swings.append(swing)
+            options.append(option)
+            option_types = option.events['type']
+            rows.append({
+                'threshold': threshold,
+                'signals': int(signals.counts()[k]),
+                'swing_final_asset': swing.final_asset,
+                'swing_return_pct': (swing.final_asset / swing.initial_asset - 1) * 100,
+                'swing_trades': int(np.count_nonzero(swing.events['qty'] > 0)),
+                'option_final_asset': option.final_asset,
+                'option_return_pct': (option.final_asset / option.initial_asset - 1) * 100,
+                'option_premium': option.total_premium,
+                'option_exercised': int(np.count_nonzero(
+                    (option_types == EVENT_PUT_EXERCISED) | (option_types == EVENT_CALL_EXERCISED))),
+            })
+    table = pd.DataFrame(rows).set_index('threshold')
+    if metrics:
+        with phase('sweep.metrics', runs=2 * len(thresholds)):
+            batch = trader_metrics(swings + options, close)
+        # 收益率和交易次数已在表中，不重复
+        batch = batch.drop(columns=['total_return_pct', 'trades'])
+        # 按位置拼接（阈值列表可能有重复，不能按索引对齐）
+        table = pd.concat([table.reset_index(),
+                           batch.iloc[:len(thresholds)].add_prefix('swing_').reset_index(drop=True),
+                           batch.iloc[len(thresholds):].add_prefix('option_').reset_index(drop=True)],
+                          axis=1).set_index('threshold')
+    return table
@@ -0,0 +1,122 @@
+import numpy as np
+
+# 交易事件日志的结构化数组类型
+# bar: K线序号，type: 事件类型，qty: 成交股数（信号未能执行时为0），
+# price: 当日收盘价，strike: 行权价，premium: 每股权利金
+EVENT_DTYPE = np.dtype([
+    ('bar', np.int32),
+    ('type', np.int8),
+    ('qty', np.int32),
+    ('price', np.float64),
+    ('strike', np.float64),
+    ('premium', np.float64),
+])
+
+# 事件类型
+EVENT_BUY = 1              # 波段买入
+EVENT_SELL = 2             # 波段卖出
+EVENT_SELL_PUT = 3         # 卖出看跌期权
+EVENT_SELL_CALL = 4        # 卖出看涨期权
+EVENT_PUT_EXERCISED = 5    # 看跌期权被行权（按行权价买入）
+EVENT_CALL_EXERCISED = 6   # 看涨期权被行权（按行权价卖出）
+
+EVENT_NAMES = {
+    EVENT_BUY: '买入',
+    EVENT_SELL: '卖出',
+    EVENT_SELL_PUT: '卖出看跌期权',
+    EVENT_SELL_CALL: '卖出看涨期权',
+    EVENT_PUT_EXERCISED: '期权被行权 (put)',
+    EVENT_CALL_EXERCISED: '期权被行权 (call)',
+}
+
+# 各事件对应的交易信号（1=买入/卖出看跌期权，-1=卖出/卖出看涨期权，行权事件不产生信号）
+EVENT_SIGNALS = {
+    EVENT_BUY: 1,
+    EVENT_SELL: -1,
+    EVENT_SELL_PUT: 1,
+    EVENT_SELL_CALL: -1,
+}
+
+
+def make_events(rows):
+    """
+    由 (bar, type, qty, price, strike, premium) 元组列表创建事件数组
+    行需按 bar 升序排列，同一K线内的事件按发生顺序排列
+    """
+    return np.array(rows, dtype=EVENT_DTYPE)
+
+
+def event_signals(events):
+    """每个事件对应的交易信号，行权事件为0"""
+    signals = np.zeros(len(events), dtype=np.int8)
+    for event_type, signal in EVENT_SIGNALS.items():
+        signals[events['type'] == event_type] = signal
+    return signals
+
+
+def share_deltas(events):
+    """每个事件导致的持股变化"""
+    qty = events['qty'].astype(np.float64)
+    types = events['type']
+    sign = np.select(
+        [(types == EVENT_BUY) | (types == EVENT_PUT_EXERCISED),
+         (types == EVENT_SELL) | (types == EVENT_CALL_EXERCISED)],
+        [1.0, -1.0], 0.0
+    )
+    return sign * qty
+
+
+def cash_deltas(events):
+    """每个事件导致的现金变化"""
+    qty = events['qty']
+    types = events['type']
+    return np.select(
+        [types == EVENT_BUY,
+         types == EVENT_SELL,
+         (types == EVENT_SELL_PUT) | (types == EVENT_SELL_CALL),
+         types == EVENT_PUT_EXERCISED,
+         types == EVENT_CALL_EXERCISED],
+        [-(qty * events['price']),
+         qty * events['price'],
+         events['premium'] * qty,
+         -(events['strike'] * qty),
+         events['strike'] * qty],
+        0.0
+    )
+
+
+def premium_deltas(events):
+    """每个事件带来的权利金收入"""
+    types = events['type']
+    is_sale = (types == EVENT_SELL_PUT) | (types == EVENT_SELL_CALL)
+    return np.where(is_sale, events['premium'] * events['qty'], 0.0)
+
+
+def running_total(deltas, initial):
+    """按事件顺序逐个累加后的最终值（与逐笔记账的浮点结果完全一致）"""
+    return float(np.cumsum(np.concatenate(([float(initial)], deltas)))[-1])
+
+
+def dense_running(events, deltas, n, initial):
+    """
+    把按事件记录的增量展开成逐日的累计值
+    按事件顺序逐个累加（与逐笔记账的浮点结果完全一致），
+    每根K线取当天最后一个事件之后的值
+    """
+    running = np.cumsum(np.concatenate(([float(initial)], deltas)))
+    after = np.searchsorted(events['bar'], np.arange(n), side='right')
+    return running[after]
+
+
+def dense_per_bar(events, values, n, mask=None, fill=0, dtype=np.float64):
+    """
+    把事件上的数值放回对应的K线位置，其余位置为fill
+    :param mask: 只使用满足条件的事件
+    """
+    result = np.full(n, fill, dtype=dtype)
+    if mask is None:
+        result[events['bar']] = values
+    else:
+        result[events['bar'][mask]] = np.asarray(values)[mask]
+    return result
+
@@ -0,0 +1,331 @@
+import time
+import asyncio
+import argparse
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from signal_engine import threshold_crossings
+from swing_strategy import SwingTrader
+from option_strategy import OptionTrader
+from trade_events import (
+    EVENT_BUY, EVENT_SELL, EVENT_SELL_PUT, EVENT_SELL_CALL, EVENT_PUT_EXERCISED, EVENT_CALL_EXERCISED
+)
+
+# 行情：股票代码、时间、价格
+Quote = namedtuple('Quote', ['symbol', 'time', 'price'])
+
+# 监控产生的事件，type 与回测事件日志的事件类型相同
+MonitorEvent = namedtuple('MonitorEvent', ['symbol', 'time', 'type', 'qty', 'price', 'strike', 'premium'])
+
+
+class SymbolState:
+    """
+    单个股票的实时策略状态
+    与 SwingTrader / OptionTrader 的回测规则完全相同：价格相对参考价格的变化超过阈值时产生信号，
+    信号后以当前价格作为新的参考价格。每个行情只做一次比较，没有信号时不分配任何对象。
+    """
+    __slots__ = (
+        'symbol', 'threshold', 'trade_shares', 'premium_rate', 'reference_price',
+        'shares', 'cash', 'option_shares', 'option_cash', 'premium_income',
+        'open_contracts', 'contract_month', 'last_time', 'last_price',
+    )
+
+    def __init__(self, symbol, reference_price, threshold=0.1, trade_shares=100, premium_rate=0.05,
+                 shares=1000.0, cash=100000.0, option_shares=None, option_cash=None, premium_income=0.0,
+                 last_time=None):
+        """
+        :param symbol: 股票代码
+        :param reference_price: 参考价格（最近一次信号的价格）
+        :param threshold: 触发信号的价格变化阈值
+        :param trade_shares: 每次交易的股数
+        :param premium_rate: 期权费率
+        :param shares: 波段策略持股数
+        :param cash: 波段策略现金
+        :param option_shares: 期权策略持股数，默认与波段策略相同
+        :param option_cash: 期权策略现金，默认与波段策略相同
+        :param premium_income: 期权策略累计权利金收入
+        :param last_time: 最后处理的行情时间，早于或等于该时间的行情会被忽略
+        """
+        self.symbol = symbol
+        self.threshold = threshold
+        self.trade_shares = trade_shares
+        self.premium_rate = premium_rate
+        self.reference_price = float(reference_price)
+        self.shares = float(shares)
+        self.cash = float(cash)
+        self.option_shares = float(shares if option_shares is None else option_shares)
+        self.option_cash = float(cash if option_cash is None else option_cash)
+        self.premium_income = float(premium_income)
+        # 当月已卖出、尚未到期的期权合约数，进入新的月份时清零
+        self.open_contracts = 0
+        self.contract_month = None
+        self.last_time = last_time
+        self.last_price = self.reference_price
+
+    @classmethod
+    def from_backtest(cls, symbol, swing_trader, option_trader=None):
+        """
+        由最近一次回测的结果初始化状态：参考价格为最后一次信号的价格，持仓为回测结束时的持仓
+        :param swing_trader: SwingTrader 回测结果
+        :param option_trader: 可选的 OptionTrader 回测结果（与波段策略使用相同的阈值）
+        """
+        close = swing_trader._close
+        bars = swing_trader._signal_bars
+        reference_price = close[bars[-1]] if len(bars) else close[0]
+        state = cls(
+            symbol, reference_price,
+            threshold=swing_trader.threshold,
+            trade_shares=swing_trader.trade_shares,
+            shares=swing_trader.final_shares,
+            cash=swing_trader.final_cash,
+            last_time=swing_trader.data.index[-1],
+        )
+        if option_trader is not None:
+            state.premium_rate = option_trader.premium_rate
+            state.option_shares = option_trader.final_shares
+            state.option_cash = option_trader.final_cash
+            state.premium_income = option_trader.total_premium
+        state.last_price = float(close[-1])
+        return state
+
+    def update(self, time, price):
+        """
+        处理一个新行情
+        :return: 产生的 MonitorEvent 列表，没有信号时返回None
+        """
+        if self.last_time is not None and time <= self.last_time:
+            return None
+        self.last_time = time
+        self.last_price = price
+        price_change = (price - self.reference_price) / self.reference_price
+        if price_change >= self.threshold:
+            direction = -1
+        elif price_change <= -self.threshold:
+            direction = 1
+        else:
+            return None
+        self.reference_price = price
+        return self._on_signal(time, price, direction)
+
+    def _on_signal(self, time, price, direction):
+        """按回测规则执行一次信号，返回产生的事件"""
+        qty = self.trade_shares
+        events = []
+
+        # 波段策略：资金或持股不足时信号不执行，成交股数记为0
+        if direction == 1:
+            cost = qty * price
+            executed = qty if cost <= self.cash else 0
+            if executed:
+                self.shares += executed
+                self.cash -= cost
+            events.append(MonitorEvent(self.symbol, time, EVENT_BUY, executed, price, 0.0, 0.0))
+        else:
+            executed = qty if qty <= self.shares else 0
+            if executed:
+                self.shares -= executed
+                self.cash += executed * price
+            events.append(MonitorEvent(self.symbol, time, EVENT_SELL, executed, price, 0.0, 0.0))
+
+        # 期权策略：卖出轻度虚值期权并收取权利金
+        timestamp = pd.Timestamp(time)
+        month = (timestamp.year, timestamp.month)
+        if month != self.contract_month:
+            self.contract_month = month
+            self.open_contracts = 0
+        premium = price * self.premium_rate
+        if direction == -1:
+            strike = price * 0.99
+            events.append(MonitorEvent(self.symbol, time, EVENT_SELL_CALL, qty, price, strike, premium))
+        else:
+            strike = price * 1.01
+            events.append(MonitorEvent(self.symbol, time, EVENT_SELL_PUT, qty, price, strike, premium))
+        self.option_cash += premium * qty
+        self.premium_income += premium * qty
+        self.open_contracts += 1
+
+        # 月底到期：价内期权被行权，当月合约全部了结
+        if timestamp.is_month_end:
+            if direction == -1 and price > strike:
+                events.append(MonitorEvent(self.symbol, time, EVENT_CALL_EXERCISED, qty, price, strike, 0.0))
+                self.option_shares -= qty
+                self.option_cash += strike * qty
+            elif direction == 1 and price < strike:
+                events.append(MonitorEvent(self.symbol, time, EVENT_PUT_EXERCISED, qty, price, strike, 0.0))
+                self.option_shares += qty
+                self.option_cash -= strike * qty
+            self.open_contracts = 0
+        return events
+
+    @property
+    def swing_asset(self):
+        """按最新价格计算的波段策略总资产"""
+        return self.shares * self.last_price + self.cash
+
+    @property
+    def option_asset(self):
+        """按最新价格计算的期权策略总资产"""
+        return self.option_shares * self.last_price + self.option_cash
+
+
+def seed_states(datasets, threshold=0.1, initial_shares=1000, trade_shares=100, premium_rate=0.05):
+    """
+    对每个股票的历史数据运行一次回测，并由回测结果初始化监控状态
+    两个策略共用同一组信号，使用内存精简模式
+    :param datasets: {股票代码: 价格DataFrame}
+    :return: {股票代码: SymbolState}
+    """
+    states = {}
+    for symbol, data in datasets.items():
+        signals = threshold_crossings(data['Close'].to_numpy(dtype=np.float64), threshold)
+        swing = SwingTrader(data, initial_shares, trade_shares, threshold, lean=True, signals=signals)
+        option = OptionTrader(data, initial_shares, trade_shares, threshold, premium_rate, lean=True, signals=signals)
+        states[symbol] = SymbolState.from_backtest(symbol, swing, option)
+    return states
+
+
+class WatchlistMonitor:
+    """
+    监控列表：从行情源读取行情，更新对应股票的状态并发出信号事件
+    行情源是任意产生 Quote（或 (代码, 时间, 价格) 元组）的异步迭代器，可以逐条产生，也可以每次产生一批（列表）。
+    """
+
+    def __init__(self, states, on_event=None, queue_size=10000):
+        """
+        :param states: {股票代码: SymbolState}
+        :param on_event: 可选的回调函数，每个事件调用一次
+        :param queue_size: 事件队列的最大长度（0为不限），队列满时丢弃最早的事件
+        """
+        self.states = states
+        self.on_event = on_event
+        self.events = asyncio.Queue(queue_size)
+        self.counters = {'quotes': 0, 'signals': 0, 'events': 0, 'unknown': 0, 'stale': 0, 'dropped': 0}
+
+    def process(self, symbol, time, price):
+        """处理一个行情，返回产生的事件（没有信号时返回None）"""
+        self.counters['quotes'] += 1
+        state = self.states.get(symbol)
+        if state is None:
+            self.counters['unknown'] += 1
+            return None
+        if state.last_time is not None and time <= state.last_time:
+            self.counters['stale'] += 1
+            return None
+        events = state.update(time, price)
+        if events is not None:
+            self.counters['signals'] += 1
+            self._emit(events)
+        return events
+
+    def _emit(self, events):
+        for event in events:
+            self.counters['events'] += 1
+            if self.events.full():
+                self.events.get_nowait()
+                self.counters['dropped'] += 1
+            self.events.put_nowait(event)
+            if self.on_event is not None:
+                self.on_event(event)
+
+    async def run(self, feed):
+        """消费行情源直到其结束"""
+        process = self.process
+        async for item in feed:
+            if isinstance(item, list):
+                for symbol, time, price in item:
+                    process(symbol, time, price)
+            else:
+                symbol, time, price = item
+                process(symbol, time, price)
+
+    def snapshot(self):
+        """所有股票当前状态的汇总表"""
+        rows = [{
+            'symbol': state.symbol,
+            'reference_price': state.reference_price,
+            'last_price': state.last_price,
+            'shares': state.shares,
+            'cash': state.cash,
+            'swing_asset': state.swing_asset,
+            'option_asset': state.option_asset,
+            'open_contracts': state.open_contracts,
+        } for state in self.states.values()]
+        return pd.DataFrame(rows).set_index('symbol') if rows else pd.DataFrame()
+
+
+class FakeQuoteFeed:
+    """
+    本地模拟行情源，按时间顺序回放每个股票的价格序列，用于测试和基准测试
+    每个时间点的所有股票行情作为一批产生，批之间让出事件循环
+    """
+
+    def __init__(self, prices, times, interval=0.0, batch=True):
+        """
+        :param prices: {股票代码: 价格数组}，所有数组长度与 times 相同
+        :param times: 时间序列
+        :param interval: 每个时间点之间的等待秒数
+        :param batch: True 时每个时间点产生一个列表，False 时逐条产生 Quote
+        """
+        self.symbols = list(prices)
+        self.matrix = np.column_stack([np.asarray(prices[symbol], dtype=np.float64) for symbol in self.symbols]) \
+            if prices else np.empty((len(times), 0))
+        self.times = list(times)
+        self.interval = interval
+        self.batch = batch
+
+    @classmethod
+    def from_frames(cls, datasets, start=0, **kwargs):
+        """由 {股票代码: 价格DataFrame} 创建，从第 start 根K线开始回放（所有DataFrame需使用相同的日期索引）"""
+        first = next(iter(datasets.values()))
+        prices = {symbol: data['Close'].to_numpy()[start:] for symbol, data in datasets.items()}
+        return cls(prices, first.index[start:], **kwargs)
+
+    async def __aiter__(self):
+        for row, time in zip(self.matrix.tolist(), self.times):
+            quotes = [Quote(symbol, time, price) for symbol, price in zip(self.symbols, row)]
+            if self.batch:
+                yield quotes
+            else:
+                for quote in quotes:
+                    yield quote
+            await asyncio.sleep(self.interval)
+
+
+def synthetic_datasets(symbols, bars, seed=0, start_date='2020-01-01'):
+    """生成若干个股票的模拟价格数据（相同的交易日）"""
+    rng = np.random.default_rng(seed)
+    # 与数据源返回的数据一样不带频率信息，is_month_end 按自然月判断
+    index = pd.DatetimeIndex(pd.bdate_range(start_date, periods=bars), freq=None)
+    returns = rng.normal(0.0003, 0.02, (bars, symbols))
+    close = 100 * np.exp(np.cumsum(returns, axis=0))
+    return {f"SYM{i:04d}": pd.DataFrame({'Close': close[:, i]}, index=index) for i in range(symbols)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='监控列表基准测试（使用模拟行情）')
+    parser.add_argument('--symbols', type=int, default=2000, help='股票数量')
+    parser.add_argument('--history', type=int, default=250, help='用于初始化状态的历史K线数')
+    parser.add_argument('--ticks', type=int, default=250, help='每个股票回放的行情数')
+    parser.add_argument('--threshold', type=float, default=0.1, help='波动阈值')
+    args = parser.parse_args()
+
+    datasets = synthetic_datasets(args.symbols, args.history + args.ticks)
+    history = {symbol: data.iloc[:args.history] for symbol, data in datasets.items()}
+
+    start = time.perf_counter()
+    states = seed_states(history, args.threshold)
+    print(f"初始化 {len(states)} 个股票的状态: {time.perf_counter() - start:.2f} 秒")
+
+    monitor = WatchlistMonitor(states)
+    feed = FakeQuoteFeed.from_frames(datasets, start=args.history)
+    start = time.perf_counter()
+    asyncio.run(monitor.run(feed))
+    elapsed = time.perf_counter() - start
+    quotes = monitor.counters['quotes']
+    print(f"处理 {quotes} 条行情: {elapsed:.2f} 秒，{quotes / elapsed:,.0f} 条/秒，"
+          f"每条 {elapsed / quotes * 1e6:.2f} 微秒")
+    print(f"信号 {monitor.counters['signals']} 次，事件 {monitor.counters['events']} 个")
+
+
+if __name__ == "__main__":
+    main()